@@ -24,14 +24,70 @@
 #
 # Coverage Summary:
 # - Creation: Successful creation, invalid data handling, duplicate data creation.
-# - Reading: Successful reading by criteria, reading non-existent data, case-insensitive search.
+# - Reading: Successful reading by criteria, reading non-existent data, case-insensitive search, streaming reads in batches,
+#   keyset pagination and translation of DataTable sort/filter expressions, including case prefixes, unary operators,
+#   quoted && separators and rejection of unsupported operators.
+# - Metrics: Latency histograms, quantile estimates and the Prometheus rendering.
+# - Indexes: Declared indexes are created at startup and query shapes are recorded for the advisor.
+# - Bulk Writes: create_many, upsert_many and bulk_update report per-operation results and keep indexes in sync.
+# - Bulk Ingestion: CSV rows are coerced, inserted in chunks and indexed once at the end, or not at all by a shelter
+#   without in-memory indexes.
+# - Exports: Filtered queries stream as CSV, gzipped CSV or Parquet with columns from every document's fields, and
+#   export links are single-use.
+# - Aggregation: Grouped counts per field value, cached and invalidated by writes.
+# - Rescue Views: View members follow creates, updates and deletes, runtime views combine breed, sex and age,
+#   and each view's filter selects the same animals as its MongoDB criteria.
+# - Column Snapshot: Counts from the dictionary-encoded columns match MongoDB, and unsupported filters fall back to it.
+# - Geospatial: The GeoJSON location follows the coordinates on every write, and radius and bounding box queries
+#   return only the animals inside them.
+# - Searching: Case-insensitive substring search on breed and name, kept current on writes; broad searches are sent
+#   to MongoDB as a regex instead of an `_id` list.
 # - Updating: Successful updates, partial updates, and handling non-existent data.
 # - Deleting: Successful deletions, deleting non-existent data, and deleting all documents.
 # - Connection Verification: Ensured that the MongoDB instance is accessible before running operations.
+# - Async API: AsyncAnimalShelter mirrors the CRUD operations and deduplicates concurrent identical reads.
+# - Connection Pooling: Shelters with the same connection parameters share one pooled MongoClient.
+# - Breed Hash Map: The hash map stays consistent with the database after updates and deletes.
+# - Index Startup: Searches fall through to MongoDB while the indexes are built, writes made meanwhile are replayed,
+#   and a restart loads the saved snapshot and catches up on later inserts. A superseded build installs nothing, and
+#   writes made while a snapshot is saved are applied afterwards and discard that snapshot. Indexes older than
+#   index_max_staleness pick up other processes' writes. Snapshot files other users could have written are not loaded.
+# - Age Index: Range counts and `_id`s from the sorted age index match MongoDB, alone and combined with breeds,
+#   and entries with equal ages are moved and removed correctly.
+# - Outcome Rollups: Monthly trend counts follow writes and match the raw documents, MongoDB's `$group` fallback
+#   buckets them the same way, and a CSV builds the same rollups.
+# - Breed Index: Rows are reused after removal, removals swap out of large posting arrays, counts are O(1) and the
+#   memory footprint is reported.
+# - Caching: Writes only invalidate the cached queries they affect; TTL expiry and the memory budget are enforced.
 
 # Import unittest 
+import asyncio
+import csv
+import datetime
+import gzip
+import importlib.util
+import io
+import os
+import tempfile
+import time
 import unittest
+import animal_shelter_CRUD_revised
+import index_snapshot
 from animal_shelter_CRUD_revised import AnimalShelter
+from async_animal_shelter import AsyncAnimalShelter
+from outcome_rollups import OutcomeRollups, breed_group, month_of, rollups_from_csv
+from query_cache import QueryCache, make_hashable
+from range_index import SortedRangeIndex
+from rescue_views import RescueView, RescueViews
+from breed_index import BreedIndex
+from columnar_snapshot import ColumnarSnapshot
+from datatable_query import translate_filter_query, translate_sort_by
+from export_stream import ExportTickets, export_filename, iter_export, parquet_available
+from geo_query import bbox_filter, geo_point
+from ingest_csv import ingest_csv
+from index_advisor import query_shape
+from metrics import LatencyHistogram, MetricsRegistry, REGISTRY
+from mongo_client_registry import get_client
 from pymongo.errors import ConnectionFailure
 
 class TestAnimalShelterCRUD(unittest.TestCase):
@@ -40,11 +96,21 @@ class TestAnimalShelterCRUD(unittest.TestCase):
         """Set up the test environment for all test cases"""
         # Here I initialized an instance of AnimalShelter for unit testing, using a separate test database to avoid affecting production data.
         cls.shelter = AnimalShelter(username='edwardgarcia5_snhu', password='password', host='host.docker.internal', port=27017, db='AAC_test', collection='animals_test')
+        # The in-memory indexes are built in the background, so wait for them before testing against them.
+        cls.shelter.wait_for_indexes()
 
     def setUp(self):
         """Set up test data for each test"""
         # Here I ensured the collection is cleared before each test to avoid inconsistent results.
         self.shelter.collection.delete_many({})
+        # The collection was changed directly, so the query cache and in-memory indexes are reset as well.
+        self.shelter.clear_cache()
+        self.shelter.breed_hash_map.clear()
+        self.shelter.search_index.clear()
+        self.shelter.column_snapshot.clear()
+        self.shelter.rescue_views.clear()
+        self.shelter.age_index.clear()
+        self.shelter.outcome_rollups.clear()
         # Here I inserted a test document to maintain consistent data for each test.
         self.shelter.create({"name": "Test Animal", "breed": "Test Breed"})
 
@@ -75,6 +141,396 @@ class TestAnimalShelterCRUD(unittest.TestCase):
         result = self.shelter.read(criteria)
         self.assertEqual(len(result), 0, "Read operation should return empty for non-existent data")
 
+    def test_read_iter_batches(self):
+        """Test the streaming read operation"""
+        # Here I am testing that read_iter yields bounded batches with the requested projection, sort and limit.
+        for index in range(4):
+            self.shelter.create({"name": "Batch Animal %d" % index, "breed": "Batch Breed"})
+        batches = list(self.shelter.read_iter({"breed": "Batch Breed"}, batch_size=3, projection={"_id": 0, "name": 1},
+                                              sort=[("name", -1)]))
+        self.assertEqual([len(batch) for batch in batches], [3, 1])
+        self.assertEqual(batches[0][0], {"name": "Batch Animal 3"})
+
+        limited = list(self.shelter.read_iter({"breed": "Batch Breed"}, batch_size=3, limit=2))
+        self.assertEqual(sum(len(batch) for batch in limited), 2)
+
+    def test_read_page_keyset(self):
+        """Test that keyset pages cover every document exactly once"""
+        # Here I am testing that following the next_page tokens visits every document in sorted order without overlap.
+        for age in [3, 1, 2, 2, None]:
+            self.shelter.create({"name": "Page Animal", "breed": "Page Breed", "age": age})
+        for direction in (1, -1):
+            seen = []
+            page = self.shelter.read_page({"breed": "Page Breed"}, page_size=2, sort=[("age", direction)],
+                                          projection={"_id": 0, "age": 1}, with_total=True)
+            self.assertEqual(page["total"], 5)
+            seen.extend(document.get("age") for document in page["documents"])
+            while page["next_page"]:
+                page = self.shelter.read_page({"breed": "Page Breed"}, page_size=2, sort=[("age", direction)],
+                                              after=page["next_page"], projection={"_id": 0, "age": 1})
+                seen.extend(document.get("age") for document in page["documents"])
+            expected = [None, 1, 2, 2, 3] if direction == 1 else [3, 2, 2, 1, None]
+            self.assertEqual(seen, expected)
+
+    def test_search(self):
+        """Test case-insensitive substring search on breed and name"""
+        # Here I am testing that the trigram search matches either field and follows updates and deletes.
+        self.shelter.create({"name": "Biscuit", "breed": "Labrador Retriever Mix"})
+        self.assertEqual(len(self.shelter.read({}, search="LABRA")), 1)
+        self.assertEqual(len(self.shelter.read({}, search="test ani")), 1)
+        self.shelter.update({"name": "Biscuit"}, {"name": "Gravy"})
+        self.assertEqual(len(self.shelter.read({}, search="bisc", bypass_cache=True)), 0)
+        self.assertEqual(len(self.shelter.read({"breed": "Labrador Retriever Mix"}, search="grav")), 1)
+        self.shelter.delete({"name": "Gravy"})
+        self.assertEqual(self.shelter.search_ids("grav"), set())
+
+    def test_broad_search_uses_regex(self):
+        """Test that a search matching more than SEARCH_ID_LIMIT documents is not sent as an `_id` list"""
+        # Here I am testing that a short search keeps the MongoDB query small and still returns the same documents.
+        self.shelter.create_many([{"name": "Animal %d" % index, "breed": "Test Breed"} for index in range(5)])
+        self.shelter.SEARCH_ID_LIMIT = 3
+        try:
+            query = self.shelter._apply_search({}, "an")
+            self.assertNotIn("_id", str(query))
+            self.assertEqual(len(self.shelter.read({}, search="an", bypass_cache=True)), 6)
+            self.assertEqual(len(list(self.shelter.read_iter({"breed": "Test Breed"}, search="AN"))[0]), 6)
+            # Narrow searches and in-memory counts still use the `_id`s
+            self.assertIn("_id", self.shelter._apply_search({}, "animal 3"))
+            self.assertEqual(self.shelter.count({}, search="an"), 6)
+        finally:
+            del self.shelter.SEARCH_ID_LIMIT
+
+    def test_group_counts(self):
+        """Test grouped counts per breed"""
+        # Here I am testing that counts are grouped by breed and refreshed after a write to a counted breed.
+        self.shelter.create({"name": "Another Test Animal", "breed": "Test Breed"})
+        self.shelter.create({"name": "Other Animal", "breed": "Other Breed"})
+        self.assertEqual(self.shelter.group_counts("breed"), [("Test Breed", 2), ("Other Breed", 1)])
+        self.shelter.delete({"name": "Other Animal"})
+        self.assertEqual(self.shelter.group_counts("breed", {"breed": {"$in": ["Test Breed", "Other Breed"]}}),
+                         [("Test Breed", 2)])
+
+    def test_column_snapshot_counts(self):
+        """Test counts served from the column snapshot"""
+        # Here I am testing that vectorized counts agree with MongoDB for the filters the dashboard sends, after writes.
+        self.shelter.create_many([
+            {"name": "Dog %d" % index, "breed": "Labrador Retriever Mix" if index % 2 else "Bloodhound",
+             "animal_type": "Dog", "sex_upon_outcome": "Intact Male", "age_upon_outcome_in_weeks": index * 10}
+            for index in range(20)
+        ])
+        self.shelter.update({"name": "Dog 1"}, {"breed": "Bloodhound", "age_upon_outcome_in_weeks": 500})
+        self.shelter.delete({"name": "Dog 2"})
+
+        queries = [
+            {},
+            {"breed": {"$in": ["Bloodhound", "Rottweiler"]}},
+            {"$and": [{"breed": {"$regex": "labrador", "$options": "i"}},
+                      {"age_upon_outcome_in_weeks": {"$gte": 26, "$lte": 156}}]},
+            {"animal_type": "Dog", "age_upon_outcome_in_weeks": {"$gt": 100}},
+            {"breed": {"$ne": "Bloodhound"}},
+        ]
+        for query in queries:
+            self.assertIsNotNone(self.shelter.column_snapshot.count(query), query)
+            self.assertEqual(self.shelter.count(query), self.shelter.collection.count_documents(query), query)
+        self.assertEqual(self.shelter.count({}, search="dog 1"), 11)
+
+        expected = [(result["_id"], result["count"]) for result in self.shelter.collection.aggregate([
+            {"$group": {"_id": "$breed", "count": {"$sum": 1}}}, {"$sort": {"count": -1, "_id": 1}}])]
+        self.assertEqual(self.shelter.group_counts("breed"), expected)
+
+        # Fields outside the snapshot are counted by MongoDB
+        self.assertIsNone(self.shelter.column_snapshot.count({"name": "Dog 3"}))
+        self.assertEqual(self.shelter.count({"name": "Dog 3"}), 1)
+
+    def test_rescue_views_follow_writes(self):
+        """Test rescue view maintenance"""
+        # Here I am testing that an animal joins, moves between and leaves the preset views as it is written.
+        self.shelter.create({"name": "Rescue Dog", "breed": "Newfoundland"})
+        self.assertEqual(self.shelter.rescue_views.count("Water Rescue"), 1)
+        doc_id = self.shelter.read({"name": "Rescue Dog"}, bypass_cache=True)[0]["_id"]
+        self.assertTrue(self.shelter.in_rescue_view("Water Rescue", doc_id))
+        # The filter sent to MongoDB is the view's criteria, not its member list
+        self.assertEqual(self.shelter.rescue_view_filter("Water Rescue"),
+                         {"breed": {"$in": ["Chesapeake Bay Retriever", "Labrador Retriever Mix", "Newfoundland"]}})
+        self.shelter.update({"name": "Rescue Dog"}, {"breed": "Bloodhound"})
+        self.assertEqual(self.shelter.rescue_views.count("Water Rescue"), 0)
+        self.assertEqual(self.shelter.rescue_views.count("Disaster or Individual Tracking"), 1)
+        self.shelter.delete({"name": "Rescue Dog"})
+        self.assertEqual(self.shelter.rescue_views.count("Disaster or Individual Tracking"), 0)
+
+        with self.assertRaises(ValueError):
+            self.shelter.rescue_view_filter("Unknown Rescue")
+
+    def test_define_rescue_view(self):
+        """Test a runtime rescue view with sex and age criteria"""
+        # Here I am testing that a new view is populated from MongoDB and its filter matches the view's own query.
+        self.shelter.create_many([
+            {"name": "Dog %d" % index, "breed": "Labrador Retriever Mix",
+             "sex_upon_outcome": "Intact Male" if index % 2 else "Intact Female", "age_upon_outcome_in_weeks": index * 20}
+            for index in range(10)
+        ])
+        view = RescueView("Young Water Rescue", ["Labrador Retriever Mix"], sexes=["Intact Male"],
+                          min_age=26, max_age=156)
+        self.shelter.define_rescue_view(view)
+        try:
+            self.assertIn("Young Water Rescue", self.shelter.rescue_view_names())
+            expected = self.shelter.collection.count_documents(view.query())
+            self.assertEqual(self.shelter.rescue_view_count("Young Water Rescue"), expected)
+            self.assertEqual(self.shelter.count(self.shelter.rescue_view_filter("Young Water Rescue")), expected)
+
+            self.shelter.update({"name": "Dog 2"}, {"sex_upon_outcome": "Intact Male"})
+            self.assertEqual(self.shelter.rescue_views.count("Young Water Rescue"), expected + 1)
+        finally:
+            self.assertTrue(self.shelter.drop_rescue_view("Young Water Rescue"))
+        self.assertNotIn("Young Water Rescue", self.shelter.rescue_view_names())
+
+    def test_age_range_queries(self):
+        """Test age range queries served from the sorted age index"""
+        # Here I am testing that age ranges, with and without breeds, agree with MongoDB after updates and deletes.
+        self.shelter.create_many([
+            {"name": "Dog %d" % index, "breed": "Labrador Retriever Mix" if index % 3 else "Bloodhound",
+             "age_upon_outcome_in_weeks": (index % 8) * 26}
+            for index in range(40)
+        ])
+        self.shelter.create({"name": "Unknown Age", "breed": "Bloodhound", "age_upon_outcome_in_weeks": "unknown"})
+        self.shelter.update({"name": "Dog 1"}, {"age_upon_outcome_in_weeks": 300})
+        self.shelter.delete({"name": "Dog 2"})
+
+        cases = [(26, 156, None), (None, 52, None), (100, None, None), (26, 156, ["Bloodhound"]),
+                 (26, 156, "Labrador Retriever Mix"), (0, 300, ["Bloodhound", "Labrador Retriever Mix"])]
+        for min_weeks, max_weeks, breeds in cases:
+            query = self.shelter._age_range_query(min_weeks, max_weeks,
+                                                   self.shelter._age_range_breeds(min_weeks, max_weeks, breeds))
+            expected = {document["_id"] for document in self.shelter.collection.find(query, {"_id": 1})}
+            self.assertEqual(self.shelter.age_range_ids(min_weeks, max_weeks, breeds), expected, query)
+            self.assertEqual(self.shelter.count_age_range(min_weeks, max_weeks, breeds), len(expected), query)
+
+        # The filter combines with other criteria
+        combined = {"$and": [self.shelter.age_range_filter(26, 156), {"breed": "Bloodhound"}]}
+        self.assertEqual(self.shelter.count(combined), self.shelter.count_age_range(26, 156, ["Bloodhound"]))
+        with self.assertRaises(ValueError):
+            self.shelter.age_range_ids(156, 26)
+
+    def test_outcome_trends(self):
+        """Test monthly outcome trends served from the rollups"""
+        # Here I am testing that the rollups move documents between months and outcomes as they are written.
+        self.shelter.create_many([
+            {"name": "Dog %d" % index, "animal_type": "Dog", "breed": "Labrador Retriever Mix",
+             "outcome_type": "Adoption" if index % 2 else "Transfer", "datetime": "2017-0%d-11 09:00:00" % (index % 3 + 1)}
+            for index in range(12)
+        ])
+        self.shelter.create({"name": "Cat", "animal_type": "Cat", "breed": "Domestic Shorthair Mix",
+                             "outcome_type": "Adoption", "monthyear": "2017-03-02T10:00:00"})
+        trends = self.shelter.outcome_trends()
+        self.assertEqual(trends["months"], ["2017-01", "2017-02", "2017-03"])
+        self.assertEqual(trends["series"], {"Adoption": [2, 2, 3], "Transfer": [2, 2, 2]})
+
+        self.shelter.update({"name": "Dog 0"}, {"outcome_type": "Adoption"})
+        self.shelter.delete({"name": "Cat"})
+        trends = self.shelter.outcome_trends(by="animal_type", start="2016-12", end="2017-02",
+                                             outcome_type="Adoption", breed_group="Labrador Retriever")
+        self.assertEqual(trends, {"months": ["2016-12", "2017-01", "2017-02"], "series": {"Dog": [0, 3, 2]}})
+
+        # The rollups agree with the raw documents
+        expected = {}
+        for document in self.shelter.collection.find({"outcome_type": {"$exists": True}}):
+            expected[document["outcome_type"]] = expected.get(document["outcome_type"], 0) + 1
+        totals = {group: sum(counts) for group, counts in self.shelter.outcome_trends()["series"].items()}
+        self.assertEqual(totals, expected)
+
+    def test_outcome_trends_before_indexes(self):
+        """Test monthly outcome trends computed by MongoDB while the indexes are not built"""
+        # Here I am testing that the $group fallback buckets dates, date strings and breeds like the rollups do.
+        self.shelter.create_many([
+            {"name": "Dog", "animal_type": "Dog", "breed": "Labrador Retriever Mix", "outcome_type": "Adoption",
+             "datetime": datetime.datetime(2017, 1, 11, 9, 0)},
+            {"name": "Dog 2", "animal_type": "Dog", "breed": "Labrador Retriever/Pit Bull", "outcome_type": "Adoption",
+             "datetime": "2017-01-20 09:00:00"},
+            {"name": "Cat", "animal_type": "Cat", "breed": "Domestic Shorthair Mix", "outcome_type": "Transfer",
+             "monthyear": "2017-03-02T10:00:00"},
+        ])
+        expected = self.shelter.outcome_trends(by="breed_group")
+        self.shelter._indexes_ready.clear()
+        try:
+            self.assertEqual(self.shelter.outcome_trends(by="breed_group"), expected)
+            self.assertEqual(expected["series"]["Labrador Retriever"], [2, 0, 0])
+            # The grouped counts are cached until the next write
+            self.shelter.outcome_trends()
+            hits = self.shelter.cache.stats()["hits"]
+            self.shelter.outcome_trends()
+            self.assertEqual(self.shelter.cache.stats()["hits"], hits + 1)
+        finally:
+            self.shelter._indexes_ready.set()
+
+    def test_location_follows_coordinates(self):
+        """Test GeoJSON location maintenance"""
+        # Here I am testing that the location point is derived on create and re-derived when a coordinate changes.
+        self.shelter.create({"name": "Geo Animal", "location_lat": 30.75, "location_long": -97.48})
+        document = self.shelter.read({"name": "Geo Animal"}, bypass_cache=True)[0]
+        self.assertEqual(document["location"], {"type": "Point", "coordinates": [-97.48, 30.75]})
+
+        self.shelter.update({"name": "Geo Animal"}, {"location_lat": 30.5})
+        document = self.shelter.read({"name": "Geo Animal"}, bypass_cache=True)[0]
+        self.assertEqual(document["location"]["coordinates"], [-97.48, 30.5])
+
+        self.shelter.update({"name": "Geo Animal"}, {"location_lat": None})
+        document = self.shelter.read({"name": "Geo Animal"}, bypass_cache=True)[0]
+        self.assertNotIn("location", document)
+
+        # Documents loaded without the point, e.g. by mongoimport, are backfilled
+        self.shelter.collection.insert_one({"name": "Imported Animal", "location_lat": 30.0, "location_long": -97.0})
+        # The backfill is an explicit step; starting a shelter does not write to the collection
+        AnimalShelter(username='edwardgarcia5_snhu', password='password', host='host.docker.internal', port=27017,
+                      db='AAC_test', collection='animals_test', in_memory_indexes=False)
+        self.assertNotIn("location", self.shelter.collection.find_one({"name": "Imported Animal"}))
+        self.assertEqual(self.shelter.backfill_locations(), 1)
+        self.assertIn("location", self.shelter.read({"name": "Imported Animal"}, bypass_cache=True)[0])
+
+    def test_geo_queries(self):
+        """Test radius and bounding box queries"""
+        # Here I am testing that the map queries only return the animals at the given place, nearest first.
+        self.shelter.create_many([
+            {"name": "Near Animal", "breed": "Geo Breed", "location_lat": 30.76, "location_long": -97.48},
+            {"name": "Far Animal", "breed": "Geo Breed", "location_lat": 30.30, "location_long": -97.70},
+            {"name": "Other Animal", "breed": "Other Breed", "location_lat": 30.75, "location_long": -97.49},
+        ])
+        nearby = self.shelter.animals_within_radius(30.75, -97.48, 5000)
+        self.assertEqual([document["name"] for document in nearby], ["Near Animal", "Other Animal"])
+        nearby = self.shelter.animals_within_radius(30.75, -97.48, 5000, query={"breed": "Geo Breed"})
+        self.assertEqual([document["name"] for document in nearby], ["Near Animal"])
+
+        in_view = self.shelter.animals_in_bbox(30.7, -97.6, 30.8, -97.4, projection={"name": 1})
+        self.assertEqual(sorted(document["name"] for document in in_view), ["Near Animal", "Other Animal"])
+        in_view = self.shelter.animals_in_bbox(30.0, -98.0, 31.0, -97.0, search="far")
+        self.assertEqual([document["name"] for document in in_view], ["Far Animal"])
+
+    def test_ingest_csv(self):
+        """Test bulk CSV ingestion"""
+        # Here I am testing that a CSV is loaded with numeric columns coerced and the breed hash map rebuilt.
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write(",rec_num,name,breed,age_upon_outcome_in_weeks\n")
+            for index in range(5):
+                csv_file.write("%d,%d,CSV Animal %d,CSV Breed,%d.5\n" % (index, index + 1, index, index))
+        try:
+            stats = ingest_csv(self.shelter, csv_file.name, chunk_size=2, workers=2)
+        finally:
+            os.remove(csv_file.name)
+        self.assertEqual(stats["inserted"], 5)
+        self.assertEqual(self.shelter.breed_hash_map.count("CSV Breed"), 5)
+        document = self.shelter.read({"rec_num": 1})[0]
+        self.assertEqual(document["age_upon_outcome_in_weeks"], 0.5)
+        self.assertNotIn("", document)
+
+    def test_ingest_without_in_memory_indexes(self):
+        """Test bulk CSV ingestion through a shelter that skips the in-memory indexes, as the command line does"""
+        # Here I am testing that no index build is started and that reads are answered by MongoDB.
+        shelter = AnimalShelter(username='edwardgarcia5_snhu', password='password', host='host.docker.internal', port=27017,
+                                db='AAC_test', collection='animals_test', create_indexes=False, in_memory_indexes=False)
+        self.assertFalse(shelter.indexes_ready)
+        self.assertIsNone(shelter._build_thread)
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write("rec_num,name,breed\n")
+            for index in range(3):
+                csv_file.write("%d,CSV Animal %d,CSV Breed\n" % (index + 1, index))
+        try:
+            stats = ingest_csv(shelter, csv_file.name, chunk_size=2, workers=1)
+        finally:
+            os.remove(csv_file.name)
+        self.assertEqual(stats["inserted"], 3)
+        self.assertFalse(shelter.indexes_ready)
+        self.assertEqual(shelter.count({"breed": "CSV Breed"}), 3)
+        self.assertEqual(len(shelter.read({}, search="csv animal")), 3)
+
+    def test_export_iter(self):
+        """Test streaming exports of a filtered query"""
+        # Here I am testing that only the filtered documents are exported, in batches, with the requested columns.
+        self.shelter.create_many([{"name": "Export Animal %d" % index, "breed": "Export Breed", "rec_num": index}
+                                  for index in range(25)])
+        chunks = list(self.shelter.export_iter({"breed": "Export Breed"}, columns=["rec_num", "name"],
+                                               sort=[("rec_num", 1)], batch_size=10))
+        self.assertEqual(len(chunks), 3)
+        rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode('utf-8'))))
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(rows[0], {"rec_num": "0", "name": "Export Animal 0"})
+
+        compressed = b"".join(self.shelter.export_iter({}, compression="gzip", search="export animal 1"))
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(compressed).decode('utf-8'))))
+        self.assertEqual(len(rows), 11)
+        self.assertNotIn("_id", rows[0])
+
+        # Columns from field_names cover fields that only a few documents have, not just the first batch
+        self.shelter.create({"name": "Export Animal Late", "breed": "Export Breed", "microchip": "985"})
+        columns = self.shelter.field_names({"_id": 0, "location": 0})
+        chunks = self.shelter.export_iter({"breed": "Export Breed"}, columns=columns, sort=[("rec_num", 1)],
+                                          batch_size=10)
+        rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode('utf-8'))))
+        self.assertEqual([row["microchip"] for row in rows if row["microchip"]], ["985"])
+        self.assertNotIn("location", rows[0])
+
+    def test_field_names(self):
+        """Test the field names collected from every document"""
+        # Here I am testing that a field on a single document is listed and that projections are applied.
+        self.shelter.create({"name": "Chipped Animal", "breed": "Test Breed", "microchip": "985"})
+        fields = self.shelter.field_names()
+        self.assertIn("microchip", fields)
+        self.assertEqual(fields.index("name"), 0 if fields[0] != "_id" else 1)
+        self.assertNotIn("_id", self.shelter.field_names({"_id": 0, "location": 0}))
+        self.assertEqual(self.shelter.field_names({"name": 1, "_id": 0}), ["name"])
+
+    def test_create_many(self):
+        """Test bulk creation"""
+        # Here I am testing that create_many inserts every document and indexes them in one pass.
+        documents = [{"name": "Bulk Animal %d" % index, "breed": "Bulk Breed"} for index in range(50)]
+        result = self.shelter.create_many(documents)
+        self.assertEqual(result["inserted"], 50)
+        self.assertTrue(all(item["status"] == "success" and item["_id"] for item in result["results"]))
+        self.assertEqual(self.shelter.breed_hash_map.count("Bulk Breed"), 50)
+
+    def test_upsert_many_and_bulk_update(self):
+        """Test bulk upserts and updates"""
+        # Here I am testing that upserts insert missing documents, and bulk updates move breeds in the hash map.
+        result = self.shelter.upsert_many([({"name": "Test Animal"}, {"age": 2}),
+                                           ({"name": "New Animal"}, {"breed": "Test Breed"})])
+        self.assertEqual(result["upserted"], 1)
+        self.assertEqual(sum(1 for item in result["results"] if item["upserted_id"]), 1)
+        self.assertEqual(self.shelter.breed_hash_map.count("Test Breed"), 2)
+
+        self.assertEqual(len(self.shelter.read({"breed": "Test Breed"})), 2)
+        result = self.shelter.bulk_update([({"name": "Test Animal"}, {"breed": "Changed Breed"}),
+                                           ({"name": "New Animal"}, {"breed": "Changed Breed"})])
+        self.assertEqual(result["modified"], 2)
+        self.assertEqual(self.shelter.breed_hash_map.count("Changed Breed"), 2)
+        self.assertEqual(len(self.shelter.read({"breed": "Test Breed"})), 0, "Bulk update did not invalidate the cache")
+
+        # An upsert whose data changes a field of its own criteria is still indexed
+        self.shelter.upsert_many([({"name": "Ghost"}, {"name": "Casper", "breed": "Bloodhound"})])
+        self.assertEqual(self.shelter.breed_hash_map.count("Bloodhound"), 1)
+        self.assertEqual(len(self.shelter.search_ids("casper")), 1)
+        self.assertEqual(self.shelter.count({"breed": "Bloodhound"}), 1)
+        self.assertEqual(self.shelter.rescue_view_count("Disaster or Individual Tracking"), 1)
+
+    def test_indexes_and_query_shapes(self):
+        """Test index provisioning and query shape recording"""
+        # Here I am testing that the declared indexes exist and that reads are recorded by their shape.
+        index_names = set(self.shelter.collection.index_information())
+        for _, options in AnimalShelter.INDEXES:
+            self.assertIn(options["name"], index_names)
+        self.shelter.advisor.reset()
+        self.shelter.read({"breed": {"$in": ["Bloodhound", "Rottweiler"]}}, bypass_cache=True)
+        self.shelter.read({"breed": {"$in": ["Newfoundland"]}}, bypass_cache=True)
+        shapes = self.shelter.advisor.shapes()
+        self.assertEqual(shapes[0]["shape"], {"breed": {"$in": 1}})
+        self.assertEqual(shapes[0]["count"], 2)
+
+    def test_read_metrics(self):
+        """Test that reads are recorded in the shared metrics registry"""
+        # Here I am testing that each read adds a latency observation and counts the returned documents.
+        before = REGISTRY.snapshot()["operations"].get("animal_shelter.read", {"count": 0, "documents": 0})
+        self.shelter.read({"name": "Test Animal"}, bypass_cache=True)
+        after = REGISTRY.snapshot()["operations"]["animal_shelter.read"]
+        self.assertEqual(after["count"], before["count"] + 1)
+        self.assertEqual(after["documents"], before["documents"] + 1)
+
     def test_update(self):
         """Test the update operation"""
         # Here I am testing the update functionality to ensure documents can be updated based on provided criteria.
@@ -130,6 +586,180 @@ class TestAnimalShelterCRUD(unittest.TestCase):
         modified_count = self.shelter.update(criteria, update_data)
         self.assertEqual(modified_count, 0, "Update operation should return zero for non-existent data")
 
+    def test_cache_survives_unrelated_write(self):
+        """Test that a write to another breed keeps the cached query"""
+        # Here I am testing that the cache only evicts entries whose breed was touched by the write.
+        # The shelter and its cache are shared by every test, so the hits are compared with their starting value
+        criteria = {"breed": "Test Breed"}
+        self.shelter.read(criteria)
+        hits = self.shelter.cache_info()["hits"]
+        self.shelter.create({"name": "Other Animal", "breed": "Other Breed"})
+        self.shelter.read(criteria)
+        self.assertEqual(self.shelter.cache_info()["hits"], hits + 1, "Unrelated write should not evict the cached query")
+
+    def test_cache_invalidated_by_related_write(self):
+        """Test that a write to the cached breed evicts the cached query"""
+        # Here I am testing that reads after a related update return fresh data rather than stale cached results.
+        criteria = {"breed": "Test Breed"}
+        self.assertEqual(len(self.shelter.read(criteria)), 1)
+        self.shelter.update({"name": "Test Animal"}, {"breed": "Changed Breed"})
+        self.assertEqual(len(self.shelter.read(criteria)), 0, "Cached query was not invalidated by the update")
+        self.assertEqual(len(self.shelter.read({"breed": "Changed Breed"})), 1)
+
+    def test_breed_hash_map_after_update(self):
+        """Test that the breed hash map follows a breed change"""
+        # Here I am testing that an update moves the document to its new breed in the hash map.
+        self.shelter.update({"name": "Test Animal"}, {"breed": "Changed Breed"})
+        self.assertNotIn("Test Breed", self.shelter.breed_hash_map)
+        self.assertEqual(self.shelter.breed_hash_map.count("Changed Breed"), 1)
+
+    def test_breed_hash_map_after_delete(self):
+        """Test that the breed hash map drops deleted documents"""
+        # Here I am testing that the hash map count matches the database after a delete.
+        self.shelter.create({"name": "Second Animal", "breed": "Test Breed"})
+        self.shelter.delete({"name": "Test Animal"})
+        hash_map_count = self.shelter.breed_hash_map.count("Test Breed")
+        db_count = self.shelter.collection.count_documents({"breed": "Test Breed"})
+        self.assertEqual(hash_map_count, db_count, "Hash map and database are out of sync")
+
+    def test_index_snapshot_catch_up(self):
+        """Test that a restart loads the index snapshot and catches up on documents inserted since"""
+        # Here I am testing that a second shelter starts from the saved snapshot plus the out-of-band insert.
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "animals_test.snapshot")
+            first = AnimalShelter(username='edwardgarcia5_snhu', password='password', host='host.docker.internal', port=27017,
+                                  db='AAC_test', collection='animals_test', create_indexes=False,
+                                  background_index_build=False, index_snapshot_path=path)
+            self.assertTrue(os.path.exists(path), "Snapshot was not saved after the build")
+
+            self.shelter.collection.insert_one({"name": "Late Animal", "breed": "Late Breed"})
+            second = AnimalShelter(username='edwardgarcia5_snhu', password='password', host='host.docker.internal', port=27017,
+                                   db='AAC_test', collection='animals_test', create_indexes=False,
+                                   background_index_build=False, index_snapshot_path=path)
+            self.assertTrue(second.indexes_ready)
+            self.assertEqual(second.breed_hash_map.count("Test Breed"), 1)
+            self.assertEqual(second.breed_hash_map.count("Late Breed"), 1)
+
+            # A write discards the snapshot until it is saved again
+            second.create({"name": "Third Animal", "breed": "Test Breed"})
+            self.assertFalse(os.path.exists(path))
+            self.assertTrue(second.save_index_snapshot())
+            self.assertTrue(os.path.exists(path))
+            self.assertFalse(first.save_index_snapshot(), "Unchanged indexes should not be saved again")
+
+    def test_writes_during_index_build(self):
+        """Test that reads fall through to MongoDB and writes are replayed while the indexes are built"""
+        # Here I am testing the state the shelter is in while its background build is still running.
+        shelter = AnimalShelter(username='edwardgarcia5_snhu', password='password', host='host.docker.internal', port=27017,
+                                db='AAC_test', collection='animals_test', create_indexes=False, background_index_build=False)
+        shelter._indexes_ready.clear()
+        shelter._index_building = True
+
+        shelter.create({"name": "Queued Animal", "breed": "Queued Breed"})
+        self.assertEqual(len(shelter.search_ids("queued")), 1, "Search should fall through to MongoDB")
+        self.assertEqual(len(shelter.read({}, search="test animal")), 1)
+
+        shelter._build_indexes(use_snapshot=False)
+        self.assertTrue(shelter.indexes_ready)
+        self.assertEqual(shelter.breed_hash_map.count("Queued Breed"), 1)
+        self.assertEqual(len(shelter.search_ids("queued")), 1)
+
+    def test_stale_indexes_are_refreshed(self):
+        """Test that counts pick up writes made by another process within index_max_staleness"""
+        # Here I am testing a document inserted directly into the collection, as another dashboard or a bulk
+        # load would, once the indexes are older than the staleness bound.
+        shelter = AnimalShelter(username='edwardgarcia5_snhu', password='password', host='host.docker.internal', port=27017,
+                                db='AAC_test', collection='animals_test', create_indexes=False, background_index_build=False,
+                                index_max_staleness=60)
+        shelter.collection.insert_one({"name": "Outside Animal", "breed": "Test Breed"})
+        self.assertEqual(shelter.count({"breed": "Test Breed"}), 1, "Indexes within the bound answer from memory")
+
+        shelter._indexes_synced_at -= 120
+        self.assertEqual(shelter.count({"breed": "Test Breed"}), 2)
+        if shelter._build_thread is not None:
+            shelter._build_thread.join()
+        self.assertTrue(shelter.indexes_ready)
+        self.assertEqual(shelter.breed_hash_map.count("Test Breed"), 2)
+        self.assertEqual(shelter.group_counts("breed", {"breed": "Test Breed"}), [("Test Breed", 2)])
+
+        # A forced refresh sees another process's write right away, without waiting for the bound
+        shelter.collection.insert_one({"name": "Another Outside Animal", "breed": "Test Breed"})
+        self.assertEqual(shelter.group_counts("breed", {"breed": "Test Breed"}), [("Test Breed", 2)])
+        self.assertEqual(shelter.group_counts("breed", {"breed": "Test Breed"}, bypass_cache=True), [("Test Breed", 3)])
+
+    def test_superseded_build_is_discarded(self):
+        """Test that only the latest index build installs its indexes"""
+        # Here I am testing that an older build, like the constructor's background build racing rebuild_indexes,
+        # stops without installing anything once a newer build has started.
+        shelter = AnimalShelter(username='edwardgarcia5_snhu', password='password', host='host.docker.internal', port=27017,
+                                db='AAC_test', collection='animals_test', create_indexes=False, background_index_build=False)
+        older = shelter._begin_build()
+        newer = shelter._begin_build()
+        shelter.create({"name": "Queued Animal", "breed": "Queued Breed"})
+
+        self.assertFalse(shelter._build_indexes(use_snapshot=False, generation=older))
+        self.assertFalse(shelter.indexes_ready)
+        self.assertTrue(shelter._build_indexes(use_snapshot=False, generation=newer))
+        self.assertEqual(shelter.breed_hash_map.count("Queued Breed"), 1)
+
+        shelter.rebuild_indexes()
+        self.assertTrue(shelter.indexes_ready)
+        self.assertEqual(shelter.breed_hash_map.count("Test Breed"), 1)
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "File ownership and permission checks apply on POSIX systems")
+    def test_untrusted_snapshot_is_refused(self):
+        """Test that a snapshot other users could have written is not unpickled"""
+        # Here I am testing that a group or world writable snapshot file or directory is ignored instead of loaded.
+        with tempfile.TemporaryDirectory() as directory:
+            os.chmod(directory, 0o700)
+            path = os.path.join(directory, "animals_test.snapshot")
+            index_snapshot.save_snapshot(path, {"collection": "animals_test"}, {"breed": BreedIndex()})
+            self.assertEqual(index_snapshot.load_snapshot(path)["stamp"], {"collection": "animals_test"})
+
+            os.chmod(path, 0o666)
+            self.assertIsNone(index_snapshot.load_snapshot(path), "A world writable snapshot should be refused")
+            os.chmod(path, 0o600)
+            os.chmod(directory, 0o777)
+            self.assertIsNone(index_snapshot.load_snapshot(path), "A snapshot in a shared directory should be refused")
+            os.chmod(directory, 0o700)
+
+            link = os.path.join(directory, "link.snapshot")
+            os.symlink(path, link)
+            self.assertIsNone(index_snapshot.load_snapshot(link), "A symbolic link should not be followed")
+
+    def test_write_during_snapshot_save(self):
+        """Test that a write made while the snapshot is written is applied afterwards and discards the snapshot"""
+        # Here I am testing that saving does not hold the index lock: the write goes through during the save.
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "animals_test.snapshot")
+            shelter = AnimalShelter(username='edwardgarcia5_snhu', password='password', host='host.docker.internal',
+                                    port=27017, db='AAC_test', collection='animals_test', create_indexes=False,
+                                    background_index_build=False, index_snapshot_path=path)
+            save_snapshot = animal_shelter_CRUD_revised.save_snapshot
+
+            def save_with_concurrent_write(*args):
+                shelter.create({"name": "Saving Animal", "breed": "Saving Breed"})
+                self.assertEqual(shelter.breed_hash_map.count("Saving Breed"), 0, "The write should be deferred")
+                save_snapshot(*args)
+
+            animal_shelter_CRUD_revised.save_snapshot = save_with_concurrent_write
+            try:
+                self.assertTrue(shelter.save_index_snapshot(force=True))
+            finally:
+                animal_shelter_CRUD_revised.save_snapshot = save_snapshot
+            self.assertEqual(shelter.breed_hash_map.count("Saving Breed"), 1)
+            self.assertFalse(os.path.exists(path), "A snapshot missing the deferred write should be discarded")
+
+    def test_shared_client(self):
+        """Test that shelters with the same connection parameters share one MongoClient"""
+        # Here I am testing that a second shelter reuses the pooled client instead of opening a new one.
+        other = AnimalShelter(username='edwardgarcia5_snhu', password='password', host='host.docker.internal', port=27017,
+                              db='AAC_test', collection='animals_test', create_indexes=False)
+        self.assertIs(other.client, self.shelter.client)
+        self.assertIs(get_client('edwardgarcia5_snhu', 'password', 'host.docker.internal', 27017), self.shelter.client)
+        # Different pool options get their own client
+        self.assertIsNot(get_client('edwardgarcia5_snhu', 'password', 'host.docker.internal', 27017, maxPoolSize=5),
+                         self.shelter.client)
 
     @classmethod
     def tearDownClass(cls):
@@ -137,5 +767,456 @@ class TestAnimalShelterCRUD(unittest.TestCase):
         # Here I added cleanup to drop the test collection after all tests are completed to avoid leftover test data.
         cls.shelter.collection.drop()
 
+class TestAsyncAnimalShelter(unittest.TestCase):
+    """Unit tests for the asyncio wrapper, sharing the test collection with TestAnimalShelterCRUD"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Here I wrapped a test AnimalShelter so the async and blocking APIs share one cache and one set of indexes.
+        cls.shelter = AnimalShelter(username='edwardgarcia5_snhu', password='password', host='host.docker.internal', port=27017,
+                                    db='AAC_test', collection='animals_test', background_index_build=False)
+        cls.async_shelter = AsyncAnimalShelter(shelter=cls.shelter, max_workers=4)
+
+    def setUp(self):
+        self.shelter.collection.delete_many({})
+        self.shelter.rebuild_indexes()
+
+    def test_async_crud(self):
+        """Test create, read, update and delete through the async API"""
+        # Here I am testing that every awaited operation behaves like its blocking counterpart.
+        async def scenario():
+            self.assertTrue(await self.async_shelter.create({"name": "Async Animal", "breed": "Async Breed"}))
+            self.assertEqual(len(await self.async_shelter.read({"breed": "Async Breed"})), 1)
+            self.assertTrue(await self.async_shelter.update({"name": "Async Animal"}, {"breed": "Changed Breed"}))
+            self.assertEqual(len(await self.async_shelter.read({"breed": "Async Breed"})), 0)
+            self.assertTrue(await self.async_shelter.delete({"name": "Async Animal"}))
+            self.assertEqual(len(await self.async_shelter.read({"breed": "Changed Breed"}, bypass_cache=True)), 0)
+
+        asyncio.run(scenario())
+        self.assertEqual(self.shelter.breed_hash_map.count("Changed Breed"), 0)
+
+    def test_concurrent_reads_are_deduplicated(self):
+        """Test that identical reads in flight at the same time share one database query"""
+        # Here I am testing that ten concurrent identical reads run the query once.
+        self.shelter.create({"name": "Async Animal", "breed": "Async Breed"})
+        calls = []
+        original_read = self.shelter.read
+
+        def slow_read(*args, **kwargs):
+            calls.append(args)
+            time.sleep(0.05)
+            return original_read(*args, **kwargs)
+
+        self.shelter.read = slow_read
+        try:
+            async def scenario():
+                return await asyncio.gather(*(self.async_shelter.read({"breed": "Async Breed"}) for _ in range(10)))
+            results = asyncio.run(scenario())
+        finally:
+            del self.shelter.read
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(len(result) == 1 for result in results))
+        self.assertGreaterEqual(self.async_shelter.cache_info()["deduplicated_reads"], 9)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.async_shelter.close()
+        cls.shelter.collection.drop()
+
+class TestQueryCache(unittest.TestCase):
+    """Unit tests for the QueryCache data structure that do not require MongoDB"""
+
+    def test_ttl_expiry(self):
+        """Test that entries expire after the TTL"""
+        cache = QueryCache(ttl=0.01)
+        query = {"breed": "Test Breed"}
+        cache.put(make_hashable(query), query, [{"breed": "Test Breed"}])
+        time.sleep(0.02)
+        self.assertIsNone(cache.get(make_hashable(query)), "Expired entry was returned")
+
+    def test_memory_budget(self):
+        """Test that the least recently used entries are evicted to stay within the byte budget"""
+        cache = QueryCache(max_bytes=200)
+        for index in range(10):
+            query = {"name": "Animal %d" % index}
+            cache.put(make_hashable(query), query, [{"name": "Animal %d" % index, "breed": "Test Breed"}])
+        self.assertLessEqual(cache.stats()["current_bytes"], 200)
+        self.assertIsNotNone(cache.get(make_hashable({"name": "Animal 9"})), "Most recent entry was evicted")
+        self.assertIsNone(cache.get(make_hashable({"name": "Animal 0"})), "Oldest entry was not evicted")
+
+    def test_unconstrained_query_invalidated_by_any_write(self):
+        """Test that queries without equality filters are evicted by every write"""
+        cache = QueryCache()
+        query = {"age": {"$gt": 5}}
+        cache.put(make_hashable(query), query, [])
+        cache.invalidate([{"name": "Anything"}])
+        self.assertEqual(len(cache), 0)
+
+
+class TestBreedIndex(unittest.TestCase):
+    """Unit tests for the compact BreedIndex that do not require MongoDB"""
+
+    def test_move_and_remove(self):
+        """Test that counts follow breed changes and removals"""
+        index = BreedIndex()
+        index.add(1, "Test Breed")
+        index.add(2, "Test Breed")
+        index.set(1, "Other Breed")
+        self.assertEqual(index.count("Test Breed"), 1)
+        self.assertEqual(index.get("Other Breed"), [1])
+        self.assertEqual(index.remove(2), "Test Breed")
+        self.assertNotIn("Test Breed", index)
+
+    def test_removals_from_large_breed(self):
+        """Test that removing and moving rows out of the middle of a posting array keeps every breed consistent"""
+        # Here I am testing the O(1) swap-remove against a plain dictionary, including the last posting itself.
+        index = BreedIndex()
+        expected = {}
+        for doc_id in range(300):
+            breed = "Pit Bull Mix" if doc_id % 3 else "Beagle"
+            index.add(doc_id, breed)
+            expected[doc_id] = breed
+        for doc_id in list(range(0, 300, 7)) + [299, 298]:
+            if doc_id % 2:
+                index.remove(doc_id)
+                expected.pop(doc_id, None)
+            else:
+                index.set(doc_id, "Labrador Retriever Mix")
+                expected[doc_id] = "Labrador Retriever Mix"
+        for breed in set(expected.values()):
+            ids = [doc_id for doc_id, value in expected.items() if value == breed]
+            self.assertEqual(sorted(index.get(breed)), ids)
+            self.assertEqual(index.count(breed), len(ids))
+
+    def test_rows_are_reused(self):
+        """Test that rows freed by removals are reused by new documents"""
+        index = BreedIndex()
+        index.add(1, "Test Breed")
+        index.remove(1)
+        index.add(2, "Test Breed")
+        self.assertEqual(len(index._doc_ids), 1)
+        self.assertEqual(index.get("Test Breed"), [2])
+
+    def test_memory_footprint(self):
+        """Test that the reported footprint grows with the number of indexed documents"""
+        index = BreedIndex()
+        empty = index.memory_footprint()
+        for doc_id in range(1000):
+            index.add(doc_id, "Test Breed")
+        self.assertGreater(index.memory_footprint(), empty)
+
+
+class TestRescueViews(unittest.TestCase):
+    """Unit tests for the rescue views that do not require MongoDB"""
+
+    def test_matches_and_query(self):
+        """Test that a view's criteria and its MongoDB filter agree"""
+        view = RescueView("Tracking", ["Bloodhound"], sexes=["Intact Male"], min_age=26)
+        self.assertTrue(view.matches({"breed": "Bloodhound", "sex_upon_outcome": "Intact Male",
+                                      "age_upon_outcome_in_weeks": 26}))
+        self.assertFalse(view.matches({"breed": "Bloodhound", "sex_upon_outcome": "Intact Male"}))
+        self.assertFalse(view.matches({"breed": ["Bloodhound"], "sex_upon_outcome": "Intact Male"}))
+        self.assertEqual(view.query(), {"breed": {"$in": ["Bloodhound"]}, "sex_upon_outcome": {"$in": ["Intact Male"]},
+                                        "age_upon_outcome_in_weeks": {"$gte": 26}})
+        with self.assertRaises(ValueError):
+            RescueView("Empty", [])
+
+    def test_membership(self):
+        """Test that documents move between views as they change"""
+        views = RescueViews()
+        views.set_document(1, {"breed": "Newfoundland"})
+        self.assertEqual(views.ids("Water Rescue"), {1})
+        views.set_document(1, {"breed": "Rottweiler"})
+        self.assertEqual(views.count("Water Rescue"), 0)
+        self.assertEqual(views.count("Disaster or Individual Tracking"), 1)
+        views.remove(1)
+        self.assertEqual(views.count("Disaster or Individual Tracking"), 0)
+        self.assertIsNone(views.ids("Unknown"))
+        self.assertTrue(views.drop_view("Water Rescue"))
+        self.assertNotIn("Water Rescue", views)
+
+
+class TestSortedRangeIndex(unittest.TestCase):
+    """Unit tests for the sorted range index that do not require MongoDB"""
+
+    def test_ranges(self):
+        """Test inclusive and exclusive bounds and that values outside real numbers are not indexed"""
+        index = SortedRangeIndex("age_upon_outcome_in_weeks")
+        for doc_id, age in enumerate([52, 26, 156, 52, 10, "old", None, True, float("nan")]):
+            index.set(doc_id, age)
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index.ids(26, 156), [1, 0, 3, 2])
+        self.assertEqual(index.ids(26, 156, include_low=False, include_high=False), [0, 3])
+        self.assertEqual(index.count(high=52), 4)
+        self.assertEqual(index.count(200), 0)
+        self.assertEqual(index.count(100, 50), 0)
+
+    def test_equal_values_are_moved_and_removed(self):
+        """Test that the right entry is found among many equal values"""
+        index = SortedRangeIndex("age_upon_outcome_in_weeks")
+        for doc_id in range(100):
+            index.set(doc_id, 52)
+        index.set(40, 104)
+        self.assertEqual(index.value_of(40), 104.0)
+        self.assertEqual(index.remove(60), 52.0)
+        self.assertIsNone(index.remove(60))
+        self.assertEqual(index.ids(52, 52), [doc_id for doc_id in range(100) if doc_id not in (40, 60)])
+        self.assertEqual(index.ids(100), [40])
+        index.set(41, "unknown")
+        self.assertNotIn(41, index)
+        self.assertGreater(index.memory_footprint(), 0)
+
+    def test_bulk_load_matches_set(self):
+        """Test that a bulk load builds the same index as inserting each document, and stays writable"""
+        pairs = [(doc_id, (doc_id * 37) % 11) for doc_id in range(200)] + [(5, "unknown"), (6, 3)]
+        loaded = SortedRangeIndex("age_upon_outcome_in_weeks")
+        loaded.bulk_load(pairs)
+        inserted = SortedRangeIndex("age_upon_outcome_in_weeks")
+        for doc_id, value in pairs:
+            inserted.set(doc_id, value)
+        self.assertEqual(len(loaded), 199)
+        self.assertEqual(sorted(loaded.ids(2, 7)), sorted(inserted.ids(2, 7)))
+        values = [loaded.value_of(doc_id) for doc_id in loaded.ids()]
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(loaded.count(3, 3), inserted.count(3, 3))
+
+        loaded.set(10, 100)
+        self.assertEqual(loaded.remove(20), (20 * 37 % 11) * 1.0)
+        self.assertEqual(loaded.ids(50), [10])
+        self.assertNotIn(20, loaded.ids())
+
+
+class TestOutcomeRollups(unittest.TestCase):
+    """Unit tests for the outcome rollups that do not require MongoDB"""
+
+    def test_months_and_breed_groups(self):
+        """Test how months and breed groups are derived from a document"""
+        self.assertEqual(month_of({"datetime": "2017-04-11 09:00:00"}), "2017-04")
+        self.assertEqual(month_of({"datetime": "", "monthyear": "2016-05-06T10:49:00"}), "2016-05")
+        self.assertIsNone(month_of({"datetime": "2016-13-01"}))
+        self.assertEqual(breed_group("Labrador Retriever Mix"), "Labrador Retriever")
+        self.assertEqual(breed_group("Labrador Retriever/Pit Bull"), "Labrador Retriever")
+        self.assertIsNone(breed_group(""))
+
+    def test_set_is_idempotent(self):
+        """Test that documents are counted once and move between buckets"""
+        rollups = OutcomeRollups()
+        document = {"datetime": "2017-12-01", "outcome_type": "Adoption", "animal_type": "Cat"}
+        rollups.set(1, document)
+        rollups.set(1, document)
+        rollups.set(2, dict(document, datetime="2018-02-01"))
+        trends = rollups.monthly_counts(by=None)
+        self.assertEqual(trends, {"months": ["2017-12", "2018-01", "2018-02"], "series": {"All": [1, 0, 1]}})
+        rollups.set(2, dict(document, datetime=None))
+        self.assertEqual(len(rollups), 1)
+        self.assertTrue(rollups.remove(1))
+        self.assertEqual(rollups.monthly_counts(), {"months": [], "series": {}})
+        with self.assertRaises(ValueError):
+            rollups.monthly_counts(by="color")
+
+    def test_rollups_from_csv(self):
+        """Test the bulk build from a CSV file"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outcomes.csv")
+            with open(path, "w", newline="") as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(["rec_num", "animal_type", "breed", "datetime", "outcome_type"])
+                writer.writerow(["1", "Dog", "Bloodhound Mix", "2017-04-11 09:00:00", "Adoption"])
+                writer.writerow(["2", "Dog", "Bloodhound", "2017-05-11 09:00:00", "Adoption"])
+            trends = rollups_from_csv(path).monthly_counts(by="breed_group")
+        self.assertEqual(trends, {"months": ["2017-04", "2017-05"], "series": {"Bloodhound": [1, 1]}})
+
+
+class TestColumnarSnapshot(unittest.TestCase):
+    """Unit tests for the column snapshot that do not require MongoDB"""
+
+    def test_encoding_and_masks(self):
+        """Test that values are encoded once and filters are evaluated as masks"""
+        snapshot = ColumnarSnapshot(capacity=2)
+        for doc_id in range(5):
+            snapshot.set(doc_id, {"breed": "Test Breed" if doc_id < 3 else "Other Breed",
+                                  "age_upon_outcome_in_weeks": doc_id * 10})
+        snapshot.set(5, {"name": "No Breed"})
+        self.assertEqual(len(snapshot), 6)
+        self.assertEqual(snapshot._categories["breed"], ["Test Breed", "Other Breed"])
+        self.assertEqual(snapshot.count({"breed": "Test Breed"}), 3)
+        self.assertEqual(snapshot.count({"breed": None}), 1)
+        self.assertEqual(snapshot.count({"age_upon_outcome_in_weeks": {"$gte": 10, "$lt": 40}}), 3)
+        self.assertEqual(snapshot.ids({"$or": [{"breed": "Other Breed"}, {"_id": {"$in": [0]}}]}), [0, 3, 4])
+        self.assertEqual(snapshot.value_counts("breed"), [("Test Breed", 3), ("Other Breed", 2), (None, 1)])
+        self.assertIsNone(snapshot.count({"breed": {"$exists": True}}))
+
+    def test_rows_are_reused(self):
+        """Test that removed documents no longer match and their rows are reused"""
+        snapshot = ColumnarSnapshot()
+        snapshot.set(1, {"breed": "Test Breed"})
+        snapshot.remove(1)
+        self.assertEqual(snapshot.count({"breed": "Test Breed"}), 0)
+        snapshot.set(2, {"breed": "Test Breed"})
+        self.assertEqual(len(snapshot._doc_ids), 1)
+        self.assertEqual(snapshot.ids({"breed": "Test Breed"}), [2])
+
+    def test_mixed_types_fall_back(self):
+        """Test that a field holding an unexpected type is no longer answered from the snapshot"""
+        snapshot = ColumnarSnapshot()
+        snapshot.set(1, {"age_upon_outcome_in_weeks": 10})
+        self.assertEqual(snapshot.count({"age_upon_outcome_in_weeks": 10}), 1)
+        snapshot.set(2, {"age_upon_outcome_in_weeks": "ten"})
+        self.assertIsNone(snapshot.count({"age_upon_outcome_in_weeks": 10}))
+
+
+class TestExportStream(unittest.TestCase):
+    """Unit tests for the export writers that do not require MongoDB"""
+
+    def test_empty_csv_has_header(self):
+        self.assertEqual(b"".join(iter_export([], "csv", columns=["name", "breed"])), b"name,breed\r\n")
+
+    def test_formats(self):
+        # Here I am testing the file names and that unsupported formats and compressions are rejected up front.
+        self.assertEqual(parquet_available(), importlib.util.find_spec("pyarrow") is not None)
+        self.assertEqual(export_filename("animals", "csv", "gzip"), "animals.csv.gz")
+        self.assertEqual(export_filename("animals", "parquet"), "animals.parquet")
+        self.assertRaises(ValueError, iter_export, [], "xlsx")
+        self.assertRaises(ValueError, iter_export, [], "csv", "snappy")
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_parquet(self):
+        # Here I am testing that each batch becomes a row group and numbers keep a numeric type.
+        import pyarrow.parquet as parquet
+        batches = [[{"name": "Animal %d" % index, "age_upon_outcome_in_weeks": index * 1.5}
+                    for index in range(start, start + 5)] for start in (0, 5)]
+        table_file = parquet.ParquetFile(io.BytesIO(b"".join(iter_export(batches, "parquet"))))
+        self.assertEqual(table_file.metadata.num_row_groups, 2)
+        table = table_file.read()
+        self.assertEqual(table.num_rows, 10)
+        self.assertEqual(table.column("age_upon_outcome_in_weeks").to_pylist()[9], 13.5)
+
+    def test_tickets_are_single_use(self):
+        tickets = ExportTickets(ttl=60)
+        ticket = tickets.create({"query": {}})
+        self.assertEqual(tickets.redeem(ticket), {"query": {}})
+        self.assertIsNone(tickets.redeem(ticket))
+        expired = ExportTickets(ttl=0)
+        self.assertIsNone(expired.redeem(expired.create({"query": {}})))
+
+
+class TestMetrics(unittest.TestCase):
+    """Unit tests for the latency histograms and metrics registry"""
+
+    def test_quantiles(self):
+        """Test that quantile estimates fall in the right buckets"""
+        histogram = LatencyHistogram()
+        for _ in range(90):
+            histogram.observe(0.002)
+        for _ in range(10):
+            histogram.observe(0.2)
+        self.assertTrue(0.001 < histogram.quantile(0.5) <= 0.0025)
+        self.assertTrue(0.1 < histogram.quantile(0.99) <= 0.25)
+
+    def test_render_prometheus(self):
+        """Test the Prometheus text output for histograms, errors and gauges"""
+        registry = MetricsRegistry()
+
+        @registry.instrument("test.operation", len)
+        def operation(fail=False):
+            if fail:
+                raise ValueError("failed")
+            return [1, 2, 3]
+
+        operation()
+        with self.assertRaises(ValueError):
+            operation(fail=True)
+        registry.register_gauge("test_gauge", lambda: 0.5, {"collection": "animals_test"})
+        text = registry.render_prometheus()
+        self.assertIn('operation_duration_seconds_count{operation="test.operation"} 2', text)
+        self.assertIn('operation_errors_total{operation="test.operation"} 1', text)
+        self.assertIn('operation_documents_total{operation="test.operation"} 3', text)
+        self.assertIn('test_gauge{collection="animals_test"} 0.5', text)
+
+
+class TestQueryShape(unittest.TestCase):
+    """Unit tests for query shape normalization used by the index advisor"""
+
+    def test_query_shape(self):
+        """Test that values are removed while fields and operators are kept"""
+        shape = query_shape({"$or": [{"breed": "Bloodhound"}, {"age": {"$gt": 26, "$lt": 156}}]})
+        self.assertEqual(shape, {"$or": [{"breed": 1}, {"age": {"$gt": 1, "$lt": 1}}]})
+
+
+class TestGeoQuery(unittest.TestCase):
+    """Test cases for the geospatial helpers."""
+
+    def test_geo_point(self):
+        # Here I am testing that points are only built from valid coordinates, longitude first.
+        self.assertEqual(geo_point({"location_lat": 30.75, "location_long": -97.48}),
+                         {"type": "Point", "coordinates": [-97.48, 30.75]})
+        self.assertIsNone(geo_point({"location_lat": 30.75}))
+        self.assertIsNone(geo_point({"location_lat": 91, "location_long": 0}))
+        self.assertIsNone(geo_point({"location_lat": "30.75", "location_long": -97.48}))
+
+    def test_bbox_filter(self):
+        # Here I am testing that small boxes are one polygon, and wide or wrapped boxes are split at the antimeridian.
+        box = bbox_filter(30.0, -98.0, 31.0, -97.0)
+        ring = box["location"]["$geoWithin"]["$geometry"]["coordinates"][0]
+        self.assertEqual(ring[0], [-98.0, 30.0])
+        self.assertEqual(ring[2], [-97.0, 31.0])
+
+        wrapped = bbox_filter(-10, 170, 10, -170)["$or"]
+        edges = [branch["location"]["$geoWithin"]["$geometry"]["coordinates"][0] for branch in wrapped]
+        self.assertEqual([(ring[0][0], ring[1][0]) for ring in edges], [(170, 180), (-180, -170)])
+
+        world = bbox_filter(-80, -400, 80, 400)["$or"]
+        self.assertEqual(len(world), 3)
+        self.assertRaises(ValueError, bbox_filter, 31.0, -98.0, 30.0, -97.0)
+
+
+class TestDataTableQuery(unittest.TestCase):
+    """Unit tests for translating DataTable sort and filter expressions into MongoDB queries"""
+
+    def test_filter_query(self):
+        """Test that combined filter expressions become a MongoDB $and query"""
+        query = translate_filter_query('{breed} contains "Lab" && {age_upon_outcome_in_weeks} >= 52')
+        self.assertEqual(query, {"$and": [{"breed": {"$regex": "Lab", "$options": "i"}},
+                                          {"age_upon_outcome_in_weeks": {"$gte": 52}}]})
+        self.assertEqual(translate_filter_query(""), {})
+
+    # Here I am testing that the i and s prefixes decide whether text comparisons ignore case.
+    def test_case_prefixes(self):
+        """Test that scontains is case-sensitive while contains and icontains are not"""
+        self.assertEqual(translate_filter_query('{breed} scontains "Lab"'), {"breed": {"$regex": "Lab"}})
+        self.assertEqual(translate_filter_query('{breed} icontains "Lab"'), {"breed": {"$regex": "Lab", "$options": "i"}})
+        self.assertEqual(translate_filter_query('{breed} contains "Lab"'), {"breed": {"$regex": "Lab", "$options": "i"}})
+        self.assertEqual(translate_filter_query('{name} ieq "max"'), {"name": {"$regex": "^max$", "$options": "i"}})
+        self.assertEqual(translate_filter_query('{name} seq "Max"'), {"name": "Max"})
+
+    # Here I am testing the unary operators of the filter row.
+    def test_unary_operators(self):
+        """Test that is blank, is nil and their negations become MongoDB conditions"""
+        self.assertEqual(translate_filter_query("{name} is blank"), {"name": {"$in": [None, ""]}})
+        self.assertEqual(translate_filter_query("{name} is not blank"), {"name": {"$nin": [None, ""]}})
+        self.assertEqual(translate_filter_query("{name} is nil"), {"name": {"$eq": None}})
+        self.assertEqual(translate_filter_query("{name} is not nil"), {"name": {"$ne": None}})
+
+    # Here I am testing that an unsupported expression is rejected instead of being dropped from the query.
+    def test_unsupported_expression(self):
+        """Test that unknown operators raise ValueError"""
+        with self.assertRaises(ValueError):
+            translate_filter_query("{age_upon_outcome_in_weeks} is prime")
+        with self.assertRaises(ValueError):
+            translate_filter_query('{breed} contains "Lab" && {name} in "Max"')
+
+    # Here I am testing that && inside a quoted value does not split the expression.
+    def test_quoted_separator(self):
+        """Test that a quoted value containing && is kept whole"""
+        query = translate_filter_query('{name} = "Tom && Jerry" && {breed} contains \'A && B\'')
+        self.assertEqual(query, {"$and": [{"name": "Tom && Jerry"}, {"breed": {"$regex": "A\\ \\&\\&\\ B", "$options": "i"}}]})
+
+    def test_sort_by(self):
+        """Test that DataTable sort_by becomes a MongoDB sort specification"""
+        sort = translate_sort_by([{"column_id": "breed", "direction": "desc"}, {"column_id": "name", "direction": "asc"}])
+        self.assertEqual(sort, [("breed", -1), ("name", 1)])
+
+
 if __name__ == '__main__':
     unittest.main()
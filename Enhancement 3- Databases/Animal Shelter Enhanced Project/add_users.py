@@ -10,6 +10,7 @@
 # 1. Adding new users with secure password hashing using bcrypt.
 # 2. Assigning roles to users for Role-Based Access Control (RBAC).
 # 3. Verifying user addition by retrieving and displaying all users from the database.
+# 4. Adding every user in one bulk call, with passwords hashed in parallel and one outcome reported per user.
 
 from user_management import UserManagement
 
@@ -26,10 +27,9 @@ users = [
 ]
 
 # Add users to the database
-# Iterates through the user list, adds each user to the MongoDB database, and prints the result of the operation.
-for user in users:
-    response = user_manager.add_user(user["username"], user["password"], user["role"])
-    print(f"{user['username']} - {response}")
+# Adds the whole user list in one bulk call and prints the outcome for each user.
+for outcome in user_manager.add_users(users):
+    print(f"{outcome['username']} - {outcome['message']}")
 
 # Retrieve and display all users in the database
 # Fetches all users from the database using the `get_all_users` method and prints their information.
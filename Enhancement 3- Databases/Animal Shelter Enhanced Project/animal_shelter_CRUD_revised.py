@@ -1,8 +1,40 @@
-from pymongo import MongoClient
 # Imported logging 
 import logging
-# Imported functools for caching
-from functools import lru_cache
+# Imported the standard library modules for shutdown hooks, search patterns, the background build and timing
+import atexit
+import re
+import threading
+import time
+from pymongo import InsertOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+# Imported json_util to encode keyset pagination tokens
+from bson import json_util
+# Imported the dependency-aware query cache
+from query_cache import QueryCache, make_hashable
+# Imported the compact breed index
+from breed_index import BreedIndex
+# Imported the trigram index for substring search
+from ngram_index import NGramIndex
+# Imported index provisioning and the query-shape advisor
+from index_advisor import QueryAdvisor, ensure_indexes
+# Imported the shared metrics registry for latency histograms and gauges
+from metrics import REGISTRY, count_results
+# Imported the shared, pooled MongoClient registry
+from mongo_client_registry import get_client
+# Imported snapshot persistence for the in-memory indexes
+from index_snapshot import save_snapshot, load_snapshot, discard_snapshot
+# Imported the column store used for vectorized counts
+from columnar_snapshot import ColumnarSnapshot, CATEGORICAL_FIELDS, NUMERIC_FIELDS
+# Imported the GeoJSON helpers for the map queries
+from geo_query import LOCATION_FIELD, COORDINATE_FIELDS, geo_point, radius_filter, bbox_filter
+# Imported the streaming CSV and Parquet writers
+from export_stream import DEFAULT_COMPRESSION, iter_export
+# Imported the materialized rescue views
+from rescue_views import VIEW_FIELDS, DEFAULT_RESCUE_VIEWS, RescueViews
+# Imported the sorted index used for age ranges
+from range_index import SortedRangeIndex
+# Imported the monthly outcome rollups
+from outcome_rollups import ROLLUP_FIELDS, OutcomeRollups, bucket_counts, rollup_pipeline, series_from_counts
 
 # EJG Animal Shelter CRUD Operations - Enhanced Version
 # Author: Edward Garcia
@@ -16,14 +48,91 @@ from functools import lru_cache
 #    - This helps monitor CRUD operations, debug errors, and maintain an audit trail.
 #
 # Enhancement 2 - Data Structures and Algorithms Additions:
-# 1. Implemented functools.lru_cache for optimized repeated read operations.
-#    - Using LRU (Least Recently Used) cache will improve the speed of repeated queries by caching results.
+# 1. Implemented a query cache for optimized repeated read operations.
+#    - Caching results will improve the speed of repeated queries.
+#    - The cache (see query_cache.py) records which field values each query depends on, so a write only evicts the
+#      entries it could affect instead of clearing everything. Entries also expire after a TTL and the cache is
+#      bounded by a memory budget in bytes.
 
 # 2. Introduced a hash map for breed attribute indexing.
 #    - The hash map allows for O(1) time complexity for breed-based lookups, significantly speeding up the filtering process.
+#    - The hash map is maintained incrementally on create, update and delete from the `_id`s and breeds each write touched,
+#      so it stays consistent with the database without rescanning the collection.
+#    - The hash map is a compact BreedIndex (see breed_index.py): interned breed keys mapping to arrays of integer rows,
+#      with O(1) counts and a deep memory footprint report.
 
 # 3. Added binary search for sorted attributes.
 #    - Binary search has been implemented for sorted fields like age for example, to reduce search time complexity to O(log n).
+#    - `age_index` is a SortedRangeIndex (see range_index.py) over age_upon_outcome_in_weeks, maintained on every write.
+#      `age_range_ids`, `age_range_filter` and `count_age_range` answer ranges such as 26 to 156 weeks, optionally for
+#      a list of breeds, in O(log n + k) without a database scan.
+
+# 4. Added a streaming read mode (`read_iter`).
+#    - Yields batches straight from the cursor with projection, sort and limit, so large results are never held in memory at once.
+
+# 5. Added keyset pagination (`read_page`).
+#    - Each page continues from the sort key of the last document seen instead of skipping over every earlier document.
+
+# 6. Added a trigram index over breed and name for the dashboard search.
+#    - `read`, `read_iter` and `read_page` accept `search`, which is resolved to matching `_id`s in memory
+#      (see ngram_index.py) and pushed into the MongoDB query.
+#    - Searches matching more than SEARCH_ID_LIMIT documents (e.g. one or two letters) are sent as the equivalent
+#      case-insensitive regex instead, so a query never carries an `_id` list near the 16 MB document limit.
+
+# 7. Added server-side grouped counts (`group_counts`).
+#    - Charts receive (value, count) pairs from a MongoDB `$group` instead of raw documents, and the
+#      results are cached by filter alongside read results.
+
+# 8. Added bulk writes (`create_many`, `upsert_many`, `bulk_update`).
+#    - Thousands of operations go to MongoDB in a single `bulk_write`, followed by one cache invalidation
+#      and one index maintenance pass.
+
+# 9. Declared the MongoDB indexes the queries rely on (`INDEXES`) and ensure them at startup.
+#    - A QueryAdvisor (see index_advisor.py) records the shape of every query sent to MongoDB and can run explain()
+#      to flag shapes that fall back to a collection scan.
+
+# 10. Instrumented every CRUD method with latency histograms and document counts (see metrics.py), and registered
+#     gauges for the cache hit ratio and in-memory index sizes. The dashboard serves them from `/metrics`.
+
+# 11. Connections come from a shared, pooled MongoClient (see mongo_client_registry.py).
+#     - AnimalShelter and UserManagement reuse one connection pool per set of connection parameters, sized through
+#       `pool_options`, and the client only connects on its first operation.
+
+# 12. The in-memory indexes are built on a background thread, so the constructor returns without scanning the collection.
+#     - Until they are ready, searches are answered by MongoDB and writes are queued and replayed onto the new indexes.
+#     - With `index_snapshot_path`, the built indexes are saved with a version stamp of the collection (see
+#       index_snapshot.py). A restart loads the snapshot and only catches up on the changes made since. The snapshot is
+#       pickled, so its directory must only be writable by the dashboard's account; other files are refused.
+#     - Builds are serialized and numbered: a newer build (e.g. `rebuild_indexes`) cancels the one in flight, so only
+#       the latest build installs its indexes. Snapshots are pickled outside the index lock while writes are deferred.
+
+# 13. Added geospatial queries for the dashboard map (`animals_within_radius`, `animals_in_bbox`).
+#     - Each document keeps a GeoJSON point in `location`, derived from location_lat and location_long on every write
+#       and covered by a `2dsphere` index (see geo_query.py), so the map loads only the animals in view.
+#     - Documents loaded by other tools (e.g. mongoimport) get their point from `backfill_locations`, a one-off step
+#       run with `python ingest_csv.py --backfill-locations` rather than on every startup.
+
+# 14. Added a columnar snapshot of the filterable fields (see columnar_snapshot.py), maintained with the other in-memory
+#     indexes. Text fields are dictionary-encoded and numbers are NumPy arrays, so `group_counts` and `count` evaluate
+#     the dashboard filters as vectorized masks instead of sending an aggregation to MongoDB on every callback.
+#     - Writes through this shelter keep the indexes current; writes by other processes are picked up within
+#       `index_max_staleness` seconds, by replaying the change stream or, on a standalone server, by a background
+#       rebuild during which MongoDB answers the counts.
+
+# 15. Added streaming exports (`export_iter`) of any filtered query as CSV (optionally gzipped) or Parquet.
+#     - Chunks are produced batch by batch from `read_iter` (see export_stream.py), so memory stays bounded and a
+#       download can start as soon as the first batch is read.
+
+# 16. Added materialized rescue views (see rescue_views.py). Each named preset (breeds, optionally sexes and an age range)
+#     keeps the `_id`s of its members in memory, updated incrementally on every write, so `rescue_view_count` and
+#     `in_rescue_view` answer without a query. `rescue_view_filter` returns the view's criteria for MongoDB queries,
+#     which the rescue compound index serves. Views are passed as `rescue_views` or added at runtime.
+
+# 17. Added monthly outcome rollups (see outcome_rollups.py): counts per month, outcome type, animal type and breed
+#     group, maintained with the other in-memory indexes. `outcome_trends` serves trend charts from these counters
+#     instead of reading the raw documents, and `rebuild_indexes` rebuilds them in bulk.
+#     - Scripts that only write, such as ingest_csv.py, pass `in_memory_indexes=False` to skip building the indexes;
+#       running dashboards pick up their writes through `index_max_staleness`.
 
 
 # Configure logging to capture detailed information about CRUD operations
@@ -33,110 +142,1217 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+# Field kept sorted by the age index
+AGE_FIELD = "age_upon_outcome_in_weeks"
+
+
+def _apply_set(document, update_data):
+    """Return the post-image of a document after a `$set` of update_data (top-level fields only)."""
+    post_image = dict(document)
+    for key, value in update_data.items():
+        if "." not in key:
+            post_image[key] = value
+    return post_image
+
+
+def _add_location(document):
+    """Store the GeoJSON point of a new document next to its coordinates, in place."""
+    point = geo_point(document)
+    if point is not None:
+        document[LOCATION_FIELD] = point
+    return document
+
+
+def _location_update(update_data):
+    """
+    Extend a `$set` with the GeoJSON point when it sets both coordinates.
+
+    Returns:
+        tuple: The update to write, and whether the location must be re-derived from the stored documents afterwards
+        (when only one coordinate is set, or the new coordinates are not valid).
+    """
+    if not any(field in update_data for field in COORDINATE_FIELDS):
+        return update_data, False
+    point = geo_point(update_data)
+    if point is None or not all(field in update_data for field in COORDINATE_FIELDS):
+        return update_data, True
+    return dict(update_data, **{LOCATION_FIELD: point}), False
+
+
+def _with_tiebreaker(sort):
+    """Append `_id` to a sort specification so the order is total and pages never overlap."""
+    sort = [(field, direction) for field, direction in (sort or [])]
+    if not any(field == "_id" for field, _ in sort):
+        sort.append(("_id", 1))
+    return sort
+
+
+def _keyset_filter(sort, bookmark):
+    """
+    Build the filter selecting documents that come after a bookmark in the given sort order.
+    - Missing and null values sort first in MongoDB, so they are handled separately from range comparisons.
+    """
+    branches = []
+    prefix = {}
+    for field, direction in sort:
+        value = bookmark.get(field)
+        if direction == 1:
+            if value is None:
+                branches.append(dict(prefix, **{field: {"$ne": None}}))
+            else:
+                branches.append(dict(prefix, **{field: {"$gt": value}}))
+        elif value is not None:
+            branches.append(dict(prefix, **{field: {"$lt": value}}))
+            branches.append(dict(prefix, **{field: None}))
+        prefix[field] = value
+    return {"$or": branches} if branches else {"_id": {"$exists": False}}
+
+
+def _keyset_projection(projection, keys):
+    """
+    Make sure the sort keys are fetched so a bookmark can be built from the last document.
+
+    Returns:
+        tuple: The projection to query with and the fields to strip before returning the documents.
+    """
+    if not projection:
+        return projection, set()
+
+    fetch_projection = dict(projection)
+    inclusion = any(value for field, value in projection.items() if field != "_id")
+    hidden = set()
+    for field in keys:
+        if field in fetch_projection and not fetch_projection[field]:
+            del fetch_projection[field]
+            hidden.add(field)
+        elif inclusion and field != "_id" and field not in fetch_projection:
+            fetch_projection[field] = 1
+            hidden.add(field)
+    return fetch_projection, hidden
+
+
 class AnimalShelter(object):
     """CRUD operations for Animal collection in MongoDB."""
 
-    def __init__(self, username, password, host='host.docker.internal', port=27017, db='AAC', collection='animals'):
-        # Initialize the MongoClient to access MongoDB databases and collections
-        self.client = MongoClient(f'mongodb://{username}:{password}@{host}:{port}/?authSource=admin')
+    # Indexes for the animals collection, as (keys, options) pairs.
+    # - Rescue filters match breed (and sex) by equality and age by range, so the compound index follows that order.
+    # - animal_type lookups and distinct() are served by the animal_type index.
+    # - Radius and bounding box queries are served by the 2dsphere index on the GeoJSON location.
+    INDEXES = [
+        ([("breed", 1), ("sex_upon_outcome", 1), ("age_upon_outcome_in_weeks", 1)], {"name": "rescue_breed_sex_age"}),
+        ([("animal_type", 1), ("breed", 1)], {"name": "animal_type_breed"}),
+        ([(LOCATION_FIELD, "2dsphere")], {"name": "location_2dsphere"}),
+    ]
+
+    # Largest number of matching `_id`s a search adds to a MongoDB query; broader searches are sent as a regex
+    SEARCH_ID_LIMIT = 2000
+
+    def __init__(self, username, password, host='host.docker.internal', port=27017, db='AAC', collection='animals',
+                 cache_max_bytes=64 * 1024 * 1024, cache_ttl=300, create_indexes=True, pool_options=None,
+                 background_index_build=True, index_snapshot_path=None, rescue_views=None, index_max_staleness=300,
+                 in_memory_indexes=True):
+        # Use the shared MongoClient for these connection parameters; pool_options (e.g. {"maxPoolSize": 100})
+        # tune its connection pool. The client connects lazily on the first operation.
+        self.client = get_client(username, password, host, port, **(pool_options or {}))
         self.database = self.client[db]
         self.collection = self.database[collection]
         logging.info("Connected to MongoDB collection: %s", collection)
 
-        # Create a hash map for the breed attribute for efficient search
-        self.breed_hash_map = {}
-        self._populate_breed_hash_map()
+        # Make sure the declared indexes exist and start recording query shapes
+        self.advisor = QueryAdvisor(self.collection)
+        if create_indexes:
+            self.ensure_indexes()
+
+        # Result cache for read(), invalidated per document on writes
+        self.cache = QueryCache(max_bytes=cache_max_bytes, ttl=cache_ttl)
 
-    def _populate_breed_hash_map(self):
+        # In-memory indexes start empty and are installed once built; reads fall through to MongoDB until then
+        self.index_snapshot_path = index_snapshot_path
+        self._rescue_view_definitions = list(DEFAULT_RESCUE_VIEWS if rescue_views is None else rescue_views)
+        self._index_lock = threading.RLock()
+        self._indexes_ready = threading.Event()
+        self._index_building = False
+        self._pending_writes = []
+        # Only one build runs at a time, and only the build with the latest generation installs its indexes
+        self._build_lock = threading.Lock()
+        self._build_generation = 0
+        self._build_thread = None
+        self._build_resume_token = None
+        # Counts are served from the indexes only if they caught up with other processes' writes within this bound
+        self.index_max_staleness = index_max_staleness
+        self._indexes_synced_at = time.monotonic()
+        # Writes made while a snapshot is pickled are deferred, and rescue view changes wait for the save
+        self._snapshot_lock = threading.Lock()
+        self._saving_snapshot = False
+        self._deferred_writes = []
+        self._snapshot_dirty = False
+        self._install_indexes(self._new_indexes())
+
+        self._register_gauges(collection)
+
+        # Without in-memory indexes every read is answered by MongoDB, e.g. for scripts that only write
+        self.in_memory_indexes = in_memory_indexes
+        if not in_memory_indexes:
+            return
+
+        generation = self._begin_build()
+        if background_index_build:
+            self._build_thread = threading.Thread(target=self._build_indexes, args=(True, generation),
+                                                  name="animal-shelter-index-build", daemon=True)
+            self._build_thread.start()
+        else:
+            self._build_indexes(generation=generation)
+
+        if index_snapshot_path:
+            # Save the indexes on a clean shutdown so the next start can load them
+            atexit.register(self.save_index_snapshot)
+
+    def _register_gauges(self, collection):
+        """Expose cache and in-memory index statistics through the shared metrics registry."""
+        labels = {"collection": collection}
+        REGISTRY.register_gauge("animal_shelter_cache_hit_ratio", lambda: self.cache.stats()["hit_ratio"], labels)
+        REGISTRY.register_gauge("animal_shelter_cache_entries", lambda: len(self.cache), labels)
+        REGISTRY.register_gauge("animal_shelter_cache_bytes", lambda: self.cache.stats()["current_bytes"], labels)
+        # The indexes are replaced when they are built, so the gauges look them up on every read
+        REGISTRY.register_gauge("animal_shelter_index_documents", lambda: self.breed_hash_map.document_count(),
+                                dict(labels, index="breed"))
+        REGISTRY.register_gauge("animal_shelter_index_documents", lambda: len(self.search_index),
+                                dict(labels, index="search"))
+        REGISTRY.register_gauge("animal_shelter_index_documents", lambda: len(self.column_snapshot),
+                                dict(labels, index="columns"))
+        REGISTRY.register_gauge("animal_shelter_index_bytes", lambda: self.breed_hash_map.memory_footprint(),
+                                dict(labels, index="breed"))
+        REGISTRY.register_gauge("animal_shelter_index_bytes", lambda: self.column_snapshot.memory_footprint(),
+                                dict(labels, index="columns"))
+        REGISTRY.register_gauge("animal_shelter_index_documents", lambda: len(self.age_index),
+                                dict(labels, index="age"))
+        REGISTRY.register_gauge("animal_shelter_index_bytes", lambda: self.age_index.memory_footprint(),
+                                dict(labels, index="age"))
+        REGISTRY.register_gauge("animal_shelter_index_documents", lambda: len(self.outcome_rollups),
+                                dict(labels, index="rollups"))
+        REGISTRY.register_gauge("animal_shelter_indexes_ready", lambda: 1 if self.indexes_ready else 0, labels)
+
+    def _new_indexes(self):
+        """Create empty in-memory indexes, keyed by the names they are saved under in snapshots."""
+        return {
+            # Hash map for the breed attribute for efficient search
+            "breed": BreedIndex(),
+            # Trigram index over breed and name for case-insensitive substring search
+            "search": NGramIndex(fields=("breed", "name")),
+            # Column store of the filterable fields for vectorized counts
+            "columns": ColumnarSnapshot(),
+            # Member `_id`s of each rescue view
+            "rescue": RescueViews(self._rescue_view_definitions),
+            # Documents sorted by age for binary-searched range filters
+            "age": SortedRangeIndex(AGE_FIELD),
+            # Monthly outcome counts for trend charts
+            "rollups": OutcomeRollups(),
+        }
+
+    def _install_indexes(self, indexes):
+        self.breed_hash_map = indexes["breed"]
+        self.search_index = indexes["search"]
+        self.column_snapshot = indexes["columns"]
+        self.rescue_views = indexes["rescue"]
+        self.age_index = indexes["age"]
+        self.outcome_rollups = indexes["rollups"]
+
+    def _current_indexes(self):
+        return {"breed": self.breed_hash_map, "search": self.search_index, "columns": self.column_snapshot,
+                "rescue": self.rescue_views, "age": self.age_index, "rollups": self.outcome_rollups}
+
+    def _index_projection(self):
+        """Fields the in-memory indexes are built from."""
+        projection = {"_id": 1, "breed": 1, "name": 1, AGE_FIELD: 1}
+        projection.update((field, 1) for field in CATEGORICAL_FIELDS + NUMERIC_FIELDS + VIEW_FIELDS + ROLLUP_FIELDS)
+        return projection
+
+    def _index_document(self, indexes, document, sorted_indexes=True):
+        """Index one document. Full builds pass sorted_indexes=False and bulk load the sorted age index instead."""
+        indexes["breed"].set(document["_id"], document.get("breed"))
+        indexes["search"].set_document(document["_id"], document)
+        indexes["columns"].set(document["_id"], document)
+        indexes["rescue"].set_document(document["_id"], document)
+        if sorted_indexes:
+            indexes["age"].set(document["_id"], document.get(AGE_FIELD))
+        indexes["rollups"].set(document["_id"], document)
+
+    def _unindex_document(self, indexes, doc_id):
+        indexes["breed"].remove(doc_id)
+        indexes["search"].remove(doc_id)
+        indexes["columns"].remove(doc_id)
+        indexes["rescue"].remove(doc_id)
+        indexes["age"].remove(doc_id)
+        indexes["rollups"].remove(doc_id)
+
+    @property
+    def indexes_ready(self):
+        """True once the in-memory indexes are built and kept current by writes."""
+        return self._indexes_ready.is_set()
+
+    def wait_for_indexes(self, timeout=None):
+        """
+        Block until the in-memory indexes are built.
+
+        Returns:
+            bool: False if timeout (in seconds) expired first.
+        """
+        return self._indexes_ready.wait(timeout)
+
+    def _begin_build(self, keep_serving=False):
+        """
+        Start a new build generation. Writes are queued until the build installs its indexes, and any build still in
+        flight is superseded.
+        - Reads fall through to MongoDB meanwhile, unless keep_serving is true: the current indexes then stay
+          installed and keep applying writes until they are replaced.
+
+        Returns:
+            int: The generation to pass to `_build_indexes`.
+        """
+        with self._index_lock:
+            self._build_generation += 1
+            if not keep_serving:
+                self._indexes_ready.clear()
+            self._index_building = True
+            return self._build_generation
+
+    def _populate_breed_hash_map(self, indexes, generation=None):
         """
         Populated a hash map here for efficient breed lookups.
-        - Organizes breeds as keys, linking them to lists of associated documents.
+        - Organizes breeds as keys, linking them to the `_id`s of associated documents.
         - Optimizes breed-based searches, achieving O(1) lookup time.
+        - Keeps each document's `_id` so later updates and deletes can be applied incrementally.
+        - Fills the search index from the same scan.
+        - The age index is sorted once at the end with `bulk_load`, rather than inserting each document in order.
+        - Stops early when a newer build supersedes generation.
+
+        Returns:
+            bool: False if the scan was cancelled.
         """
+        all_data = self.collection.find({}, self._index_projection())
+        ages = []
+        for scanned, document in enumerate(all_data, 1):
+            if generation is not None and scanned % 1000 == 0 and generation != self._build_generation:
+                logging.info("Index build cancelled by a newer build after %s documents", scanned)
+                return False
+            self._index_document(indexes, document, sorted_indexes=False)
+            ages.append((document["_id"], document.get(AGE_FIELD)))
+        indexes["age"].bulk_load(ages)
+        logging.info("Hash map for breeds has been populated.")
+        return True
+
+    def _build_indexes(self, use_snapshot=True, generation=None):
+        """
+        Build the in-memory indexes and install them.
+        - Loads the snapshot at index_snapshot_path and catches up on later changes when it can, otherwise scans
+          the collection.
+        - Writes made while building are queued by `_after_write` and replayed onto the new indexes before
+          they are installed, so no write is lost to the swap.
+        - Builds hold the build lock, so they never overlap. A build whose generation (from `_begin_build`, the
+          current one by default) has been superseded stops and installs nothing, leaving the queued writes to the
+          newer build.
+
+        Returns:
+            bool: True if the indexes were installed.
+        """
+
+        if generation is None:
+            generation = self._build_generation
+        with self._build_lock:
+            if generation != self._build_generation:
+                return False
+            return self._run_build(use_snapshot, generation)
+
+    def _run_build(self, use_snapshot, generation):
+        start_time = time.perf_counter()
+        synced_at = time.monotonic()
         try:
-            all_data = self.collection.find({}, {"breed": 1, "_id": 0})
-            for document in all_data:
-                breed = document.get("breed")
-                if breed:
-                    if breed in self.breed_hash_map:
-                        self.breed_hash_map[breed].append(document)
-                    else:
-                        self.breed_hash_map[breed] = [document]
-            logging.info("Hash map for breeds has been populated.")
+            loaded = self._load_index_snapshot() if use_snapshot and self.index_snapshot_path else None
+            if loaded is not None:
+                indexes, resume_token, changed = loaded
+            else:
+                # Take the resume token before scanning, so replaying from it covers changes made during the scan
+                resume_token = self._current_resume_token()
+                indexes = self._new_indexes()
+                if not self._populate_breed_hash_map(indexes, generation):
+                    return False
+                changed = True
+
+            with self._index_lock:
+                if generation != self._build_generation:
+                    logging.info("Discarded in-memory indexes superseded by a newer build")
+                    return False
+                self._install_indexes(indexes)
+                for pre_images, post_images in self._pending_writes:
+                    self._maintain_indexes(pre_images, post_images)
+                replayed = len(self._pending_writes)
+                self._pending_writes = []
+                self._build_resume_token = resume_token
+                self._indexes_synced_at = synced_at
+                self._index_building = False
+                self._indexes_ready.set()
+
+            elapsed = time.perf_counter() - start_time
+            REGISTRY.observe("animal_shelter.index_build", elapsed)
+            logging.info("In-memory indexes built from %s in %.2f seconds (%s queued writes replayed)",
+                         "snapshot" if loaded is not None else "collection scan", elapsed, replayed)
+
+            if changed:
+                self.save_index_snapshot(force=True)
+            return True
         except Exception as e:
+            with self._index_lock:
+                if generation == self._build_generation:
+                    self._pending_writes = []
+                    self._index_building = False
+            REGISTRY.observe("animal_shelter.index_build", time.perf_counter() - start_time, error=True)
             logging.error("Error occurred while populating breed hash map: %s", str(e))
+            return False
+
+    def _current_resume_token(self):
+        """Return a change stream resume token for the collection, or None if the server has no change streams."""
+        try:
+            with self.collection.watch() as stream:
+                return stream.resume_token
+        except Exception:
+            # Standalone servers do not support change streams
+            return None
 
-    def _make_hashable(self, query):
+    def _collection_stamp(self, resume_token):
+        """Version stamp saved with a snapshot: collection identity, document count, largest `_id` and resume token."""
+        latest = list(self.collection.find({}, {"_id": 1}).sort("_id", -1).limit(1))
+        return {
+            "database": self.database.name,
+            "collection": self.collection.name,
+            "count": self.collection.count_documents({}),
+            "max_id": latest[0]["_id"] if latest else None,
+            "resume_token": resume_token,
+        }
+
+    def _load_index_snapshot(self):
         """
-        Convert a dictionary query to a hashable type.
-        - Verify compatibility with functools.lru_cache.
+        Load the indexes saved at index_snapshot_path and catch up on the changes made since.
+        - With a resume token, every change since the snapshot is replayed from the change stream.
+        - Without one (standalone server), documents with a larger `_id` are indexed and the document count must
+          then match, otherwise the snapshot is discarded. Writes made through this class discard the snapshot
+          until it is saved again, so only updates made by other clients go undetected in this mode.
+
+        Returns:
+            tuple: (indexes, resume token, whether anything changed), or None if a full scan is needed.
         """
 
-        if isinstance(query, dict):
-            return tuple((key, self._make_hashable(value)) for key, value in sorted(query.items()))
-        elif isinstance(query, list):
-            return tuple(self._make_hashable(item) for item in query)
-        else:
+        snapshot = load_snapshot(self.index_snapshot_path)
+        if snapshot is None:
+            return None
+
+        stamp = snapshot["stamp"]
+        indexes = snapshot["indexes"]
+        if (stamp.get("database"), stamp.get("collection")) != (self.database.name, self.collection.name) \
+                or set(indexes) != set(self._new_indexes()) \
+                or indexes["rescue"].views() != self._rescue_view_definitions:
+            logging.warning("Index snapshot %s does not match this collection", self.index_snapshot_path)
+            return None
+
+        try:
+            if stamp.get("resume_token") is not None:
+                resume_token, changed = self._catch_up_change_stream(indexes, stamp["resume_token"])
+            else:
+                resume_token, changed = None, self._catch_up_inserts(indexes, stamp)
+        except Exception as e:
+            logging.warning("Could not catch up index snapshot %s: %s", self.index_snapshot_path, str(e))
+            return None
+
+        if changed is None:
+            logging.info("Index snapshot %s is out of date and will be rebuilt", self.index_snapshot_path)
+            return None
+        logging.info("Loaded index snapshot %s and caught up on %s changes", self.index_snapshot_path, changed)
+        return indexes, resume_token, changed > 0
+
+    def _catch_up_change_stream(self, indexes, resume_token):
+        """
+        Replay the change stream from resume_token onto snapshot indexes.
+
+        Returns:
+            tuple: (latest resume token, number of changes applied), or (None, None) if the collection was dropped.
+        """
+        changed = 0
+        with self.collection.watch(resume_after=resume_token, full_document="updateLookup") as stream:
+            while True:
+                change = stream.try_next()
+                if change is None:
+                    return stream.resume_token, changed
+
+                operation = change["operationType"]
+                if operation in ("insert", "update", "replace"):
+                    document = change.get("fullDocument")
+                    if document is None:
+                        # The document was deleted before its latest version could be looked up
+                        self._unindex_document(indexes, change["documentKey"]["_id"])
+                    else:
+                        self._index_document(indexes, document)
+                elif operation == "delete":
+                    self._unindex_document(indexes, change["documentKey"]["_id"])
+                elif operation in ("drop", "dropDatabase", "rename", "invalidate"):
+                    return None, None
+                changed += 1
+
+    def _catch_up_inserts(self, indexes, stamp):
+        """
+        Index the documents inserted since a snapshot, identified by `_id`s larger than the stamp's.
+
+        Returns:
+            int: Number of documents indexed, or None if the document count shows other changes.
+        """
+        query = {"_id": {"$gt": stamp["max_id"]}} if stamp.get("max_id") is not None else {}
+        inserted = 0
+        for document in self.collection.find(query, self._index_projection()):
+            self._index_document(indexes, document)
+            inserted += 1
+        if self.collection.count_documents({}) != stamp["count"] + inserted:
+            return None
+        return inserted
+
+    def save_index_snapshot(self, force=False):
+        """
+        Save the in-memory indexes to index_snapshot_path.
+        - Skipped while the indexes are being built, and when nothing changed since the last save unless force is true.
+        - The indexes are pickled and the collection stamp is read outside the index lock, so searches keep running.
+          Writes made meanwhile are deferred and applied once the file is written, and they discard the new
+          snapshot since it does not include them.
+
+        Returns:
+            bool: True if a snapshot was written.
+        """
+
+        if not self.index_snapshot_path or not self._indexes_ready.is_set():
+            return False
+        with self._snapshot_lock:
+            with self._index_lock:
+                if not (force or self._snapshot_dirty) or not self._indexes_ready.is_set():
+                    return False
+                self._saving_snapshot = True
+                indexes = self._current_indexes()
+                resume_token = self._build_resume_token
+
+            saved = False
+            try:
+                save_snapshot(self.index_snapshot_path, self._collection_stamp(resume_token), indexes)
+                saved = True
+            except Exception as e:
+                logging.error("Error occurred while saving index snapshot: %s", str(e))
+            finally:
+                with self._index_lock:
+                    deferred, self._deferred_writes = self._deferred_writes, []
+                    self._saving_snapshot = False
+                    for pre_images, post_images in deferred:
+                        self._maintain_indexes(pre_images, post_images)
+                    if saved:
+                        self._snapshot_dirty = False
+                    if deferred:
+                        self._mark_snapshot_dirty()
+            return saved
+
+    def refresh_indexes(self):
+        """
+        Apply the changes other processes made to the collection since the in-memory indexes were built or refreshed.
+        - Replays the change stream from the last resume token onto the live indexes.
+        - Without change streams (a standalone server), or when the stream can no longer be resumed, the indexes are
+          rebuilt on a background thread while the current ones keep serving.
+
+        Returns:
+            bool: True if the indexes are current, False if they are not built or a rebuild is still running.
+        """
+
+        with self._snapshot_lock, self._index_lock:
+            if not self._indexes_ready.is_set() or self._index_building:
+                return False
+            synced_at = time.monotonic()
+            resume_token = self._build_resume_token
+            if resume_token is not None:
+                try:
+                    resume_token, changed = self._catch_up_change_stream(self._current_indexes(), resume_token)
+                except Exception as e:
+                    logging.error("Error occurred while replaying the change stream: %s", str(e))
+                    resume_token = None
+                if resume_token is not None:
+                    self._build_resume_token = resume_token
+                    self._indexes_synced_at = synced_at
+                    if changed:
+                        logging.info("Applied %s changes from other processes to the in-memory indexes", changed)
+                        self._mark_snapshot_dirty()
+                    return True
+
+            generation = self._begin_build(keep_serving=True)
+            self._build_thread = threading.Thread(target=self._build_indexes, args=(False, generation),
+                                                  name="animal-shelter-index-refresh", daemon=True)
+            self._build_thread.start()
+            logging.info("Rebuilding in-memory indexes older than %s seconds", self.index_max_staleness)
+            return False
+
+    def _indexes_current(self):
+        """
+        Tell whether reads can be answered from the in-memory indexes.
+        - True once they are built and synced with the collection within index_max_staleness seconds (None for no
+          bound); older indexes are refreshed first.
+        """
+        if not self._indexes_ready.is_set():
+            return False
+        if self.index_max_staleness is None or time.monotonic() - self._indexes_synced_at <= self.index_max_staleness:
+            return True
+        return self.refresh_indexes()
+
+    def _mark_snapshot_dirty(self):
+        """Discard the saved snapshot on the first write after a save, so a crash cannot leave a stale snapshot."""
+        if self.index_snapshot_path and not self._snapshot_dirty:
+            self._snapshot_dirty = True
+            try:
+                discard_snapshot(self.index_snapshot_path)
+            except OSError as e:
+                logging.error("Error occurred while discarding index snapshot: %s", str(e))
+
+    def ensure_indexes(self):
+        """Create the indexes declared in INDEXES. Existing indexes are left unchanged."""
+        return ensure_indexes(self.collection, self.INDEXES)
+
+    def backfill_locations(self, batch_size=1000):
+        """
+        Add the GeoJSON location to documents that have coordinates but no location, e.g. after a mongoimport.
+        - A maintenance step, run once after such a load (see ingest_csv.py); the constructor does not call it.
+        - Writes go straight to the collection, so call `rebuild_indexes` afterwards on a shelter that reads them.
+
+        Returns:
+            int: Number of documents updated.
+        """
+        query = {
+            LOCATION_FIELD: {"$exists": False},
+            COORDINATE_FIELDS[0]: {"$type": "number"},
+            COORDINATE_FIELDS[1]: {"$type": "number"},
+        }
+        projection = {"_id": 1, COORDINATE_FIELDS[0]: 1, COORDINATE_FIELDS[1]: 1}
+        updated = 0
+        for batch in self.read_iter(query, batch_size=batch_size, projection=projection):
+            requests = [UpdateOne({"_id": document["_id"]}, {"$set": {LOCATION_FIELD: geo_point(document)}})
+                        for document in batch if geo_point(document) is not None]
+            if requests:
+                updated += self.collection.bulk_write(requests, ordered=False).modified_count
+        if updated:
+            logging.info("Backfilled the GeoJSON location of %s documents", updated)
+        return updated
+
+    def rebuild_indexes(self):
+        """
+        Rebuild the in-memory indexes from a full scan and clear the query cache.
+        - Used after bulk loads that write to the collection directly.
+        - Runs synchronously; searches fall through to MongoDB while the scan runs.
+        - Supersedes a build already in flight, such as the constructor's background build, and waits for it to stop
+          before scanning, so the two never install over each other.
+        """
+
+        generation = self._begin_build()
+        thread = self._build_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._build_indexes(use_snapshot=False, generation=generation)
+        self.clear_cache()
+
+    def rescue_view_names(self):
+        """Return the names of the configured rescue views, in order."""
+        return [view.name for view in self._rescue_view_definitions]
+
+    def _rescue_view(self, name):
+        for view in self._rescue_view_definitions:
+            if view.name == name:
+                return view
+        raise ValueError("Unknown rescue view: %s" % name)
+
+    def rescue_view_filter(self, name):
+        """
+        Return the MongoDB filter selecting the members of a rescue view, to combine with other criteria.
+        - This is the view's breed, sex and age criteria rather than its member `_id`s, so page and map queries stay
+          small and are served by the rescue_breed_sex_age index. The column snapshot evaluates it in memory for counts.
+        """
+        return self._rescue_view(name).query()
+
+    def rescue_view_count(self, name):
+        """Return the number of members of a rescue view, from its member set once the indexes are built."""
+        view = self._rescue_view(name)
+        with self._index_lock:
+            if self._indexes_ready.is_set() and name in self.rescue_views:
+                return self.rescue_views.count(name)
+        self.advisor.record(view.query())
+        return self.collection.count_documents(view.query())
+
+    def in_rescue_view(self, name, doc_id):
+        """Tell whether the document with `_id` doc_id belongs to a rescue view."""
+        view = self._rescue_view(name)
+        with self._index_lock:
+            if self._indexes_ready.is_set() and name in self.rescue_views:
+                return doc_id in self.rescue_views.ids(name)
+        return self.collection.count_documents(dict(view.query(), _id=doc_id), limit=1) > 0
+
+    def define_rescue_view(self, view):
+        """
+        Add a rescue view, or replace the view with the same name, and populate it with one MongoDB query.
+        - Waits for an in-progress index build, so the view is added to the indexes that are kept current.
+        """
+        if self._index_building:
+            thread = self._build_thread
+            if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+                # Also covers refresh builds, during which the old indexes stay ready
+                thread.join()
+            else:
+                self.wait_for_indexes()
+        # The views are changed in place, so they must not be pickled at the same time
+        with self._snapshot_lock, self._index_lock:
+            self._rescue_view_definitions = [existing for existing in self._rescue_view_definitions
+                                             if existing.name != view.name] + [view]
+            if self._indexes_ready.is_set():
+                self.advisor.record(view.query())
+                member_ids = [document["_id"] for document in self.collection.find(view.query(), {"_id": 1})]
+                self.rescue_views.add_view(view, member_ids)
+                self._mark_snapshot_dirty()
+        logging.info("Defined rescue view '%s'", view.name)
+
+    def drop_rescue_view(self, name):
+        """Remove a rescue view. Returns True if it existed."""
+        with self._snapshot_lock, self._index_lock:
+            existed = any(view.name == name for view in self._rescue_view_definitions)
+            self._rescue_view_definitions = [view for view in self._rescue_view_definitions if view.name != name]
+            if self.rescue_views.drop_view(name):
+                self._mark_snapshot_dirty()
+        return existed
+
+    def age_range_ids(self, min_weeks=None, max_weeks=None, breeds=None):
+        """
+        Return the `_id`s of the animals aged between min_weeks and max_weeks (inclusive), optionally of some breeds.
+        - Served from the sorted age index with binary search in O(log n + k), where k is the number of matches.
+        - With breeds, the smaller side is scanned: either the age range, checking each animal's indexed breed, or
+          the breeds' postings, checking each animal's indexed age. Both sides are counted in O(log n) first.
+        - Falls through to a MongoDB query while the indexes are being built.
+        """
+        breeds = self._age_range_breeds(min_weeks, max_weeks, breeds)
+        with self._index_lock:
+            if self._indexes_ready.is_set():
+                if breeds is None:
+                    return set(self.age_index.ids(min_weeks, max_weeks))
+                breed_total = sum(self.breed_hash_map.count(breed) for breed in breeds)
+                if self.age_index.count(min_weeks, max_weeks) <= breed_total:
+                    return {doc_id for doc_id in self.age_index.ids(min_weeks, max_weeks)
+                            if self.breed_hash_map.breed_of(doc_id) in breeds}
+                return {doc_id for breed in breeds for doc_id in self.breed_hash_map.ids(breed)
+                        if self._age_in_range(self.age_index.value_of(doc_id), min_weeks, max_weeks)}
+
+        query = self._age_range_query(min_weeks, max_weeks, breeds)
+        self.advisor.record(query)
+        return {document["_id"] for document in self.collection.find(query, {"_id": 1})}
+
+    def age_range_filter(self, min_weeks=None, max_weeks=None, breeds=None):
+        """
+        Return a filter selecting the animals of an age range, and optionally breeds, to combine with other criteria.
+        - Once the indexes are built this is the matching `_id` set from `age_range_ids`. Until then it is the
+          equivalent range query.
+        """
+        breeds = self._age_range_breeds(min_weeks, max_weeks, breeds)
+        if not self._indexes_ready.is_set():
+            return self._age_range_query(min_weeks, max_weeks, breeds)
+        return {"_id": {"$in": list(self.age_range_ids(min_weeks, max_weeks, breeds))}}
+
+    def count_age_range(self, min_weeks=None, max_weeks=None, breeds=None):
+        """Count the animals of an age range, and optionally breeds. Without breeds this takes O(log n)."""
+        breeds = self._age_range_breeds(min_weeks, max_weeks, breeds)
+        with self._index_lock:
+            if self._indexes_ready.is_set() and breeds is None:
+                return self.age_index.count(min_weeks, max_weeks)
+        return len(self.age_range_ids(min_weeks, max_weeks, breeds))
+
+    @staticmethod
+    def _age_range_breeds(min_weeks, max_weeks, breeds):
+        """Validate an age range and return breeds as a set, or None for any breed."""
+        if min_weeks is not None and max_weeks is not None and min_weeks > max_weeks:
+            raise ValueError("min_weeks cannot be greater than max_weeks")
+        if breeds is None:
+            return None
+        return {breeds} if isinstance(breeds, str) else set(breeds)
+
+    @staticmethod
+    def _age_in_range(age, min_weeks, max_weeks):
+        return age is not None and (min_weeks is None or age >= min_weeks) and (max_weeks is None or age <= max_weeks)
+
+    @staticmethod
+    def _age_range_query(min_weeks, max_weeks, breeds):
+        age = {"$type": "number"}
+        if min_weeks is not None:
+            age["$gte"] = min_weeks
+        if max_weeks is not None:
+            age["$lte"] = max_weeks
+        query = {AGE_FIELD: age}
+        if breeds is not None:
+            query["breed"] = {"$in": sorted(breeds)}
+        return query
+
+    def search_ids(self, text):
+        """
+        Return the `_id`s of documents whose breed or name contains text, ignoring case.
+        - Served from the in-memory trigram index without querying MongoDB.
+        - Falls through to a case-insensitive regex query while the index is being built.
+        """
+        if not self._indexes_ready.is_set():
+            if not text or not text.strip():
+                return set()
+            query = self._search_regex(text)
+            self.advisor.record(query)
+            return {document["_id"] for document in self.collection.find(query, {"_id": 1})}
+        return self.search_index.search(text)
+
+    def _search_regex(self, text):
+        """Build the case-insensitive substring filter on breed and name equivalent to a search."""
+        pattern = re.escape(text.strip())
+        return {"$or": [{field: {"$regex": pattern, "$options": "i"}} for field in self.search_index.fields]}
+
+    def _apply_search(self, query, search, in_memory=False):
+        """
+        Restrict a query to the documents matching a search string.
+        - The matching `_id`s are added as an `$in` list when there are at most SEARCH_ID_LIMIT of them. Broader
+          searches, and searches made while the indexes are being built, are sent as the equivalent regex instead.
+        - in_memory keeps the `_id` list whatever its size, for filters evaluated on the column snapshot.
+        """
+        if not search or not search.strip():
             return query
+        if not in_memory and not self._indexes_ready.is_set():
+            search_filter = self._search_regex(search)
+        else:
+            ids = self.search_ids(search)
+            if in_memory or len(ids) <= self.SEARCH_ID_LIMIT:
+                search_filter = {"_id": {"$in": list(ids)}}
+            else:
+                search_filter = self._search_regex(search)
+        return {"$and": [query, search_filter]} if query else search_filter
 
-    @lru_cache(maxsize=128)
-    def _cached_read(self, hashable_query):
+    def _cached_read(self, query, search=None):
         """
         Perform a cached database read operation.
-        - Uses functools.lru_cache to store results of frequent queries.
+        - Uses the query cache to store results of frequent queries.
         - This reduces database load and improves response times for repeated queries.
+        - Searched reads are cached against the base query's dependencies, because the matching `_id`s
+          change as documents are created.
         """
 
-        query = dict(hashable_query)  # Convert back to a dictionary
-        return list(self.collection.find(query))
+        hashable_query = make_hashable(query)
+        if search and search.strip():
+            hashable_query = (hashable_query, ("$search", search.strip().lower()))
+        results = self.cache.get(hashable_query)
+        if results is None:
+            # Capture the generation first so a write racing this read does not leave stale results behind
+            generation = self.cache.generation
+            database_query = self._apply_search(query, search)
+            self.advisor.record(database_query)
+            results = list(self.collection.find(database_query))
+            self.cache.put(hashable_query, query, results, generation)
+        return results
 
-    def read(self, query, bypass_cache=False):
+    @REGISTRY.instrument("animal_shelter.read", count_results)
+    def read(self, query, bypass_cache=False, search=None):
         """
         Read documents with optional cache bypass for fresh results.
         - Enables switching between cached and live data.
         - Queries the database directly if bypass_cache is true for the latest results.
         - Retrieves cached results for repeated queries.
+        - search restricts the results to documents whose breed or name contains it, ignoring case.
         """
 
         try:
             if bypass_cache:
                 # Directly query the database without using the cache
                 logging.info("Bypassing cache for query: %s", query)
-                return list(self.collection.find(query))
+                database_query = self._apply_search(query, search)
+                self.advisor.record(database_query)
+                return list(self.collection.find(database_query))
 
             # Use cached results for repeated queries
-            hashable_query = self._make_hashable(query)
-            return self._cached_read(hashable_query)
+            return self._cached_read(query, search)
         except Exception as e:
             logging.error("Error occurred during read operation: %s", str(e))
             raise
 
+    def read_iter(self, query, batch_size=1000, projection=None, sort=None, limit=0, search=None):
+        """
+        Stream documents from the cursor in batches instead of loading them all at once.
+        - Yields lists of at most batch_size documents, so memory stays bounded by one batch.
+        - projection, sort (a list of (field, direction) pairs) and limit are passed to the cursor.
+        - search restricts the results as in `read`.
+        - Always reads live data; streamed results are not cached.
+        """
+
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        try:
+            query = self._apply_search(query, search)
+            self.advisor.record(query, sort)
+            cursor = self.collection.find(query, projection, limit=limit, batch_size=batch_size)
+            if sort:
+                cursor = cursor.sort(sort)
+
+            # Only time spent reading from the cursor is measured, not time spent by the consumer between batches
+            elapsed = 0.0
+            streamed = 0
+            resumed = time.perf_counter()
+            batch = []
+            try:
+                for document in cursor:
+                    batch.append(document)
+                    if len(batch) >= batch_size:
+                        elapsed += time.perf_counter() - resumed
+                        streamed += len(batch)
+                        yield batch
+                        resumed = time.perf_counter()
+                        batch = []
+                if batch:
+                    elapsed += time.perf_counter() - resumed
+                    streamed += len(batch)
+                    yield batch
+            finally:
+                REGISTRY.observe("animal_shelter.read_iter", elapsed, streamed)
+        except Exception as e:
+            logging.error("Error occurred during streaming read operation: %s", str(e))
+            raise
+
+    def export_iter(self, query, fmt="csv", compression=DEFAULT_COMPRESSION, columns=None, sort=None, search=None,
+                    batch_size=5000):
+        """
+        Stream the documents matching query and search as an export file.
+        - fmt is "csv" or "parquet"; compression defaults to none for CSV and snappy for Parquet (see export_stream.py).
+        - columns selects and orders the exported fields, e.g. the dashboard table's columns. Without it, the fields
+          of the first batch are exported, except `_id` and the derived GeoJSON location. No query runs before the
+          cursor is opened, so the download starts right away.
+        - Each Parquet row group holds one batch of batch_size documents.
+
+        Returns:
+            generator: bytes chunks of the file, produced as the cursor is read.
+        """
+
+        if columns:
+            projection = {field: 1 for field in columns}
+            if "_id" not in projection:
+                projection["_id"] = 0
+        else:
+            projection = {"_id": 0, LOCATION_FIELD: 0}
+        logging.info("Exporting query %s as %s", query, fmt)
+        batches = self.read_iter(query, batch_size=batch_size, projection=projection, sort=sort, search=search)
+        return iter_export(batches, fmt, compression, columns)
+
+    @REGISTRY.instrument("animal_shelter.field_names", count_results)
+    def field_names(self, projection=None):
+        """
+        Return the top-level fields used by any document, in the order they first appear in the documents.
+        - Collected by MongoDB with `$objectToArray`, so a field only a few documents have is not missed. This reads
+          the whole collection, so callers such as the dashboard run it once at startup.
+        - projection excludes fields ({"location": 0}) or keeps only the included ones, as in a `find`.
+        """
+
+        try:
+            pipeline = [
+                {"$project": {"fields": {"$objectToArray": "$$ROOT"}}},
+                {"$unwind": {"path": "$fields", "includeArrayIndex": "position"}},
+                {"$group": {"_id": "$fields.k", "position": {"$min": "$position"}}},
+                {"$sort": {"position": 1, "_id": 1}},
+            ]
+            fields = [result["_id"] for result in self.collection.aggregate(pipeline)]
+
+            projection = projection or {}
+            included = {field for field, value in projection.items() if value and field != "_id"}
+            if included:
+                return [field for field in fields if field in included or (field == "_id" and projection.get("_id", 1))]
+            return [field for field in fields if projection.get(field, 1)]
+        except Exception as e:
+            logging.error("Error occurred while listing field names: %s", str(e))
+            raise
+
+    @REGISTRY.instrument("animal_shelter.read_page", count_results)
+    def read_page(self, query, page_size=20, sort=None, after=None, skip=0, projection=None, with_total=False,
+                  search=None):
+        """
+        Read a single page of documents using keyset pagination.
+        - sort is a list of (field, direction) pairs; `_id` is appended as a tie-breaker.
+        - after is the "next_page" token returned with the previous page. The next page is selected by sort key,
+          so the database does not walk over every earlier document.
+        - skip is a fallback for jumping to a page without a token, and is ignored when after is given.
+        - Sorted fields should hold a single BSON type, since range comparisons do not cross types.
+        - search restricts the results as in `read`.
+
+        Returns:
+            dict: "documents", "next_page" (None on the last page) and, if with_total is set, "total".
+        """
+
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+
+        try:
+            query = self._apply_search(query, search)
+            sort = _with_tiebreaker(sort)
+            keys = [field for field, _ in sort]
+
+            page_query = query
+            if after:
+                keyset = _keyset_filter(sort, json_util.loads(after))
+                page_query = {"$and": [query, keyset]} if query else keyset
+                skip = 0
+
+            fetch_projection, hidden = _keyset_projection(projection, keys)
+            self.advisor.record(page_query, sort)
+            cursor = self.collection.find(page_query, fetch_projection).sort(sort).skip(skip).limit(page_size + 1)
+            documents = list(cursor)
+
+            # One extra document is fetched to tell whether another page follows
+            next_page = None
+            if len(documents) > page_size:
+                documents = documents[:page_size]
+                last = documents[-1]
+                next_page = json_util.dumps({field: last.get(field) for field in keys})
+
+            for document in documents:
+                for field in hidden:
+                    document.pop(field, None)
+
+            page = {"documents": documents, "next_page": next_page}
+            if with_total:
+                page["total"] = self.count(query)
+            logging.info("Read page of %s documents (skip=%s, keyset=%s)", len(documents), skip, bool(after))
+            return page
+        except Exception as e:
+            logging.error("Error occurred during paged read operation: %s", str(e))
+            raise
+
+    @REGISTRY.instrument("animal_shelter.group_counts", count_results)
+    def group_counts(self, field, query=None, search=None, bypass_cache=False):
+        """
+        Count documents per value of a field using a MongoDB `$group`.
+        - query and search select the documents as in `read`.
+        - Encoded fields filtered on snapshot fields are counted from the column snapshot. It follows this shelter's
+          writes immediately and other processes' writes within index_max_staleness seconds (see `refresh_indexes`).
+        - Other results are cached by filter and invalidated by writes like cached reads.
+        - bypass_cache also makes the counts include every write so far: the column snapshot is only used after
+          the change stream has been replayed onto it, and MongoDB counts the documents on servers without change
+          streams.
+
+        Returns:
+            list: (value, count) pairs, largest count first.
+        """
+
+        query = query or {}
+        try:
+            counts = None
+            if not bypass_cache or (self._build_resume_token is not None and self.refresh_indexes()):
+                counts = self._column_query(
+                    lambda column_query: self.column_snapshot.value_counts(field, column_query), query, search)
+            if counts is not None:
+                return counts
+
+            match = self._apply_search(query, search)
+            pipeline = [
+                {"$match": match},
+                {"$group": {"_id": "$" + field, "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+            ]
+            if bypass_cache:
+                self.advisor.record(match)
+                results = list(self.collection.aggregate(pipeline))
+            else:
+                key = ("$group", field, make_hashable(query), (search or "").strip().lower())
+                results = self.cache.get(key)
+                if results is None:
+                    generation = self.cache.generation
+                    self.advisor.record(match)
+                    results = list(self.collection.aggregate(pipeline))
+                    self.cache.put(key, query, results, generation)
+            return [(result["_id"], result["count"]) for result in results]
+        except Exception as e:
+            logging.error("Error occurred during group count operation: %s", str(e))
+            raise
+
+    @REGISTRY.instrument("animal_shelter.count")
+    def count(self, query=None, search=None):
+        """
+        Count the documents matching query and search.
+        - Evaluated as a vectorized mask over the column snapshot when the filter only uses its fields,
+          otherwise counted by MongoDB.
+        """
+
+        query = query or {}
+        try:
+            total = self._column_query(lambda column_query: self.column_snapshot.count(column_query), query, search)
+            if total is None:
+                database_query = self._apply_search(query, search)
+                self.advisor.record(database_query)
+                total = self.collection.count_documents(database_query)
+            return total
+        except Exception as e:
+            logging.error("Error occurred during count operation: %s", str(e))
+            raise
+
+    def _column_query(self, evaluate, query, search):
+        """
+        Answer a query from the column snapshot.
+
+        Returns:
+            The result of evaluate(filter), or None when the indexes are not built or current, or the filter is not
+            supported.
+        """
+        if not self._indexes_current():
+            return None
+        column_query = self._apply_search(query, search, in_memory=True)
+        # Writes replace values in place and may grow the columns, so the mask is computed under the index lock
+        with self._index_lock:
+            return evaluate(column_query)
+
+    @REGISTRY.instrument("animal_shelter.animals_within_radius", count_results)
+    def animals_within_radius(self, latitude, longitude, radius_meters, query=None, search=None, projection=None,
+                              limit=500):
+        """
+        Find the animals whose location is within radius_meters of a point, nearest first.
+        - query and search narrow the results as in `read`, and at most limit documents are returned.
+        - Served by the 2dsphere index. Results are read live and not cached, since map positions rarely repeat.
+        """
+
+        try:
+            geo_query = dict(self._apply_search(query or {}, search))
+            geo_query.update(radius_filter(latitude, longitude, radius_meters))
+            self.advisor.record(geo_query)
+            documents = list(self.collection.find(geo_query, projection, limit=limit))
+            logging.info("Found %s animals within %s meters of (%s, %s)", len(documents), radius_meters, latitude, longitude)
+            return documents
+        except Exception as e:
+            logging.error("Error occurred during radius query: %s", str(e))
+            raise
+
+    @REGISTRY.instrument("animal_shelter.animals_in_bbox", count_results)
+    def animals_in_bbox(self, south, west, north, east, query=None, search=None, projection=None, limit=500):
+        """
+        Find the animals whose location is inside a bounding box, such as the map viewport.
+        - The box is given by its south-west and north-east corners in degrees; see `bbox_filter` in geo_query.py.
+        - query and search narrow the results as in `read`, and at most limit documents are returned.
+        """
+
+        try:
+            base_query = self._apply_search(query or {}, search)
+            box_query = bbox_filter(south, west, north, east)
+            geo_query = {"$and": [base_query, box_query]} if base_query else box_query
+            self.advisor.record(geo_query)
+            documents = list(self.collection.find(geo_query, projection, limit=limit))
+            logging.info("Found %s animals in bounding box (%s, %s, %s, %s)", len(documents), south, west, north, east)
+            return documents
+        except Exception as e:
+            logging.error("Error occurred during bounding box query: %s", str(e))
+            raise
+
+    @REGISTRY.instrument("animal_shelter.outcome_trends")
+    def outcome_trends(self, by="outcome_type", start=None, end=None, outcome_type=None, animal_type=None,
+                       breed_group=None):
+        """
+        Return monthly outcome counts for trend charts; see `OutcomeRollups.monthly_counts` for the arguments.
+        - Served from the in-memory rollups, so no documents are read.
+        - While the indexes are being built, the bucket counts come from a MongoDB `$group` (see `rollup_pipeline`),
+          cached and invalidated by writes like `group_counts`.
+
+        Returns:
+            dict: {"months": ["YYYY-MM", ...], "series": {group: [count per month]}}.
+        """
+
+        try:
+            if self._indexes_current():
+                with self._index_lock:
+                    return self.outcome_rollups.monthly_counts(by, start, end, outcome_type, animal_type, breed_group)
+
+            key = ("$group", "outcome_rollups")
+            counts = self.cache.get(key)
+            if counts is None:
+                generation = self.cache.generation
+                counts = bucket_counts(self.collection.aggregate(rollup_pipeline()))
+                # Every write can move an outcome between buckets, so the entry depends on the whole collection
+                self.cache.put(key, {}, counts, generation)
+            return series_from_counts(counts, by, start, end, outcome_type, animal_type, breed_group)
+        except Exception as e:
+            logging.error("Error occurred during outcome trends query: %s", str(e))
+            raise
+
     def clear_cache(self):
         """
-        Clear the LRU cache for the read method.
-        - Removes cached data after collection-modifying CRUD operations.
+        Clear the query cache for the read method.
+        - Writes invalidate only the affected entries, so this is only needed after out-of-band changes.
         """
 
-        self._cached_read.cache_clear()
+        self.cache.clear()
         logging.info("Cache cleared for the read method.")
 
+    def cache_info(self):
+        """Return hit/miss statistics for the query cache, overall and per query."""
+        return self.cache.stats()
+
+    def _tracked_fields(self):
+        """Fields whose pre-write values are needed to keep cached and derived data consistent."""
+        return ({"breed", "name", AGE_FIELD} | set(COORDINATE_FIELDS) | set(self.column_snapshot.fields()) | set(VIEW_FIELDS)
+                | set(ROLLUP_FIELDS) | self.cache.dependency_fields())
+
+    def _fetch_pre_images(self, criteria):
+        """
+        Fetch the `_id` and tracked fields of the documents a write is about to touch.
+        - The write is then restricted to these `_id`s so the pre-images match exactly what changed.
+        """
+
+        projection = {field: 1 for field in self._tracked_fields()}
+        projection["_id"] = 1
+        return list(self.collection.find(criteria, projection))
+
+    def _after_write(self, pre_images, post_images):
+        """
+        Keep cached data consistent after a write.
+        - Evicts only the cache entries that could match a touched document before or after the write.
+        """
+
+        evicted = self.cache.invalidate(list(pre_images) + list(post_images))
+        logging.info("Cache invalidated %s entries after write.", evicted)
+
+        with self._index_lock:
+            if self._index_building:
+                # The indexes are being built; the builder replays this write before installing them
+                self._pending_writes.append((list(pre_images), list(post_images)))
+            if not self._indexes_ready.is_set():
+                # Nothing is installed yet, or the build replaces the indexes while reads go to MongoDB
+                return
+            if self._saving_snapshot:
+                # The indexes are being pickled; the write is applied once the snapshot is written
+                self._deferred_writes.append((list(pre_images), list(post_images)))
+            else:
+                self._maintain_indexes(pre_images, post_images)
+                self._mark_snapshot_dirty()
+
+    def _maintain_indexes(self, pre_images, post_images):
+        """
+        Apply a write to every in-memory index incrementally.
+        - Re-indexes the touched `_id`s from their post-images and drops the `_id`s that no longer exist.
+        - Each structure leaves a document in place when its indexed fields did not change.
+        """
+
+        indexes = self._current_indexes()
+        surviving_ids = set()
+        for document in post_images:
+            self._index_document(indexes, document)
+            surviving_ids.add(document["_id"])
+
+        for document in pre_images:
+            if document["_id"] not in surviving_ids:
+                self._unindex_document(indexes, document["_id"])
+
+    @REGISTRY.instrument("animal_shelter.create")
     def create(self, data):
         """Create a new document in the collection and update the breed hash map."""
         try:
             if data:
-                insert = self.collection.insert_one(data)
+                insert = self.collection.insert_one(_add_location(data))
                 logging.info("Data inserted with acknowledgment: %s", insert.acknowledged)
 
-                # Update the breed hash map
-                breed = data.get("breed")
-                if breed:
-                    if breed in self.breed_hash_map:
-                        self.breed_hash_map[breed].append(data)
-                    else:
-                        self.breed_hash_map[breed] = [data]
-
-                # Clear cache after data modification
-                self.clear_cache()
+                # Update the breed hash map and the cache entries affected by the new document
+                self._after_write([], [data])
 
                 return insert.acknowledged
             else:
@@ -145,15 +1361,26 @@ class AnimalShelter(object):
             logging.error("Error occurred during creation: %s", str(e))
             raise
 
+    @REGISTRY.instrument("animal_shelter.update")
     def update(self, criteria, update_data):
         """Update documents based on criteria and maintain hash map consistency."""
         try:
             if criteria and update_data:
-                result = self.collection.update_many(criteria, {'$set': update_data})
+                update_data, relocate = _location_update(update_data)
+                pre_images = self._fetch_pre_images(criteria)
+                if not pre_images:
+                    logging.info("Update operation: matched 0 documents, modified 0 documents")
+                    return 0
+
+                ids = [document["_id"] for document in pre_images]
+                result = self.collection.update_many({"_id": {"$in": ids}}, {'$set': update_data})
                 logging.info("Update operation: matched %s documents, modified %s documents", result.matched_count, result.modified_count)
 
-                # Update the hash map and clear cache
-                self.clear_cache()
+                # Update the breed hash map and the cache entries affected by the old and new values
+                post_images = [_apply_set(document, update_data) for document in pre_images]
+                if relocate:
+                    self._sync_locations(post_images)
+                self._after_write(pre_images, post_images)
                 return result.modified_count
             else:
                 raise ValueError("Update parameters cannot be empty")
@@ -161,15 +1388,22 @@ class AnimalShelter(object):
             logging.error("Error occurred during update operation: %s", str(e))
             raise
 
+    @REGISTRY.instrument("animal_shelter.delete")
     def delete(self, criteria):
         """Delete documents based on criteria and update the breed hash map."""
         try:
             if criteria:
-                result = self.collection.delete_many(criteria)
+                pre_images = self._fetch_pre_images(criteria)
+                if not pre_images:
+                    logging.info("Delete operation: deleted 0 documents")
+                    return 0
+
+                ids = [document["_id"] for document in pre_images]
+                result = self.collection.delete_many({"_id": {"$in": ids}})
                 logging.info("Delete operation: deleted %s documents", result.deleted_count)
 
-                # Clear cache after data modification
-                self.clear_cache()
+                # Update the breed hash map and the cache entries affected by the removed documents
+                self._after_write(pre_images, [])
                 return result.deleted_count
             else:
                 raise ValueError("Delete parameters cannot be empty")
@@ -177,6 +1411,121 @@ class AnimalShelter(object):
             logging.error("Error occurred during delete operation: %s", str(e))
             raise
 
+    @REGISTRY.instrument("animal_shelter.create_many")
+    def create_many(self, documents):
+        """
+        Create many documents with a single unordered bulk write.
+
+        Returns:
+            dict: Overall counts and a per-document "results" list with each inserted `_id` or error.
+        """
+        if not documents:
+            raise ValueError("Nothing to save, documents parameter is empty")
+        requests = [InsertOne(_add_location(document)) for document in documents]
+        return self._bulk_write("create_many", requests, documents=documents)
+
+    @REGISTRY.instrument("animal_shelter.upsert_many")
+    def upsert_many(self, operations):
+        """
+        Update or insert one document per (criteria, data) pair with a single unordered bulk write.
+        - Each pair `$set`s data on the first document matching criteria, or inserts it if none match.
+
+        Returns:
+            dict: Overall counts and a per-operation "results" list with the upserted `_id` or error.
+        """
+        if not operations or not all(criteria and data for criteria, data in operations):
+            raise ValueError("Upsert parameters cannot be empty")
+        updates = [_location_update(data) for _, data in operations]
+        requests = [UpdateOne(criteria, {"$set": data}, upsert=True) for (criteria, _), (data, _) in zip(operations, updates)]
+        return self._bulk_write("upsert_many", requests, criteria_list=[criteria for criteria, _ in operations],
+                                relocate=any(relocate for _, relocate in updates))
+
+    @REGISTRY.instrument("animal_shelter.bulk_update")
+    def bulk_update(self, operations):
+        """
+        Apply many (criteria, update_data) updates with a single unordered bulk write.
+        - Each pair `$set`s update_data on every document matching criteria, like `update`.
+
+        Returns:
+            dict: Overall counts and a per-operation "results" list with any error.
+        """
+        if not operations or not all(criteria and data for criteria, data in operations):
+            raise ValueError("Update parameters cannot be empty")
+        updates = [_location_update(data) for _, data in operations]
+        requests = [UpdateMany(criteria, {"$set": data}) for (criteria, _), (data, _) in zip(operations, updates)]
+        return self._bulk_write("bulk_update", requests, criteria_list=[criteria for criteria, _ in operations],
+                                relocate=any(relocate for _, relocate in updates))
+
+    def _bulk_write(self, name, requests, documents=None, criteria_list=None, relocate=False):
+        """
+        Run a bulk write and maintain the cache and indexes once for the whole batch.
+        - Pre-images are read with one query over all criteria; post-images are re-read afterwards with one query
+          covering the same criteria, the pre-image `_id`s and the upserted `_id`s (an upsert may change a field of its
+          own criteria, so the criteria alone would miss the new document).
+        - relocate re-derives the GeoJSON location of the post-images, for updates that set a single coordinate.
+        - Failed operations are reported per operation instead of raising, since the write is unordered.
+        """
+        try:
+            pre_images = []
+            if criteria_list:
+                pre_images = self._fetch_pre_images({"$or": criteria_list})
+
+            try:
+                details = self.collection.bulk_write(requests, ordered=False).bulk_api_result
+            except BulkWriteError as e:
+                details = e.details
+
+            errors = {error["index"]: error.get("errmsg", "Write failed") for error in details.get("writeErrors", [])}
+            upserted = {item["index"]: item["_id"] for item in details.get("upserted", [])}
+
+            if documents is not None:
+                post_images = [document for index, document in enumerate(documents) if index not in errors]
+            else:
+                ids = [document["_id"] for document in pre_images] + list(upserted.values())
+                post_images = self._fetch_pre_images({"$or": list(criteria_list) + [{"_id": {"$in": ids}}]})
+                if relocate:
+                    self._sync_locations(post_images)
+
+            # One cache invalidation and one index maintenance pass for the whole batch
+            self._after_write(pre_images, post_images)
+
+            results = []
+            for index in range(len(requests)):
+                if index in errors:
+                    results.append({"index": index, "status": "fail", "message": errors[index]})
+                elif documents is not None:
+                    results.append({"index": index, "status": "success", "_id": documents[index].get("_id")})
+                else:
+                    results.append({"index": index, "status": "success", "upserted_id": upserted.get(index)})
+
+            summary = {
+                "inserted": details.get("nInserted", 0),
+                "matched": details.get("nMatched", 0),
+                "modified": details.get("nModified", 0),
+                "upserted": details.get("nUpserted", 0),
+                "failed": len(errors),
+                "results": results,
+            }
+            logging.info("Bulk %s operation: %s requests, inserted %s, matched %s, modified %s, upserted %s, failed %s",
+                         name, len(requests), summary["inserted"], summary["matched"], summary["modified"],
+                         summary["upserted"], summary["failed"])
+            return summary
+        except Exception as e:
+            logging.error("Error occurred during bulk %s operation: %s", name, str(e))
+            raise
+
+    def _sync_locations(self, documents):
+        """Set the GeoJSON location of written documents from their stored coordinates, or remove it if they are invalid."""
+        requests = []
+        for document in documents:
+            point = geo_point(document)
+            if point is None:
+                requests.append(UpdateOne({"_id": document["_id"]}, {"$unset": {LOCATION_FIELD: ""}}))
+            else:
+                requests.append(UpdateOne({"_id": document["_id"]}, {"$set": {LOCATION_FIELD: point}}))
+        if requests:
+            self.collection.bulk_write(requests, ordered=False)
+
     def _match_criteria(self, document, criteria):
         """Helper method to match a document against given criteria."""
         for key, value in criteria.items():
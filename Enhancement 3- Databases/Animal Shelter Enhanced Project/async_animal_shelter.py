@@ -0,0 +1,118 @@
+# Asyncio CRUD Operations for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# Every CRUD method of `AnimalShelter` blocks its caller while MongoDB answers, so concurrent dashboard sessions
+# queue behind each other. `AsyncAnimalShelter` exposes the same operations as coroutines that can be awaited
+# from async callbacks.
+#
+# Key Features:
+# 1. Mirrors `create`, `read`, `update` and `delete`, plus `read_page`, `group_counts` and the cache helpers.
+# 2. Wraps an `AnimalShelter`, so the query cache, the in-memory indexes and their write maintenance are shared
+#    with synchronous callers instead of being duplicated.
+# 3. The blocking pymongo calls run on a dedicated thread pool sized to the MongoClient connection pool, so the
+#    event loop is never blocked and at most one operation waits per pooled connection.
+# 4. Concurrent identical reads are deduplicated: callers that ask for the same cached query while it is in flight
+#    await the same result instead of each sending the query to MongoDB.
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from animal_shelter_CRUD_revised import AnimalShelter
+from query_cache import make_hashable
+from metrics import REGISTRY
+from mongo_client_registry import DEFAULT_POOL_OPTIONS
+
+
+class AsyncAnimalShelter(object):
+    """
+    Awaitable CRUD operations for the Animal collection in MongoDB.
+
+    Features:
+    - `await shelter.read(query)` and friends never block the event loop.
+    - Identical cached reads that overlap in time share one database round trip.
+    - `shelter.sync` is the wrapped AnimalShelter, for code that still needs the blocking API.
+    """
+
+    def __init__(self, *args, shelter=None, max_workers=None, **kwargs):
+        """
+        Input:
+            shelter (AnimalShelter): Existing shelter to wrap. When omitted, one is created from args and kwargs.
+            max_workers (int): Threads for blocking calls. Defaults to the shared client's maxPoolSize.
+        """
+        self.sync = shelter if shelter is not None else AnimalShelter(*args, **kwargs)
+        if max_workers is None:
+            max_workers = (kwargs.get("pool_options") or {}).get("maxPoolSize", DEFAULT_POOL_OPTIONS["maxPoolSize"])
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async-animal-shelter")
+        # (event loop, cache generation, read key) -> future shared by every caller awaiting that read
+        self._in_flight = {}
+        self.deduplicated_reads = 0
+
+        REGISTRY.register_gauge("animal_shelter_async_in_flight_reads", lambda: len(self._in_flight),
+                                {"collection": self.sync.collection.name})
+        logging.info("Async CRUD wrapper ready with %s worker threads", max_workers)
+
+    async def _run(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: function(*args, **kwargs))
+
+    async def create(self, data):
+        """Create a new document. See AnimalShelter.create."""
+        return await self._run(self.sync.create, data)
+
+    async def read(self, query, bypass_cache=False, search=None):
+        """
+        Read documents. See AnimalShelter.read.
+        - Cached reads that are already in flight are joined instead of being sent again.
+        - bypass_cache reads always go to the database, since they must see every write made before the call.
+        """
+        if bypass_cache:
+            return await self._run(self.sync.read, query, bypass_cache=True, search=search)
+
+        loop = asyncio.get_running_loop()
+        # The cache generation changes on every write, so a caller never joins a read that started before a write
+        key = (id(loop), self.sync.cache.generation, make_hashable(query), (search or "").strip().lower())
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.deduplicated_reads += 1
+            # shield() keeps one cancelled caller from cancelling the read for the others
+            return await asyncio.shield(future)
+
+        future = loop.run_in_executor(self._executor, lambda: self.sync.read(query, search=search))
+        self._in_flight[key] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def read_page(self, query, **kwargs):
+        """Read one keyset page. See AnimalShelter.read_page."""
+        return await self._run(self.sync.read_page, query, **kwargs)
+
+    async def group_counts(self, field, query=None, search=None, bypass_cache=False):
+        """Count documents per field value. See AnimalShelter.group_counts."""
+        return await self._run(self.sync.group_counts, field, query, search=search, bypass_cache=bypass_cache)
+
+    async def update(self, criteria, update_data):
+        """Update matching documents. See AnimalShelter.update."""
+        return await self._run(self.sync.update, criteria, update_data)
+
+    async def delete(self, criteria):
+        """Delete matching documents. See AnimalShelter.delete."""
+        return await self._run(self.sync.delete, criteria)
+
+    async def clear_cache(self):
+        """Clear the shared query cache."""
+        return await self._run(self.sync.clear_cache)
+
+    def cache_info(self):
+        """Return the shared query cache statistics, plus the number of deduplicated reads."""
+        info = self.sync.cache_info()
+        info["deduplicated_reads"] = self.deduplicated_reads
+        return info
+
+    def close(self):
+        """Stop the worker threads once the running operations finish."""
+        self._executor.shutdown(wait=True)
+
+
+__all__ = ["AsyncAnimalShelter"]
@@ -0,0 +1,207 @@
+# Compact Breed Index for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# This module provides `BreedIndex`, the structure behind `AnimalShelter.breed_hash_map`. It replaces the
+# dictionary of lists of {"breed": ...} documents, which kept one Python dict per animal.
+#
+# Key Features:
+# 1. Each document `_id` is assigned a small integer row number, and rows freed by deletes are reused.
+# 2. Breed keys are interned, and each breed maps to a compact `array` of row numbers (4 bytes per posting).
+# 3. O(1) counts per breed and O(1) lookups of a document's current breed.
+# 4. Each row remembers its position in its breed's posting array, so moving or removing a document swaps the last
+#    posting into its place in O(1) instead of searching an array of thousands of rows.
+# 5. `memory_footprint()` reports the deep size of the index, not just the outer dictionary.
+
+import sys
+from array import array
+
+from bson.objectid import ObjectId
+
+# Unsigned 32-bit row numbers
+_ROW_TYPECODE = "I"
+
+
+class BreedIndex(object):
+    """
+    Maps breeds to the documents that have them, using integer postings.
+
+    Features:
+    - `add`, `set` and `remove` keep the index current as documents are written.
+    - `count(breed)` and `breed_of(doc_id)` run in O(1), and so do moves and removals.
+    - `get(breed, default)` returns the document `_id`s for a breed, like the dictionary it replaces. The order
+      within a breed is not kept, since removals move the last posting into the freed position.
+    """
+
+    def __init__(self):
+        # Document `_id` -> row number
+        self._row_of = {}
+        # Row number -> document `_id` and interned breed (None for free rows)
+        self._doc_ids = []
+        self._breed_of_row = []
+        # Row number -> position of the row in its breed's posting array
+        self._position_of_row = array(_ROW_TYPECODE)
+        self._free_rows = []
+        # Interned breed -> array of row numbers
+        self._postings = {}
+
+    def add(self, doc_id, breed):
+        """Index a document under a breed. An already indexed document is moved to the new breed."""
+        self.set(doc_id, breed)
+
+    def set(self, doc_id, breed):
+        """
+        Record the current breed of a document.
+        - A falsy breed removes the document from the index.
+        - Setting the breed a document already has is a no-op.
+        """
+        if not breed:
+            self.remove(doc_id)
+            return
+
+        if isinstance(breed, str):
+            breed = sys.intern(breed)
+
+        row = self._row_of.get(doc_id)
+        if row is not None:
+            current = self._breed_of_row[row]
+            if current == breed:
+                return
+            self._unlink(row, current)
+        else:
+            row = self._allocate(doc_id)
+
+        self._breed_of_row[row] = breed
+        postings = self._postings.get(breed)
+        if postings is None:
+            postings = self._postings[breed] = array(_ROW_TYPECODE)
+        self._position_of_row[row] = len(postings)
+        postings.append(row)
+
+    def remove(self, doc_id):
+        """
+        Remove a document from the index.
+
+        Returns:
+            The breed the document was indexed under, or None if it was not indexed.
+        """
+        row = self._row_of.pop(doc_id, None)
+        if row is None:
+            return None
+
+        breed = self._breed_of_row[row]
+        self._unlink(row, breed)
+        self._doc_ids[row] = None
+        self._breed_of_row[row] = None
+        self._free_rows.append(row)
+        return breed
+
+    def count(self, breed):
+        """Return the number of documents with a breed in O(1)."""
+        postings = self._postings.get(breed)
+        return len(postings) if postings is not None else 0
+
+    def breed_of(self, doc_id):
+        """Return the indexed breed of a document, or None."""
+        row = self._row_of.get(doc_id)
+        return self._breed_of_row[row] if row is not None else None
+
+    def ids(self, breed):
+        """Yield the `_id`s of the documents with a breed."""
+        doc_ids = self._doc_ids
+        for row in self._postings.get(breed, ()):
+            yield doc_ids[row]
+
+    def get(self, breed, default=None):
+        """Return a list of the `_id`s with a breed, or default if the breed is not indexed."""
+        if breed not in self._postings:
+            return default
+        return list(self.ids(breed))
+
+    def document_count(self):
+        """Return the number of indexed documents."""
+        return len(self._row_of)
+
+    def breeds(self):
+        """Return the indexed breeds."""
+        return self._postings.keys()
+
+    keys = breeds
+
+    def counts(self):
+        """Return a dictionary of breed to document count."""
+        return {breed: len(postings) for breed, postings in self._postings.items()}
+
+    def clear(self):
+        """Remove every document from the index."""
+        self._row_of.clear()
+        self._doc_ids.clear()
+        self._breed_of_row.clear()
+        self._position_of_row = array(_ROW_TYPECODE)
+        self._free_rows.clear()
+        self._postings.clear()
+
+    def memory_footprint(self):
+        """
+        Report the deep memory footprint of the index in bytes.
+        - Includes the containers, the posting arrays, each distinct breed string and each document `_id`.
+        """
+        size = sys.getsizeof(self)
+        size += sys.getsizeof(self._row_of) + sys.getsizeof(self._doc_ids)
+        size += sys.getsizeof(self._breed_of_row) + sys.getsizeof(self._free_rows)
+        size += sys.getsizeof(self._position_of_row)
+        size += sys.getsizeof(self._postings)
+
+        for breed, postings in self._postings.items():
+            size += sys.getsizeof(breed) + sys.getsizeof(postings)
+
+        for doc_id in self._row_of:
+            size += sys.getsizeof(doc_id)
+            if isinstance(doc_id, ObjectId):
+                size += sys.getsizeof(doc_id.binary)
+
+        # Row numbers above the small-int cache are separate int objects in the dict values and free list
+        for row in self._row_of.values():
+            if row > 256:
+                size += sys.getsizeof(row)
+        for row in self._free_rows:
+            if row > 256:
+                size += sys.getsizeof(row)
+        return size
+
+    def __contains__(self, breed):
+        return breed in self._postings
+
+    def __len__(self):
+        return len(self._postings)
+
+    def __iter__(self):
+        return iter(self._postings)
+
+    def _allocate(self, doc_id):
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._doc_ids[row] = doc_id
+        else:
+            row = len(self._doc_ids)
+            self._doc_ids.append(doc_id)
+            self._breed_of_row.append(None)
+            self._position_of_row.append(0)
+        self._row_of[doc_id] = row
+        return row
+
+    def _unlink(self, row, breed):
+        postings = self._postings.get(breed)
+        if postings is None:
+            return
+        # Move the last posting into the row's position, then drop the last slot
+        position = self._position_of_row[row]
+        last = postings.pop()
+        if last != row:
+            postings[position] = last
+            self._position_of_row[last] = position
+        if not postings:
+            del self._postings[breed]
+
+
+__all__ = ["BreedIndex"]
@@ -0,0 +1,360 @@
+# Columnar In-Memory Snapshot for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# The dashboard's chart and table totals need counts over the whole filtered collection, and every callback used to
+# send them to MongoDB as an aggregation or count. `ColumnarSnapshot` keeps the fields those filters use in columns
+# instead of one dict per animal, so a filter is evaluated as a handful of vectorized comparisons over NumPy arrays.
+#
+# Key Features:
+# 1. Low-cardinality text fields (breed, animal_type, outcome_type, sex_upon_outcome, color) are dictionary-encoded:
+#    each distinct value is stored once and each row holds a 4-byte code.
+# 2. Numeric fields are float64 arrays, with NaN for missing values.
+# 3. Each document `_id` owns a row, rows freed by deletes are reused, and the columns grow by doubling.
+# 4. `mask(query)` translates the subset of MongoDB filters the dashboard sends (equality, $in/$nin, $ne, ranges,
+#    $regex on encoded fields, $and/$or, `_id` lists) into a boolean mask. Anything else returns None, and the
+#    caller falls back to MongoDB.
+# 5. A field that ever holds a value of another type (e.g. a list, or text in a numeric field) is excluded from
+#    masks until the snapshot is rebuilt, since MongoDB would match it differently.
+
+import numbers
+import re
+import sys
+
+import numpy as np
+
+from bson.objectid import ObjectId
+
+# Fields stored as dictionary codes and as numbers
+CATEGORICAL_FIELDS = ("breed", "animal_type", "outcome_type", "sex_upon_outcome", "color")
+NUMERIC_FIELDS = ("age_upon_outcome_in_weeks", "location_lat", "location_long", "rec_num")
+
+# Code of a missing or null value
+_MISSING = -1
+
+_RANGE_OPERATORS = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _type_order(value):
+    """Order of BSON type brackets used when sorting grouped values: null, numbers, strings, then anything else."""
+    if value is None:
+        return 0
+    if _is_number(value):
+        return 1
+    if isinstance(value, str):
+        return 2
+    return 3
+
+
+def _group_sort_key(pair):
+    """Sort (value, count) pairs like `{"$sort": {"count": -1, "_id": 1}}`."""
+    value, count = pair
+    order = _type_order(value)
+    return -count, order, value if order in (1, 2) else str(value)
+
+
+def _comparable(left, right):
+    return (_is_number(left) and _is_number(right)) or (isinstance(left, str) and isinstance(right, str))
+
+
+class ColumnarSnapshot(object):
+    """
+    Column store of the filterable fields of every document.
+
+    Features:
+    - `set(doc_id, document)` and `remove(doc_id)` keep it current as documents are written.
+    - `count(query)`, `ids(query)` and `value_counts(field, query)` answer supported filters without MongoDB,
+      and return None for filters they cannot evaluate exactly.
+    """
+
+    def __init__(self, categorical_fields=CATEGORICAL_FIELDS, numeric_fields=NUMERIC_FIELDS, capacity=1024):
+        self.categorical_fields = tuple(categorical_fields)
+        self.numeric_fields = tuple(numeric_fields)
+        self._reset(capacity)
+
+    def _reset(self, capacity):
+        # Document `_id` -> row number, and row number -> `_id` (None for free rows)
+        self._row_of = {}
+        self._doc_ids = []
+        self._free_rows = []
+        self._capacity = max(1, capacity)
+        self._alive = np.zeros(self._capacity, dtype=bool)
+        # Categorical field -> row codes, code -> value and value -> code
+        self._codes = {field: np.full(self._capacity, _MISSING, dtype=np.int32) for field in self.categorical_fields}
+        self._categories = {field: [] for field in self.categorical_fields}
+        self._code_of = {field: {} for field in self.categorical_fields}
+        # Numeric field -> values
+        self._numbers = {field: np.full(self._capacity, np.nan) for field in self.numeric_fields}
+        # Fields holding values of an unexpected type
+        self._mixed = set()
+
+    def fields(self):
+        """Return every stored field."""
+        return self.categorical_fields + self.numeric_fields
+
+    def set(self, doc_id, document):
+        """Store the current field values of a document, replacing any previous ones."""
+        row = self._row_of.get(doc_id)
+        if row is None:
+            row = self._allocate(doc_id)
+
+        for field in self.categorical_fields:
+            self._codes[field][row] = self._encode(field, document.get(field))
+        for field in self.numeric_fields:
+            value = document.get(field)
+            if _is_number(value):
+                self._numbers[field][row] = value
+            else:
+                if value is not None:
+                    self._mixed.add(field)
+                self._numbers[field][row] = np.nan
+
+    def remove(self, doc_id):
+        """Remove a document. Returns True if it was stored."""
+        row = self._row_of.pop(doc_id, None)
+        if row is None:
+            return False
+        self._doc_ids[row] = None
+        self._alive[row] = False
+        for codes in self._codes.values():
+            codes[row] = _MISSING
+        for values in self._numbers.values():
+            values[row] = np.nan
+        self._free_rows.append(row)
+        return True
+
+    def mask(self, query):
+        """
+        Evaluate a MongoDB filter over every row.
+
+        Returns:
+            numpy.ndarray: Boolean mask of the matching rows, or None if the filter is not supported.
+        """
+        size = len(self._doc_ids)
+        if not query:
+            return self._alive[:size].copy()
+        mask = self._mask(query, size)
+        return None if mask is None else mask & self._alive[:size]
+
+    def count(self, query=None):
+        """Return the number of documents matching query, or None if the filter is not supported."""
+        mask = self.mask(query)
+        return None if mask is None else int(np.count_nonzero(mask))
+
+    def ids(self, query=None):
+        """Return the `_id`s of the documents matching query, or None if the filter is not supported."""
+        mask = self.mask(query)
+        if mask is None:
+            return None
+        return [self._doc_ids[row] for row in np.flatnonzero(mask)]
+
+    def value_counts(self, field, query=None):
+        """
+        Count matching documents per value of a categorical field, like a MongoDB `$group`.
+        - Missing values are counted under None.
+
+        Returns:
+            list: (value, count) pairs, largest count first, or None if the field or filter is not supported.
+        """
+        if field not in self._codes or field in self._mixed:
+            return None
+        mask = self.mask(query)
+        if mask is None:
+            return None
+
+        # Shift codes by one so missing values land in bin 0
+        counts = np.bincount(self._codes[field][:len(mask)][mask] + 1, minlength=len(self._categories[field]) + 1)
+        categories = [None] + self._categories[field]
+        pairs = [(categories[code], int(counts[code])) for code in np.flatnonzero(counts)]
+        pairs.sort(key=_group_sort_key)
+        return pairs
+
+    def clear(self):
+        """Remove every document and forget the encoded values."""
+        self._reset(self._capacity)
+
+    def memory_footprint(self):
+        """Report the memory used by the columns, the dictionaries and the `_id` mapping in bytes."""
+        size = sys.getsizeof(self) + self._alive.nbytes
+        size += sum(codes.nbytes for codes in self._codes.values())
+        size += sum(values.nbytes for values in self._numbers.values())
+        for field in self.categorical_fields:
+            size += sys.getsizeof(self._categories[field]) + sys.getsizeof(self._code_of[field])
+            size += sum(sys.getsizeof(value) for value in self._categories[field])
+        size += sys.getsizeof(self._row_of) + sys.getsizeof(self._doc_ids) + sys.getsizeof(self._free_rows)
+        for doc_id in self._row_of:
+            size += sys.getsizeof(doc_id)
+            if isinstance(doc_id, ObjectId):
+                size += sys.getsizeof(doc_id.binary)
+        return size
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._row_of
+
+    # Storage
+
+    def _allocate(self, doc_id):
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._doc_ids[row] = doc_id
+        else:
+            row = len(self._doc_ids)
+            if row >= self._capacity:
+                self._grow()
+            self._doc_ids.append(doc_id)
+        self._row_of[doc_id] = row
+        self._alive[row] = True
+        return row
+
+    def _grow(self):
+        extra = self._capacity
+        self._alive = np.concatenate([self._alive, np.zeros(extra, dtype=bool)])
+        for field, codes in self._codes.items():
+            self._codes[field] = np.concatenate([codes, np.full(extra, _MISSING, dtype=np.int32)])
+        for field, values in self._numbers.items():
+            self._numbers[field] = np.concatenate([values, np.full(extra, np.nan)])
+        self._capacity += extra
+
+    def _encode(self, field, value):
+        if value is None:
+            return _MISSING
+        if isinstance(value, (list, dict)):
+            self._mixed.add(field)
+            return _MISSING
+        code = self._code_of[field].get(value)
+        if code is None:
+            if isinstance(value, str):
+                value = sys.intern(value)
+            code = self._code_of[field][value] = len(self._categories[field])
+            self._categories[field].append(value)
+        return code
+
+    # Filter evaluation; every helper returns None for unsupported filters
+
+    def _mask(self, query, size):
+        mask = np.ones(size, dtype=bool)
+        for key, condition in query.items():
+            if key == "$and" or key == "$or":
+                if not isinstance(condition, (list, tuple)) or not condition:
+                    return None
+                masks = [self._mask(clause, size) if clause else np.ones(size, dtype=bool) for clause in condition]
+                if any(part is None for part in masks):
+                    return None
+                combined = np.logical_and.reduce(masks) if key == "$and" else np.logical_or.reduce(masks)
+                mask &= combined
+            elif key == "_id":
+                part = self._id_mask(condition, size)
+                if part is None:
+                    return None
+                mask &= part
+            elif key in self._mixed:
+                return None
+            elif key in self._codes:
+                part = self._field_mask(self._categorical_mask, key, condition, size)
+                if part is None:
+                    return None
+                mask &= part
+            elif key in self._numbers:
+                part = self._field_mask(self._numeric_mask, key, condition, size)
+                if part is None:
+                    return None
+                mask &= part
+            else:
+                return None
+        return mask
+
+    def _id_mask(self, condition, size):
+        if isinstance(condition, dict):
+            if set(condition) != {"$in"}:
+                return None
+            doc_ids = condition["$in"]
+        else:
+            doc_ids = [condition]
+        mask = np.zeros(size, dtype=bool)
+        rows = [self._row_of[doc_id] for doc_id in doc_ids if doc_id in self._row_of]
+        mask[rows] = True
+        return mask
+
+    def _field_mask(self, evaluate, field, condition, size):
+        if not (isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition)):
+            return evaluate(field, "$eq", condition, size)
+
+        condition = dict(condition)
+        if "$regex" in condition:
+            options = condition.pop("$options", "")
+            condition["$regex"] = (condition["$regex"], options)
+        mask = np.ones(size, dtype=bool)
+        for operator, value in condition.items():
+            part = evaluate(field, operator, value, size)
+            if part is None:
+                return None
+            mask &= part
+        return mask
+
+    def _categorical_mask(self, field, operator, value, size):
+        codes = self._codes[field][:size]
+        categories = self._categories[field]
+
+        if operator in ("$eq", "$ne", "$in", "$nin"):
+            values = value if operator in ("$in", "$nin") else [value]
+            if not isinstance(values, (list, tuple)) or any(isinstance(item, (list, dict)) for item in values):
+                return None
+            matching = [self._code_of[field][item] for item in values
+                        if item is not None and item in self._code_of[field]]
+            if any(item is None for item in values):
+                matching.append(_MISSING)
+            mask = np.isin(codes, matching)
+            return ~mask if operator in ("$ne", "$nin") else mask
+
+        if operator == "$regex":
+            pattern, options = value
+            if not isinstance(pattern, str) or set(options or "") - {"i"}:
+                return None
+            expression = re.compile(pattern, re.IGNORECASE if options else 0)
+            matching = [code for code, category in enumerate(categories)
+                        if isinstance(category, str) and expression.search(category)]
+            return np.isin(codes, matching)
+
+        if operator in _RANGE_OPERATORS:
+            compare = _RANGE_OPERATORS[operator]
+            matching = [code for code, category in enumerate(categories)
+                        if _comparable(category, value) and compare(category, value)]
+            return np.isin(codes, matching)
+
+        return None
+
+    def _numeric_mask(self, field, operator, value, size):
+        values = self._numbers[field][:size]
+
+        if operator in ("$eq", "$ne", "$in", "$nin"):
+            items = value if operator in ("$in", "$nin") else [value]
+            if not isinstance(items, (list, tuple)):
+                return None
+            mask = np.zeros(size, dtype=bool)
+            for item in items:
+                if item is None:
+                    mask |= np.isnan(values)
+                elif _is_number(item):
+                    mask |= values == item
+                elif isinstance(item, (list, dict)):
+                    return None
+            return ~mask if operator in ("$ne", "$nin") else mask
+
+        if operator in _RANGE_OPERATORS:
+            if not _is_number(value):
+                # Range comparisons never match across types
+                return np.zeros(size, dtype=bool)
+            with np.errstate(invalid="ignore"):
+                return _RANGE_OPERATORS[operator](values, value)
+
+        return None
+
+
+__all__ = ["ColumnarSnapshot", "CATEGORICAL_FIELDS", "NUMERIC_FIELDS"]
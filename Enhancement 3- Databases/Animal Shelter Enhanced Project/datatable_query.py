@@ -0,0 +1,175 @@
+# DataTable Query Translation for EJG Animal Shelter Dashboard
+# Author: Edward Garcia
+
+# Overview:
+# The dashboard DataTable runs with page_action, sort_action and filter_action set to "custom", so paging,
+# sorting and filtering are done by MongoDB rather than in the browser. This module translates the table's
+# `sort_by` and `filter_query` properties into the sort specification and filter that `AnimalShelter.read_page` expects.
+#
+# Supported filter operators (as typed in the DataTable filter row):
+# - `=`/`eq`, `!=`/`ne`, `<`/`lt`, `<=`/`le`, `>`/`gt`, `>=`/`ge`
+# - `contains` (substring) and `datestartswith` (prefix)
+# - The `i` and `s` prefixes (`icontains`, `seq`, ...) make text comparisons case-insensitive or case-sensitive.
+#   Unprefixed `contains` is case-insensitive; the other unprefixed operators are case-sensitive.
+# - Unary tests: `is blank`, `is not blank`, `is nil`, `is not nil`, `is num`, `is str`, `is bool`, `is object`,
+#   `is even` and `is odd`.
+# - Expressions combined with `&&`, which may also appear inside quoted values.
+# Any other expression raises ValueError, so an unsupported filter is never silently dropped.
+
+import re
+
+# DataTable operators mapped to MongoDB query operators
+_OPERATORS = {
+    "=": "$eq", "eq": "$eq",
+    "!=": "$ne", "ne": "$ne",
+    "<": "$lt", "lt": "$lt",
+    "<=": "$lte", "le": "$lte",
+    ">": "$gt", "gt": "$gt",
+    ">=": "$gte", "ge": "$gte",
+    "contains": "contains",
+    "datestartswith": "datestartswith",
+}
+
+# One "{column} operator value" expression; word operators may carry the table's i/s case prefix
+_EXPRESSION = re.compile(
+    r"^\s*\{(?P<name>[^}]+)\}\s*"
+    r"(?P<case>[is]?)(?P<operator>!=|<=|>=|=|<|>|(?:eq|ne|lt|le|gt|ge|contains|datestartswith)\b)"
+    r"\s*(?P<value>.*?)\s*$"
+)
+
+# One "{column} is ..." expression
+_UNARY_EXPRESSION = re.compile(r"^\s*\{(?P<name>[^}]+)\}\s+(?P<operator>is\s+(?:not\s+)?\w+)\s*$")
+
+# DataTable unary operators mapped to MongoDB conditions on the column
+_UNARY_OPERATORS = {
+    "is blank": {"$in": [None, ""]},
+    "is not blank": {"$nin": [None, ""]},
+    "is nil": {"$eq": None},
+    "is not nil": {"$ne": None},
+    "is num": {"$type": "number"},
+    "is str": {"$type": "string"},
+    "is bool": {"$type": "bool"},
+    "is object": {"$type": "object"},
+    "is even": {"$mod": [2, 0]},
+    "is odd": {"$mod": [2, 1]},
+}
+
+_QUOTES = ("'", '"', "`")
+
+
+def translate_sort_by(sort_by):
+    """
+    Convert a DataTable `sort_by` list into a MongoDB sort specification.
+
+    Input:
+        sort_by (list): Items of the form {"column_id": "breed", "direction": "asc"}.
+
+    Returns:
+        list: (field, direction) pairs, or an empty list.
+    """
+    return [
+        (item["column_id"], 1 if item.get("direction", "asc") == "asc" else -1)
+        for item in (sort_by or [])
+    ]
+
+
+def translate_filter_query(filter_query):
+    """
+    Convert a DataTable `filter_query` string into a MongoDB filter.
+
+    Input:
+        filter_query (str): For example '{breed} contains "lab" && {age_upon_outcome_in_weeks} > 52'.
+
+    Returns:
+        dict: The equivalent MongoDB filter, or an empty dict when there is nothing to filter.
+
+    Raises:
+        ValueError: If an expression uses an operator or syntax this module does not support.
+    """
+    clauses = []
+    for part in _split_expressions(filter_query or ""):
+        if part.strip():
+            clauses.append(_translate_part(part))
+
+    if not clauses:
+        return {}
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def _split_expressions(filter_query):
+    """Split a filter query on the `&&` that lie outside quoted values."""
+    parts = []
+    start = 0
+    quote = None
+    position = 0
+    while position < len(filter_query):
+        character = filter_query[position]
+        if quote:
+            if character == "\\":
+                position += 1
+            elif character == quote:
+                quote = None
+        elif character in _QUOTES:
+            quote = character
+        elif filter_query.startswith("&&", position):
+            parts.append(filter_query[start:position])
+            start = position + 2
+            position += 1
+        position += 1
+    parts.append(filter_query[start:])
+    return parts
+
+
+def _translate_part(part):
+    unary = _UNARY_EXPRESSION.match(part)
+    if unary:
+        operator = " ".join(unary.group("operator").split())
+        if operator not in _UNARY_OPERATORS:
+            raise ValueError("Unsupported DataTable filter operator: %s" % operator)
+        return {unary.group("name"): dict(_UNARY_OPERATORS[operator])}
+
+    match = _EXPRESSION.match(part)
+    if not match:
+        raise ValueError("Unsupported DataTable filter expression: %s" % part.strip())
+
+    name = match.group("name")
+    mongo_operator = _OPERATORS[match.group("operator")]
+    value = _parse_value(match.group("value"))
+    # contains defaults to case-insensitive; the other operators compare exactly unless the i prefix is given
+    case = match.group("case") or ("i" if mongo_operator == "contains" else "s")
+
+    if mongo_operator == "contains":
+        return {name: _regex(re.escape(str(value)), case)}
+    if mongo_operator == "datestartswith":
+        return {name: _regex("^" + re.escape(str(value)), case)}
+    if case == "i" and isinstance(value, str) and mongo_operator in ("$eq", "$ne"):
+        condition = _regex("^" + re.escape(value) + "$", "i")
+        return {name: condition if mongo_operator == "$eq" else {"$not": condition}}
+    if mongo_operator == "$eq":
+        return {name: value}
+    return {name: {mongo_operator: value}}
+
+
+def _regex(pattern, case):
+    if case == "i":
+        return {"$regex": pattern, "$options": "i"}
+    return {"$regex": pattern}
+
+
+def _parse_value(value):
+    """Strip DataTable quoting and convert unquoted numbers."""
+    if value and value[0] == value[-1] and value[0] in _QUOTES and len(value) > 1:
+        return value[1:-1].replace("\\" + value[0], value[0])
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+__all__ = ["translate_sort_by", "translate_filter_query"]
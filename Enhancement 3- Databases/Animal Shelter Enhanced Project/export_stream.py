@@ -0,0 +1,267 @@
+# Streaming Exports for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# The dashboard download used to render the whole export into one string before the browser received the first byte.
+# This module turns the batches streamed by `AnimalShelter.read_iter` into file chunks as they arrive, so an export
+# of any size starts downloading immediately and only holds one batch in memory.
+#
+# Key Features:
+# 1. CSV output, optionally gzip-compressed on the fly.
+# 2. Columnar Parquet output (snappy, gzip or zstd compressed) with one row group per batch. Parquet needs the
+#    optional `pyarrow` package, which is only imported when a Parquet export is requested; `parquet_available`
+#    tells callers whether to offer it.
+# 3. Column types for Parquet are fixed from the first batch, so every row group shares one schema.
+# 4. `ExportTickets` hands out short-lived, single-use links, so a download URL never carries the session token.
+
+import csv
+import importlib.util
+import io
+import numbers
+import secrets
+import threading
+import time
+import zlib
+
+# Format -> (supported compressions, default compression)
+EXPORT_FORMATS = {
+    "csv": ((None, "gzip"), None),
+    "parquet": ((None, "snappy", "gzip", "zstd"), "snappy"),
+}
+
+# Compression argument meaning "the format's default"
+DEFAULT_COMPRESSION = "default"
+
+
+def _resolve_compression(fmt, compression):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError("Unsupported export format: %s" % fmt)
+    supported, default = EXPORT_FORMATS[fmt]
+    if compression == DEFAULT_COMPRESSION:
+        return default
+    if compression not in supported:
+        raise ValueError("Unsupported %s compression: %s" % (fmt, compression))
+    return compression
+
+
+def parquet_available():
+    """True if the optional pyarrow package is installed, so Parquet exports can be offered."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def export_filename(name, fmt, compression=DEFAULT_COMPRESSION):
+    """Return the download file name for an export, e.g. "animals.csv.gz"."""
+    compression = _resolve_compression(fmt, compression)
+    suffix = ".csv.gz" if fmt == "csv" and compression == "gzip" else "." + fmt
+    return name + suffix
+
+
+def export_mimetype(fmt, compression=DEFAULT_COMPRESSION):
+    """Return the Content-Type of an export."""
+    compression = _resolve_compression(fmt, compression)
+    if fmt == "csv":
+        return "application/gzip" if compression == "gzip" else "text/csv"
+    return "application/vnd.apache.parquet"
+
+
+def _columns_from(batch):
+    columns = []
+    seen = set()
+    for document in batch:
+        for field in document:
+            if field not in seen:
+                seen.add(field)
+                columns.append(field)
+    return columns
+
+
+def iter_export(batches, fmt="csv", compression=DEFAULT_COMPRESSION, columns=None):
+    """
+    Convert batches of documents into the chunks of an export file.
+
+    Input:
+        batches (iterable): Lists of documents, e.g. from `AnimalShelter.read_iter`.
+        fmt (str): "csv" or "parquet".
+        compression (str): See EXPORT_FORMATS. Defaults to none for CSV and snappy for Parquet.
+        columns (list): Fields to export, in order. Defaults to the fields of the first batch.
+
+    Returns:
+        generator: bytes chunks, one or more per batch.
+    """
+    compression = _resolve_compression(fmt, compression)
+    if fmt == "csv":
+        return iter_csv(batches, columns, compression)
+    return iter_parquet(batches, columns, compression)
+
+
+def iter_csv(batches, columns=None, compression=None):
+    """
+    Yield a CSV file batch by batch.
+    - Fields outside columns are left out, and missing fields are written as empty values.
+    - With compression="gzip" the chunks form a single gzip stream.
+    """
+    compressor = zlib.compressobj(wbits=31) if compression == "gzip" else None
+    buffer = io.StringIO()
+    writer = None
+
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    for batch in batches:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=columns or _columns_from(batch), extrasaction="ignore")
+            writer.writeheader()
+        writer.writerows(batch)
+        chunk = drain()
+        if chunk:
+            yield chunk
+
+    if writer is None and columns:
+        # No documents matched; still produce the header row
+        csv.DictWriter(buffer, fieldnames=columns).writeheader()
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that collects what the Parquet writer writes until it is taken."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _parquet_schema(pyarrow, batch, columns):
+    """Columns holding only numbers in the first batch are stored as float64, every other column as text."""
+    fields = []
+    for column in columns:
+        values = [document.get(column) for document in batch if document.get(column) is not None]
+        if values and all(_is_number(value) for value in values):
+            fields.append(pyarrow.field(column, pyarrow.float64()))
+        else:
+            fields.append(pyarrow.field(column, pyarrow.string()))
+    return pyarrow.schema(fields)
+
+
+def _parquet_value(value, is_text):
+    if value is None:
+        return None
+    if is_text:
+        return value if isinstance(value, str) else str(value)
+    # Text found in a numeric column after the first batch is exported as missing rather than failing the download
+    return float(value) if _is_number(value) else None
+
+
+def iter_parquet(batches, columns=None, compression="snappy"):
+    """
+    Yield a Parquet file with one row group per batch; the footer comes with the last chunk.
+    - Raises RuntimeError right away, before anything is streamed, if pyarrow is not installed.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet as parquet
+    except ImportError:
+        raise RuntimeError("Parquet exports need the pyarrow package (pip install pyarrow)")
+    return _parquet_chunks(pyarrow, parquet, batches, columns, compression)
+
+
+def _parquet_chunks(pyarrow, parquet, batches, columns, compression):
+    sink = _ChunkSink()
+    writer = None
+    schema = None
+    for batch in batches:
+        if not batch:
+            continue
+        if writer is None:
+            schema = _parquet_schema(pyarrow, batch, columns or _columns_from(batch))
+            writer = parquet.ParquetWriter(sink, schema, compression=compression or "none")
+        arrays = []
+        for field in schema:
+            is_text = pyarrow.types.is_string(field.type)
+            values = [_parquet_value(document.get(field.name), is_text) for document in batch]
+            arrays.append(pyarrow.array(values, type=field.type))
+        writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+        chunk = sink.take()
+        if chunk:
+            yield chunk
+
+    if writer is None:
+        # No documents matched; write an empty file with text columns
+        schema = pyarrow.schema([pyarrow.field(column, pyarrow.string()) for column in (columns or [])])
+        writer = parquet.ParquetWriter(sink, schema, compression=compression or "none")
+    writer.close()
+    chunk = sink.take()
+    if chunk:
+        yield chunk
+
+
+class ExportTickets(object):
+    """
+    Short-lived, single-use export links.
+
+    Features:
+    - `create(spec)` stores what to export and returns an unguessable ticket for the download URL.
+    - `redeem(ticket)` returns the spec once, or None if the ticket is unknown, used or expired.
+    """
+
+    def __init__(self, ttl=60, max_tickets=1000):
+        self.ttl = ttl
+        self.max_tickets = max_tickets
+        # Ticket -> (spec, expiry time)
+        self._tickets = {}
+        self._lock = threading.Lock()
+
+    def create(self, spec):
+        ticket = secrets.token_urlsafe(24)
+        now = time.monotonic()
+        with self._lock:
+            if len(self._tickets) >= self.max_tickets:
+                for expired in [key for key, (_, expires) in self._tickets.items() if expires <= now]:
+                    del self._tickets[expired]
+                if len(self._tickets) >= self.max_tickets:
+                    # Drop the oldest ticket; dictionaries keep insertion order
+                    del self._tickets[next(iter(self._tickets))]
+            self._tickets[ticket] = (spec, now + self.ttl)
+        return ticket
+
+    def redeem(self, ticket):
+        with self._lock:
+            entry = self._tickets.pop(ticket, None)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def __len__(self):
+        return len(self._tickets)
+
+
+__all__ = ["EXPORT_FORMATS", "DEFAULT_COMPRESSION", "ExportTickets", "export_filename", "export_mimetype",
+           "iter_export", "iter_csv", "iter_parquet", "parquet_available"]
@@ -0,0 +1,93 @@
+# Geospatial Helpers for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# Outcome locations are stored in the CSV as two plain floats, `location_lat` and `location_long`, which MongoDB cannot
+# index spatially. AnimalShelter keeps a GeoJSON point in a `location` field next to them, covered by a `2dsphere`
+# index, and this module builds that point and the filters the map queries send to MongoDB.
+#
+# Key Features:
+# 1. `geo_point` derives the GeoJSON point of a document, or None when its coordinates are missing or out of range.
+# 2. `radius_filter` selects points within a distance in meters of a center, nearest first.
+# 3. `bbox_filter` selects points inside a map viewport. Viewports that are 180 degrees of longitude or wider, or that
+#    cross the antimeridian, are split into several polygons so each stays smaller than a hemisphere.
+
+import numbers
+
+# Field holding the GeoJSON point of each animal
+LOCATION_FIELD = "location"
+
+# Coordinate fields the point is derived from
+COORDINATE_FIELDS = ("location_lat", "location_long")
+
+
+def _is_coordinate(value, limit):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool) and -limit <= value <= limit
+
+
+def geo_point(document):
+    """
+    Build the GeoJSON point of a document from its location_lat and location_long.
+
+    Returns:
+        dict: {"type": "Point", "coordinates": [longitude, latitude]}, or None if the coordinates are not valid.
+    """
+    latitude = document.get("location_lat")
+    longitude = document.get("location_long")
+    if not _is_coordinate(latitude, 90) or not _is_coordinate(longitude, 180):
+        return None
+    return {"type": "Point", "coordinates": [float(longitude), float(latitude)]}
+
+
+def radius_filter(latitude, longitude, radius_meters):
+    """
+    Build a filter for points within radius_meters of a center. MongoDB returns the matches nearest first.
+    """
+    if radius_meters < 0:
+        raise ValueError("radius_meters cannot be negative")
+    center = geo_point({"location_lat": latitude, "location_long": longitude})
+    if center is None:
+        raise ValueError("Invalid center coordinates: (%s, %s)" % (latitude, longitude))
+    return {LOCATION_FIELD: {"$nearSphere": {"$geometry": center, "$maxDistance": radius_meters}}}
+
+
+def _box(south, west, north, east):
+    ring = [[west, south], [east, south], [east, north], [west, north], [west, south]]
+    return {LOCATION_FIELD: {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}}
+
+
+def bbox_filter(south, west, north, east):
+    """
+    Build a filter for points inside a bounding box, as reported by the map's bounds.
+    - west may be greater than east when the box crosses the antimeridian, and longitudes outside [-180, 180]
+      (from a map that was panned around the world) are wrapped.
+    - Polygon edges follow great circles, so at high latitudes the box is slightly wider than a map rectangle.
+    """
+    if not (-90 <= south <= 90 and -90 <= north <= 90) or south >= north:
+        raise ValueError("Invalid latitude range: %s to %s" % (south, north))
+
+    if east - west >= 360:
+        west, east = -180.0, 180.0
+    else:
+        west = (west + 180) % 360 - 180
+        east = (east + 180) % 360 - 180
+        if east <= west:
+            east += 360
+
+    # Cut the box into pieces narrower than 180 degrees, then wrap the pieces that lie past the antimeridian
+    boxes = []
+    edge = west
+    while edge < east:
+        piece_east = min(east, edge + 120)
+        if edge >= 180:
+            boxes.append(_box(south, edge - 360, north, piece_east - 360))
+        elif piece_east > 180:
+            boxes.append(_box(south, edge, north, 180))
+            boxes.append(_box(south, -180, north, piece_east - 360))
+        else:
+            boxes.append(_box(south, edge, north, piece_east))
+        edge = piece_east
+    return boxes[0] if len(boxes) == 1 else {"$or": boxes}
+
+
+__all__ = ["LOCATION_FIELD", "COORDINATE_FIELDS", "geo_point", "radius_filter", "bbox_filter"]
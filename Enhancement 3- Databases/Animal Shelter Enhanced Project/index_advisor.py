@@ -0,0 +1,153 @@
+# Index Provisioning and Query-Shape Advisor for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# Nothing in the project used to create MongoDB indexes, so query performance depended on whatever indexes the
+# database happened to have. This module lets `AnimalShelter` and `UserManagement` declare their indexes and
+# ensure them at startup, and provides `QueryAdvisor` to check that the queries they actually run use them.
+#
+# Key Features:
+# 1. `ensure_indexes(collection, declarations)` creates the declared indexes (a no-op when they already exist).
+# 2. `query_shape(query)` reduces a filter to its shape: field names and operators with the values removed.
+# 3. `QueryAdvisor` counts the shapes it observes, keeps one sample of each, and runs `explain()` on demand to
+#    flag shapes whose winning plan is a collection scan.
+
+import logging
+import threading
+from collections import OrderedDict
+
+from pymongo import IndexModel
+
+
+def ensure_indexes(collection, declarations, logger=logging):
+    """
+    Create the declared indexes on a collection.
+
+    Input:
+        collection: pymongo collection.
+        declarations (list): (keys, options) pairs, e.g. ([("username", 1)], {"unique": True, "name": "username_unique"}).
+
+    Returns:
+        list: Names of the ensured indexes, or an empty list if they could not be created.
+    """
+    models = [IndexModel(keys, **options) for keys, options in declarations]
+    try:
+        names = collection.create_indexes(models)
+        logger.info("Ensured indexes on '%s': %s", collection.name, ", ".join(names))
+        return names
+    except Exception as e:
+        # Missing privileges or conflicting existing indexes should not stop the application from starting.
+        logger.error("Error ensuring indexes on '%s': %s", collection.name, str(e))
+        return []
+
+
+def query_shape(query):
+    """
+    Reduce a MongoDB filter to its shape by replacing values with 1.
+    - {"breed": {"$in": ["Bloodhound", "Rottweiler"]}} becomes {"breed": {"$in": 1}}.
+    """
+    if isinstance(query, dict):
+        return {key: query_shape(value) for key, value in sorted(query.items())}
+    if isinstance(query, (list, tuple)):
+        if any(isinstance(item, dict) for item in query):
+            # Logical operators such as $and and $or keep one shape per branch
+            return [query_shape(item) for item in query]
+        return 1
+    return 1
+
+
+def _shape_key(shape, sort):
+    return repr((shape, tuple(field for field, _ in sort or [])))
+
+
+def _plan_details(plan, stages, indexes):
+    """Collect every stage name and index name in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        if "indexName" in plan:
+            indexes.append(plan["indexName"])
+        for value in plan.values():
+            _plan_details(value, stages, indexes)
+    elif isinstance(plan, list):
+        for item in plan:
+            _plan_details(item, stages, indexes)
+
+
+class QueryAdvisor(object):
+    """
+    Records the query shapes run against a collection and explains them on demand.
+
+    Features:
+    - `record(query, sort)` is cheap and is called on every database query.
+    - `analyze()` runs `explain()` once per distinct shape and flags collection scans.
+    """
+
+    def __init__(self, collection, max_shapes=256, logger=logging):
+        self.collection = collection
+        self.max_shapes = max_shapes
+        self.logger = logger
+        # Shape key -> {"shape", "sort", "sample", "count"}
+        self._shapes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, query, sort=None):
+        """Count an observed query under its shape, keeping the first query of each shape as a sample."""
+        shape = query_shape(query or {})
+        key = _shape_key(shape, sort)
+        with self._lock:
+            entry = self._shapes.get(key)
+            if entry is None:
+                if len(self._shapes) >= self.max_shapes:
+                    self._shapes.popitem(last=False)
+                entry = self._shapes[key] = {"shape": shape, "sort": list(sort or []), "sample": query or {}, "count": 0}
+            entry["count"] += 1
+
+    def shapes(self):
+        """Return the observed shapes with their counts, most frequent first."""
+        with self._lock:
+            entries = list(self._shapes.values())
+        return sorted(({"shape": entry["shape"], "sort": entry["sort"], "count": entry["count"]} for entry in entries),
+                      key=lambda entry: entry["count"], reverse=True)
+
+    def analyze(self):
+        """
+        Explain one sample query per observed shape.
+
+        Returns:
+            list: One report per shape with its count, plan stages, indexes used and a "collection_scan" flag.
+        """
+        with self._lock:
+            entries = list(self._shapes.values())
+
+        reports = []
+        for entry in sorted(entries, key=lambda item: item["count"], reverse=True):
+            report = {"shape": entry["shape"], "sort": entry["sort"], "count": entry["count"]}
+            try:
+                cursor = self.collection.find(entry["sample"])
+                if entry["sort"]:
+                    cursor = cursor.sort(entry["sort"])
+                winning_plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+                stages, indexes = [], []
+                _plan_details(winning_plan, stages, indexes)
+                report.update({"stages": stages, "indexes": indexes, "collection_scan": "COLLSCAN" in stages})
+                if report["collection_scan"]:
+                    self.logger.warning("Query shape %s on '%s' uses a collection scan (seen %s times)",
+                                        entry["shape"], self.collection.name, entry["count"])
+            except Exception as e:
+                self.logger.error("Error explaining query shape %s: %s", entry["shape"], str(e))
+                report.update({"stages": [], "indexes": [], "collection_scan": None, "error": str(e)})
+            reports.append(report)
+        return reports
+
+    def collection_scans(self):
+        """Return only the reports for shapes that use a collection scan."""
+        return [report for report in self.analyze() if report["collection_scan"]]
+
+    def reset(self):
+        """Forget every observed shape."""
+        with self._lock:
+            self._shapes.clear()
+
+
+__all__ = ["ensure_indexes", "query_shape", "QueryAdvisor"]
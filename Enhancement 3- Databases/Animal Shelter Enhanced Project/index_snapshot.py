@@ -0,0 +1,114 @@
+# In-Memory Index Snapshots for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# Building the breed and search indexes streams the whole animals collection from MongoDB. This module saves the
+# built indexes to a local file, so a restarted dashboard can load them directly and only catch up on the changes
+# made since the snapshot was taken.
+#
+# Key Features:
+# 1. A snapshot holds the index objects with a version stamp of the collection they were built from: the
+#    database and collection names, the document count, the largest `_id` and a change stream resume token
+#    when the server supports change streams.
+# 2. Snapshots are written to a temporary file and renamed into place, so a crash never leaves a partial file.
+# 3. Unreadable snapshots and snapshots from another format version are ignored, which forces a full rebuild.
+# 4. Snapshots are pickled, and unpickling a tampered file runs arbitrary code. The snapshot path must be in a
+#    directory only the dashboard's account can write to. Before unpickling, the file is opened without following
+#    symbolic links and refused unless it is a regular file owned by the current user, not writable by group or
+#    others, in a directory that is not writable by group or others (sticky directories such as /tmp excepted).
+
+import logging
+import os
+import pickle
+import stat
+import tempfile
+import time
+
+# Bumped whenever the layout of the saved indexes changes
+SNAPSHOT_FORMAT = 2
+
+
+def save_snapshot(path, stamp, indexes):
+    """
+    Write a snapshot of the in-memory indexes.
+
+    Input:
+        path (str): Snapshot file.
+        stamp (dict): Version stamp of the collection the indexes reflect.
+        indexes (dict): Index name -> index object.
+    """
+    payload = {"format": SNAPSHOT_FORMAT, "saved_at": time.time(), "stamp": stamp, "indexes": indexes}
+    directory = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temporary_path = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+    try:
+        with os.fdopen(file_descriptor, "wb") as snapshot_file:
+            pickle.dump(payload, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+    except Exception:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    logging.info("Saved index snapshot to %s", path)
+
+
+def load_snapshot(path):
+    """
+    Read a snapshot written by save_snapshot.
+    - The file is only unpickled if it passes the ownership and permission checks described above.
+
+    Returns:
+        dict: "stamp", "saved_at" and "indexes", or None if there is no usable or trusted snapshot.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        file_descriptor = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+    except OSError as e:
+        logging.warning("Ignoring unreadable index snapshot %s: %s", path, str(e))
+        return None
+    with os.fdopen(file_descriptor, "rb") as snapshot_file:
+        problem = _untrusted_reason(path, os.fstat(snapshot_file.fileno()))
+        if problem:
+            logging.warning("Refusing to load index snapshot %s: %s", path, problem)
+            return None
+        try:
+            payload = pickle.load(snapshot_file)
+        except Exception as e:
+            logging.warning("Ignoring unreadable index snapshot %s: %s", path, str(e))
+            return None
+    if not isinstance(payload, dict) or payload.get("format") != SNAPSHOT_FORMAT:
+        logging.warning("Ignoring index snapshot %s with an unsupported format", path)
+        return None
+    return payload
+
+
+def _untrusted_reason(path, file_status):
+    """
+    Check that a snapshot could only have been written by this user.
+
+    Returns:
+        str: Why the file is not trusted, or None if it may be unpickled.
+    """
+    if not stat.S_ISREG(file_status.st_mode):
+        return "not a regular file"
+    # Ownership and group/other permissions are not reported on platforms without user ids (Windows)
+    if not hasattr(os, "getuid"):
+        return None
+    if file_status.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return "writable by group or others"
+    if file_status.st_uid != os.getuid():
+        return "owned by uid %s, not the current user" % file_status.st_uid
+    directory_mode = os.stat(os.path.dirname(os.path.abspath(path))).st_mode
+    if directory_mode & (stat.S_IWGRP | stat.S_IWOTH) and not directory_mode & stat.S_ISVTX:
+        return "its directory is writable by group or others"
+    return None
+
+
+def discard_snapshot(path):
+    """Delete a snapshot that no longer matches the collection."""
+    if path and os.path.exists(path):
+        os.remove(path)
+        logging.info("Discarded index snapshot %s", path)
+
+
+__all__ = ["save_snapshot", "load_snapshot", "discard_snapshot", "SNAPSHOT_FORMAT"]
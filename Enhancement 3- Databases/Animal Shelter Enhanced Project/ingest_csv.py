@@ -0,0 +1,185 @@
+# Bulk CSV Ingestion for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# This script loads `aac_shelter_outcomes.csv` (or any file with the same columns) into the animals collection.
+# It replaces the manual mongoimport steps from the container setup instructions, and avoids `AnimalShelter.create`,
+# which costs one round trip and one round of index maintenance per document.
+#
+# Key Features:
+# 1. Streams the CSV in chunks, so memory is bounded by the chunks in flight rather than the file size.
+# 2. Coerces numeric columns (rec_num, location_lat, location_long, age_upon_outcome_in_weeks) to numbers, and adds the
+#    GeoJSON `location` point the map queries use.
+# 3. Writes each chunk with an unordered `insert_many` on a configurable pool of worker threads.
+# 4. The command line shelter skips the in-memory indexes, which only the dashboard reads, and discards the dashboard's
+#    index snapshot so its next start rescans the collection. A running dashboard picks up the new documents within its
+#    `index_max_staleness`. Shelters that keep in-memory indexes are rebuilt once at the end instead of per document.
+# 5. Reports rows per second.
+# 6. `--backfill-locations` adds the GeoJSON point to documents loaded by mongoimport instead of loading a CSV.
+#
+# Usage:
+#   python ingest_csv.py aac_shelter_outcomes.csv --chunk-size 1000 --workers 4
+#   python ingest_csv.py --backfill-locations
+
+import argparse
+import csv
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from pymongo.errors import BulkWriteError
+
+from animal_shelter_CRUD_revised import AnimalShelter
+from geo_query import LOCATION_FIELD, geo_point
+from index_snapshot import discard_snapshot
+
+# Column name -> type the value is stored as
+NUMERIC_COLUMNS = {
+    "rec_num": int,
+    "location_lat": float,
+    "location_long": float,
+    "age_upon_outcome_in_weeks": float,
+}
+
+
+def coerce_row(row):
+    """
+    Convert a CSV row into a document.
+    - The unnamed pandas index column is dropped; rec_num already numbers the records.
+    - Numeric columns are converted, and empty numeric values are left out of the document.
+    - Rows with valid coordinates get a GeoJSON point in `location`.
+    """
+    document = {}
+    for column, value in row.items():
+        if not column:
+            continue
+        converter = NUMERIC_COLUMNS.get(column)
+        if converter is None:
+            document[column] = value
+        elif value != "":
+            try:
+                document[column] = converter(value)
+            except ValueError:
+                document[column] = converter(float(value)) if converter is int else value
+    point = geo_point(document)
+    if point is not None:
+        document[LOCATION_FIELD] = point
+    return document
+
+
+def read_chunks(path, chunk_size):
+    """Yield lists of at most chunk_size documents from a CSV file."""
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        chunk = []
+        for row in csv.DictReader(csv_file):
+            chunk.append(coerce_row(row))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _insert_chunk(collection, chunk):
+    """Insert one chunk without stopping at the first failed document. Returns (inserted, failed)."""
+    try:
+        result = collection.insert_many(chunk, ordered=False)
+        return len(result.inserted_ids), 0
+    except BulkWriteError as e:
+        inserted = e.details.get("nInserted", 0)
+        failed = len(e.details.get("writeErrors", []))
+        logging.warning("Bulk insert chunk had %s failed documents", failed)
+        return inserted, failed
+
+
+def ingest_csv(shelter, path, chunk_size=1000, workers=4):
+    """
+    Load a CSV file into the shelter's collection.
+
+    Input:
+        shelter (AnimalShelter): Target collection and in-memory indexes.
+        path (str): CSV file to load.
+        chunk_size (int): Documents per insert_many call.
+        workers (int): Number of concurrent insert threads.
+
+    Returns:
+        dict: rows read, documents inserted, failed documents, elapsed seconds and rows per second.
+    """
+    if chunk_size < 1 or workers < 1:
+        raise ValueError("chunk_size and workers must be at least 1")
+
+    rows = inserted = failed = 0
+    start_time = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for chunk in read_chunks(path, chunk_size):
+            rows += len(chunk)
+            pending.add(pool.submit(_insert_chunk, shelter.collection, chunk))
+
+            # Keep at most two chunks per worker in flight to bound memory
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_inserted, chunk_failed = future.result()
+                    inserted += chunk_inserted
+                    failed += chunk_failed
+
+        for future in pending:
+            chunk_inserted, chunk_failed = future.result()
+            inserted += chunk_inserted
+            failed += chunk_failed
+
+    # Rebuild the in-memory indexes once instead of maintaining them per document
+    if shelter.in_memory_indexes:
+        shelter.rebuild_indexes()
+    else:
+        shelter.clear_cache()
+
+    elapsed = time.perf_counter() - start_time
+    stats = {
+        "rows": rows,
+        "inserted": inserted,
+        "failed": failed,
+        "seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed else 0.0,
+    }
+    logging.info("Ingested %s rows from %s (%s inserted, %s failed) at %.0f rows/s",
+                 rows, path, inserted, failed, stats["rows_per_second"])
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load an AAC outcomes CSV into MongoDB.")
+    parser.add_argument("path", nargs="?", default="aac_shelter_outcomes.csv")
+    parser.add_argument("--username", default="edwardgarcia5_snhu")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--host", default="host.docker.internal")
+    parser.add_argument("--port", type=int, default=27017)
+    parser.add_argument("--db", default="AAC")
+    parser.add_argument("--collection", default="animals")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--index-snapshot", default="animals_index.snapshot",
+                        help="Dashboard index snapshot to discard, since it will not include the new documents")
+    parser.add_argument("--backfill-locations", action="store_true",
+                        help="Add the GeoJSON location to documents that lack it, e.g. after a mongoimport, "
+                             "instead of loading a CSV")
+    args = parser.parse_args()
+
+    # The script only writes, so it neither builds nor saves the in-memory indexes
+    shelter = AnimalShelter(args.username, args.password, args.host, args.port, args.db, args.collection,
+                            in_memory_indexes=False)
+    discard_snapshot(args.index_snapshot)
+    if args.backfill_locations:
+        updated = shelter.backfill_locations()
+        print(f"Added the GeoJSON location to {updated} documents")
+        return
+
+    stats = ingest_csv(shelter, args.path, chunk_size=args.chunk_size, workers=args.workers)
+    print(f"Inserted {stats['inserted']} of {stats['rows']} rows in {stats['seconds']:.2f} seconds "
+          f"({stats['rows_per_second']:.0f} rows/s, {stats['failed']} failed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+# Login Throttling for EJG Animal Shelter Dashboard
+# Author: Edward Garcia
+
+# Overview:
+# Every login attempt used to cost a MongoDB read plus a full bcrypt check, even when the same username or client
+# had just failed dozens of times. `LoginThrottle` is checked first in `UserManagement.authenticate_user`, so throttled
+# attempts are rejected from memory before any database or bcrypt work.
+#
+# Key Features:
+# 1. Token buckets keyed by username and by source (client address). Each attempt takes a token from both buckets,
+#    tokens refill at a steady rate, and a successful login gives the tokens back.
+# 2. Progressive lockout: when a failed attempt empties a bucket, the key is locked out, and each further lockout of
+#    the same key doubles in length up to a maximum. Strikes are forgotten after a quiet period or a successful login.
+# 3. Counters for checked, allowed, throttled, failed and locked-out attempts.
+# 4. Optional persistence: with a MongoDB collection, lockouts and strike counts are written through and other
+#    workers pick them up every few seconds, so throttling survives restarts and is shared across processes.
+#    Token buckets themselves stay in memory.
+
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+
+from metrics import REGISTRY
+
+# Lockouts are logged to user_management.log alongside the login attempts they throttle
+user_management_logger = logging.getLogger("user_management")
+
+
+class _Bucket(object):
+    __slots__ = ("tokens", "updated", "locked_until", "strikes", "last_strike")
+
+    def __init__(self, capacity, now):
+        self.tokens = float(capacity)
+        self.updated = now
+        self.locked_until = 0.0
+        self.strikes = 0
+        self.last_strike = 0.0
+
+
+class LoginThrottle(object):
+    """
+    Token-bucket login limiter with progressive lockout.
+
+    Features:
+    - `check(username, source)` reserves an attempt or returns how long to wait.
+    - `record_success` and `record_failure` report the outcome of an allowed attempt.
+    - `stats()` returns the counters and the number of active lockouts.
+    """
+
+    def __init__(self, user_capacity=5, user_refill_seconds=60, source_capacity=20, source_refill_seconds=6,
+                 base_lockout=30, max_lockout=3600, strike_reset=86400, collection=None, sync_interval=5,
+                 max_keys=100000):
+        """
+        Input:
+            user_capacity, source_capacity (int): Attempts allowed in a burst per username and per source.
+            user_refill_seconds, source_refill_seconds (float): Seconds to regain one attempt.
+            base_lockout, max_lockout (float): First and longest lockout in seconds.
+            strike_reset (float): Quiet seconds after which previous lockouts are forgotten.
+            collection: Optional pymongo collection where lockouts are persisted and shared.
+            sync_interval (float): Seconds between reloads of persisted lockouts.
+            max_keys (int): Tracked keys before idle, fully refilled buckets are pruned.
+        """
+        self._limits = {
+            "user": (user_capacity, 1.0 / user_refill_seconds),
+            "source": (source_capacity, 1.0 / source_refill_seconds),
+        }
+        self.base_lockout = base_lockout
+        self.max_lockout = max_lockout
+        self.strike_reset = strike_reset
+        self.collection = collection
+        self.sync_interval = sync_interval
+        self.max_keys = max_keys
+        # (kind, value) -> _Bucket
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+        self._counters = {"checked": 0, "allowed": 0, "throttled": 0, "failed": 0, "succeeded": 0, "lockouts": 0}
+
+        for name in self._counters:
+            REGISTRY.register_gauge("login_throttle_%s_total" % name, lambda name=name: self._counters[name])
+        REGISTRY.register_gauge("login_throttle_active_lockouts", lambda: self.stats()["active_lockouts"])
+
+        if collection is not None:
+            self._ensure_indexes()
+            self._sync(force=True)
+
+    def check(self, username, source=None):
+        """
+        Reserve one login attempt for a username and source.
+        - Must be called before any database or bcrypt work.
+
+        Returns:
+            tuple: (allowed, retry_after) where retry_after is the number of seconds to wait when not allowed.
+        """
+        self._sync()
+        now = time.time()
+        keys = self._keys(username, source)
+        with self._lock:
+            self._counters["checked"] += 1
+            buckets = [self._bucket(key, now) for key in keys]
+
+            retry_after = 0.0
+            for key, bucket in zip(keys, buckets):
+                if bucket.locked_until > now:
+                    retry_after = max(retry_after, bucket.locked_until - now)
+                elif bucket.tokens < 1:
+                    refill_rate = self._limits[key[0]][1]
+                    retry_after = max(retry_after, (1 - bucket.tokens) / refill_rate)
+            if retry_after > 0:
+                self._counters["throttled"] += 1
+                return False, math.ceil(retry_after)
+
+            for bucket in buckets:
+                bucket.tokens -= 1
+            self._counters["allowed"] += 1
+            return True, 0
+
+    def record_success(self, username, source=None):
+        """Give back the attempt reserved by check and forget the username's strikes."""
+        now = time.time()
+        cleared = []
+        with self._lock:
+            self._counters["succeeded"] += 1
+            for key in self._keys(username, source):
+                bucket = self._bucket(key, now)
+                capacity = self._limits[key[0]][0]
+                if key[0] == "user":
+                    bucket.tokens = float(capacity)
+                    if bucket.strikes:
+                        bucket.strikes = 0
+                        cleared.append(key)
+                else:
+                    bucket.tokens = min(capacity, bucket.tokens + 1)
+        for key in cleared:
+            self._persist(key, 0.0, 0, now)
+
+    def record_failure(self, username, source=None):
+        """
+        Record a failed attempt reserved by check.
+        - A key whose bucket is now empty is locked out, for twice as long as its previous lockout.
+        """
+        now = time.time()
+        locked = []
+        with self._lock:
+            self._counters["failed"] += 1
+            for key in self._keys(username, source):
+                bucket = self._bucket(key, now)
+                if bucket.tokens >= 1 or bucket.locked_until > now:
+                    continue
+                if bucket.strikes and now - bucket.last_strike > self.strike_reset:
+                    bucket.strikes = 0
+                lockout = min(self.max_lockout, self.base_lockout * (2 ** bucket.strikes))
+                bucket.locked_until = now + lockout
+                bucket.strikes += 1
+                bucket.last_strike = now
+                self._counters["lockouts"] += 1
+                locked.append((key, bucket.locked_until, bucket.strikes))
+                user_management_logger.warning("Locked out %s '%s' for %s seconds (strike %s)", key[0], key[1], lockout, bucket.strikes)
+        for key, locked_until, strikes in locked:
+            self._persist(key, locked_until, strikes, now)
+
+    def reset(self, username=None, source=None):
+        """Clear the state of a username and/or source, or of every key when neither is given."""
+        with self._lock:
+            if username is None and source is None:
+                keys = list(self._buckets)
+            else:
+                keys = self._keys(username, source) if username is not None else [("source", source)]
+            for key in keys:
+                self._buckets.pop(key, None)
+        if self.collection is not None:
+            if username is None and source is None:
+                self.collection.delete_many({})
+            else:
+                self.collection.delete_many({"_id": {"$in": [self._document_id(key) for key in keys]}})
+
+    def stats(self):
+        """Return the counters and the number of keys currently locked out."""
+        now = time.time()
+        with self._lock:
+            stats = dict(self._counters)
+            stats["active_lockouts"] = sum(1 for bucket in self._buckets.values() if bucket.locked_until > now)
+            stats["tracked_keys"] = len(self._buckets)
+        return stats
+
+    def _keys(self, username, source):
+        keys = [("user", (username or "").strip().lower())]
+        if source:
+            keys.append(("source", source))
+        return keys
+
+    def _bucket(self, key, now):
+        """Return the bucket of a key with its tokens refilled up to now. Caller holds the lock."""
+        capacity, refill_rate = self._limits[key[0]]
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune(now)
+            bucket = self._buckets[key] = _Bucket(capacity, now)
+        elif bucket.tokens < capacity:
+            bucket.tokens = min(capacity, bucket.tokens + (now - bucket.updated) * refill_rate)
+        bucket.updated = now
+        return bucket
+
+    def _prune(self, now):
+        """Drop buckets that are full again and have no lockout or recent strikes. Caller holds the lock."""
+        for key, bucket in list(self._buckets.items()):
+            capacity, refill_rate = self._limits[key[0]]
+            full = bucket.tokens + (now - bucket.updated) * refill_rate >= capacity
+            if full and bucket.locked_until <= now and (not bucket.strikes or now - bucket.last_strike > self.strike_reset):
+                del self._buckets[key]
+
+    # Persistence
+
+    def _document_id(self, key):
+        return "%s:%s" % key
+
+    def _ensure_indexes(self):
+        try:
+            # Persisted lockouts remove themselves once their strikes would have been forgotten
+            self.collection.create_index("expires_at", expireAfterSeconds=0, name="throttle_expiry")
+        except Exception as e:
+            user_management_logger.error("Error ensuring login throttle index: %s", str(e))
+
+    def _persist(self, key, locked_until, strikes, now):
+        if self.collection is None:
+            return
+        try:
+            expires_at = datetime.fromtimestamp(max(locked_until, now) + self.strike_reset, tz=timezone.utc)
+            self.collection.update_one(
+                {"_id": self._document_id(key)},
+                {"$set": {"locked_until": locked_until, "strikes": strikes, "last_strike": now, "expires_at": expires_at}},
+                upsert=True
+            )
+        except Exception as e:
+            # Throttling keeps working from memory if the database is unavailable
+            user_management_logger.error("Error persisting login throttle state for %s: %s", key, str(e))
+
+    def _sync(self, force=False):
+        """
+        Load the lockouts and strikes persisted by other workers, at most once per sync_interval.
+        - The newest state of each key wins, so a successful login elsewhere also clears strikes here.
+        """
+        if self.collection is None:
+            return
+        now = time.time()
+        if not force and now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+        try:
+            documents = list(self.collection.find({"expires_at": {"$gt": datetime.fromtimestamp(now, tz=timezone.utc)}}))
+        except Exception as e:
+            user_management_logger.error("Error loading login throttle state: %s", str(e))
+            return
+
+        with self._lock:
+            for document in documents:
+                kind, _, value = document["_id"].partition(":")
+                if kind not in self._limits:
+                    continue
+                bucket = self._bucket((kind, value), now)
+                if document.get("last_strike", 0.0) >= bucket.last_strike:
+                    bucket.locked_until = document.get("locked_until", 0.0)
+                    bucket.strikes = document.get("strikes", 0)
+                    bucket.last_strike = document.get("last_strike", 0.0)
+
+
+__all__ = ["LoginThrottle"]
@@ -0,0 +1,234 @@
+# Performance Metrics for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# This module provides built-in instrumentation for `AnimalShelter`, `UserManagement` and the dashboard callbacks.
+# It replaces ad hoc `time.time()` notebook cells with metrics that can be scraped from the running dashboard.
+#
+# Key Features:
+# 1. Per-operation latency histograms with p50/p95/p99 estimates.
+# 2. Counters for documents returned and errors per operation.
+# 3. Gauges read on demand, such as cache hit ratio and in-memory index sizes.
+# 4. `render_prometheus()` produces the Prometheus text format served by the dashboard's `/metrics` route.
+#
+# All instrumented code shares the module-level `REGISTRY`.
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds of the latency buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram(object):
+    """
+    Fixed-bucket latency histogram.
+    - Observations are O(log buckets) and memory does not grow with the number of observations.
+    - Quantiles are estimated by interpolating within the bucket that contains them.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One count per bucket plus the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Estimate the q-quantile (0 < q < 1) in seconds."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.max
+
+    def cumulative_counts(self):
+        """Return (upper bound, cumulative count) pairs, ending with +Inf."""
+        pairs = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += bucket_count
+            pairs.append((bound, cumulative))
+        return pairs
+
+
+class MetricsRegistry(object):
+    """
+    Collects latency histograms, counters and gauges.
+
+    Features:
+    - `observe(operation, seconds, documents)` records one call.
+    - `instrument(operation)` decorates a function so every call is timed.
+    - `register_gauge(name, callback, labels)` adds a value computed when metrics are read.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._documents = {}
+        self._errors = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, operation, seconds, documents=None, error=False):
+        """Record one call of an operation."""
+        with self._lock:
+            histogram = self._histograms.get(operation)
+            if histogram is None:
+                histogram = self._histograms[operation] = LatencyHistogram(self.buckets)
+            histogram.observe(seconds)
+            if documents is not None:
+                self._documents[operation] = self._documents.get(operation, 0) + documents
+            if error:
+                self._errors[operation] = self._errors.get(operation, 0) + 1
+
+    def instrument(self, operation, count_documents=None):
+        """
+        Decorator that times every call of a function under an operation name.
+        - count_documents(result) returns the number of documents in a result, if it is relevant.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start_time = time.perf_counter()
+                try:
+                    result = function(*args, **kwargs)
+                except Exception:
+                    self.observe(operation, time.perf_counter() - start_time, error=True)
+                    raise
+                documents = count_documents(result) if count_documents else None
+                self.observe(operation, time.perf_counter() - start_time, documents)
+                return result
+            return wrapper
+        return decorator
+
+    def register_gauge(self, name, callback, labels=None):
+        """Register (or replace) a gauge whose value is computed by callback() when metrics are read."""
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._gauges[key] = callback
+
+    def snapshot(self):
+        """
+        Return the current metrics as a dictionary.
+
+        Returns:
+            dict: "operations" (count, errors, documents, mean/p50/p95/p99/max seconds per operation) and "gauges".
+        """
+        with self._lock:
+            operations = {}
+            for operation, histogram in self._histograms.items():
+                operations[operation] = {
+                    "count": histogram.count,
+                    "errors": self._errors.get(operation, 0),
+                    "documents": self._documents.get(operation, 0),
+                    "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+                    "p50": histogram.quantile(0.50),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                    "max": histogram.max,
+                }
+            gauges = list(self._gauges.items())
+
+        return {"operations": operations, "gauges": {_gauge_label(key): _read_gauge(callback) for key, callback in gauges}}
+
+    def render_prometheus(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = [
+            "# HELP operation_duration_seconds Latency of instrumented operations.",
+            "# TYPE operation_duration_seconds histogram",
+        ]
+        with self._lock:
+            histograms = [(operation, histogram, self._documents.get(operation), self._errors.get(operation, 0))
+                          for operation, histogram in sorted(self._histograms.items())]
+            buckets = [(operation, histogram.cumulative_counts(), histogram.sum, histogram.count,
+                        [(q, histogram.quantile(q)) for q in (0.5, 0.95, 0.99)])
+                       for operation, histogram, _, _ in histograms]
+            gauges = sorted(self._gauges.items())
+
+        for operation, cumulative, total, count, _ in buckets:
+            for bound, bucket_count in cumulative:
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append('operation_duration_seconds_bucket{operation="%s",le="%s"} %d' % (operation, le, bucket_count))
+            lines.append('operation_duration_seconds_sum{operation="%s"} %.9f' % (operation, total))
+            lines.append('operation_duration_seconds_count{operation="%s"} %d' % (operation, count))
+
+        lines.append("# HELP operation_latency_quantile_seconds Estimated latency quantiles of instrumented operations.")
+        lines.append("# TYPE operation_latency_quantile_seconds gauge")
+        for operation, _, _, _, quantiles in buckets:
+            for q, value in quantiles:
+                lines.append('operation_latency_quantile_seconds{operation="%s",quantile="%s"} %.9f' % (operation, q, value))
+
+        lines.append("# HELP operation_documents_total Documents returned by instrumented operations.")
+        lines.append("# TYPE operation_documents_total counter")
+        for operation, _, documents, _ in histograms:
+            if documents is not None:
+                lines.append('operation_documents_total{operation="%s"} %d' % (operation, documents))
+
+        lines.append("# HELP operation_errors_total Failed calls of instrumented operations.")
+        lines.append("# TYPE operation_errors_total counter")
+        for operation, _, _, errors in histograms:
+            lines.append('operation_errors_total{operation="%s"} %d' % (operation, errors))
+
+        typed = set()
+        for (name, labels), callback in gauges:
+            if name not in typed:
+                lines.append("# TYPE %s gauge" % name)
+                typed.add(name)
+            label_text = ",".join('%s="%s"' % (key, value) for key, value in labels)
+            lines.append("%s%s %s" % (name, "{%s}" % label_text if label_text else "", _read_gauge(callback)))
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Clear every histogram and counter. Gauges stay registered."""
+        with self._lock:
+            self._histograms.clear()
+            self._documents.clear()
+            self._errors.clear()
+
+
+def _gauge_label(key):
+    name, labels = key
+    if not labels:
+        return name
+    return "%s{%s}" % (name, ",".join("%s=%s" % (label, value) for label, value in labels))
+
+
+def _read_gauge(callback):
+    try:
+        return float(callback())
+    except Exception:
+        return float("nan")
+
+
+def count_results(result):
+    """Count the documents in a list result or a read_page result."""
+    if isinstance(result, dict):
+        return len(result.get("documents", []))
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+# Shared registry for the whole process
+REGISTRY = MetricsRegistry()
+
+__all__ = ["LatencyHistogram", "MetricsRegistry", "REGISTRY", "count_results"]
@@ -0,0 +1,74 @@
+# Shared MongoClient Registry for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# `AnimalShelter`, `UserManagement` and the helper scripts used to build their own `MongoClient` from a
+# hand-formatted URI, so the dashboard held at least two connection pools to the same server. This module keeps
+# one client per set of connection parameters for the whole process, so every caller shares the same pool.
+#
+# Key Features:
+# 1. Clients are keyed by host, port, credentials, auth source and pool options.
+# 2. Pool sizes are tunable per call, with process-wide defaults in `DEFAULT_POOL_OPTIONS`.
+# 3. Clients are created with `connect=False`, so no socket is opened until the first operation.
+# 4. Credentials are URL-escaped when the URI is built.
+
+import logging
+import threading
+from urllib.parse import quote_plus
+
+from pymongo import MongoClient
+
+# Default pool options passed to every MongoClient
+DEFAULT_POOL_OPTIONS = {
+    "maxPoolSize": 50,
+    "minPoolSize": 0,
+    "maxIdleTimeMS": 300000,
+}
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def build_uri(username, password, host, port, auth_source="admin"):
+    """Build a MongoDB connection URI with escaped credentials."""
+    return "mongodb://%s:%s@%s:%s/?authSource=%s" % (quote_plus(username), quote_plus(password), host, port, auth_source)
+
+
+def get_client(username, password, host="host.docker.internal", port=27017, auth_source="admin", **pool_options):
+    """
+    Return the shared MongoClient for a set of connection parameters, creating it on first use.
+
+    Input:
+        pool_options: MongoClient pool options (e.g. maxPoolSize=100) overriding DEFAULT_POOL_OPTIONS.
+
+    Returns:
+        MongoClient: The same client for every call with the same parameters.
+    """
+    options = dict(DEFAULT_POOL_OPTIONS, **pool_options)
+    key = (host, int(port), username, password, auth_source, tuple(sorted(options.items())))
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = MongoClient(build_uri(username, password, host, port, auth_source), connect=False, **options)
+            _clients[key] = client
+            logging.info("Created shared MongoClient for %s:%s (maxPoolSize=%s)", host, port, options.get("maxPoolSize"))
+        return client
+
+
+def close_all():
+    """Close every shared client, e.g. at shutdown or between test runs."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+def client_count():
+    """Return the number of shared clients currently open."""
+    with _lock:
+        return len(_clients)
+
+
+__all__ = ["get_client", "build_uri", "close_all", "client_count", "DEFAULT_POOL_OPTIONS"]
@@ -0,0 +1,136 @@
+# N-Gram Substring Search Index for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# This module provides `NGramIndex`, the index behind the dashboard's navbar search. It replaces the pandas
+# `apply` that lowercased `breed` and `name` for every row on every keystroke.
+#
+# Key Features:
+# 1. Each distinct lowercase field value maps to the `_id`s of the documents that have it. Breeds and names
+#    repeat heavily, so the number of distinct values is far smaller than the number of documents.
+# 2. Each trigram maps to the distinct values that contain it. A substring search intersects the posting sets of
+#    the query's trigrams, verifies the surviving values, and returns the union of their `_id`s.
+# 3. Queries shorter than the gram size scan the distinct values instead of the documents.
+# 4. The index is updated per document on create, update and delete.
+
+
+class NGramIndex(object):
+    """
+    Case-insensitive substring search over one or more text fields.
+
+    Features:
+    - `set_document(doc_id, document)` indexes (or re-indexes) a document's fields.
+    - `remove(doc_id)` drops a document.
+    - `search(text)` returns the set of `_id`s with a field containing text, ignoring case.
+    """
+
+    def __init__(self, fields=("breed", "name"), n=3):
+        self.fields = tuple(fields)
+        self.n = n
+        # Lowercase value -> set of document `_id`s
+        self._values = {}
+        # Gram -> set of lowercase values containing it
+        self._grams = {}
+        # Document `_id` -> tuple of the lowercase values it was indexed under
+        self._doc_values = {}
+
+    def set_document(self, doc_id, document):
+        """Index a document's text fields, replacing any previous values for the same `_id`."""
+        values = self._normalize(document)
+        current = self._doc_values.get(doc_id)
+        if current == values:
+            return
+        if current is not None:
+            self.remove(doc_id)
+        if not values:
+            return
+
+        self._doc_values[doc_id] = values
+        for value in values:
+            doc_ids = self._values.get(value)
+            if doc_ids is None:
+                doc_ids = self._values[value] = set()
+                for gram in self._grams_of(value):
+                    self._grams.setdefault(gram, set()).add(value)
+            doc_ids.add(doc_id)
+
+    def remove(self, doc_id):
+        """Remove a document from the index."""
+        values = self._doc_values.pop(doc_id, None)
+        if not values:
+            return
+        for value in values:
+            doc_ids = self._values.get(value)
+            if doc_ids is None:
+                continue
+            doc_ids.discard(doc_id)
+            if not doc_ids:
+                del self._values[value]
+                for gram in self._grams_of(value):
+                    containing = self._grams.get(gram)
+                    if containing is not None:
+                        containing.discard(value)
+                        if not containing:
+                            del self._grams[gram]
+
+    def search(self, text):
+        """
+        Find the documents with a field containing text, ignoring case.
+
+        Returns:
+            set: Matching document `_id`s.
+        """
+        text = (text or "").strip().lower()
+        if not text:
+            return set()
+
+        if len(text) < self.n:
+            candidates = self._values.keys()
+        else:
+            posting_sets = []
+            for gram in self._grams_of(text):
+                containing = self._grams.get(gram)
+                if not containing:
+                    return set()
+                posting_sets.append(containing)
+            # Intersect starting from the rarest gram
+            posting_sets.sort(key=len)
+            candidates = set(posting_sets[0])
+            for containing in posting_sets[1:]:
+                candidates &= containing
+                if not candidates:
+                    return set()
+
+        matches = set()
+        for value in candidates:
+            if text in value:
+                matches |= self._values[value]
+        return matches
+
+    def clear(self):
+        """Remove every document from the index."""
+        self._values.clear()
+        self._grams.clear()
+        self._doc_values.clear()
+
+    def __len__(self):
+        return len(self._doc_values)
+
+    def _normalize(self, document):
+        values = []
+        for field in self.fields:
+            value = document.get(field)
+            if value is None or value == "":
+                continue
+            value = str(value).lower()
+            if value not in values:
+                values.append(value)
+        return tuple(values)
+
+    def _grams_of(self, value):
+        if len(value) < self.n:
+            return set()
+        return {value[index:index + self.n] for index in range(len(value) - self.n + 1)}
+
+
+__all__ = ["NGramIndex"]
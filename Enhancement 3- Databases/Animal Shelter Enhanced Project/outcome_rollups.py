@@ -0,0 +1,286 @@
+# Monthly Outcome Rollups for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# Every record has an outcome `datetime` (and `monthyear`), but answering "outcomes per month by type" meant reading
+# every document. `OutcomeRollups` keeps the number of outcomes per month, outcome type, animal type and breed group,
+# so trend charts are drawn from a few thousand counters instead of the raw documents.
+#
+# Key Features:
+# 1. Each document is counted in one bucket: (month, outcome_type, animal_type, breed group).
+# 2. The bucket of every counted document is remembered, so `set` and `remove` are idempotent and can be applied per
+#    document on writes, like the other in-memory indexes of AnimalShelter.
+# 3. `monthly_counts` returns contiguous monthly series grouped by one dimension and filtered by the others.
+# 4. `rollup_pipeline` computes the same bucket counts with a MongoDB `$group`, for when the rollups are not built.
+# 5. `rollups_from_csv` counts the rows of `aac_shelter_outcomes.csv` without a database, as a standalone report.
+#
+# Usage:
+#   python outcome_rollups.py aac_shelter_outcomes.csv --by animal_type
+
+import argparse
+import csv
+import datetime
+import re
+import sys
+
+# Fields the rollups are computed from
+ROLLUP_FIELDS = ("datetime", "monthyear", "outcome_type", "animal_type", "breed")
+
+# Dimensions a rollup can be grouped and filtered by, in bucket key order after the month
+DIMENSIONS = ("outcome_type", "animal_type", "breed_group")
+
+_MONTH_PATTERN = re.compile(r"^(\d{4})-(\d{2})")
+
+
+def month_of(document):
+    """
+    Return the outcome month of a document as "YYYY-MM".
+    - Uses `datetime`, falling back to `monthyear`. Both are stored as text in the CSV, e.g. "2017-04-11 09:00:00".
+
+    Returns:
+        str: The month, or None if neither field holds a date.
+    """
+    for field in ("datetime", "monthyear"):
+        value = document.get(field)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return "%04d-%02d" % (value.year, value.month)
+        if isinstance(value, str):
+            match = _MONTH_PATTERN.match(value)
+            if match and 1 <= int(match.group(2)) <= 12:
+                return match.group(0)
+    return None
+
+
+def breed_group(breed):
+    """
+    Group a breed by its primary breed: "Labrador Retriever Mix" and "Labrador Retriever/Pit Bull" are both
+    "Labrador Retriever". Missing breeds are grouped under None.
+    """
+    if not isinstance(breed, str) or not breed.strip():
+        return None
+    primary = breed.split("/", 1)[0].strip()
+    if primary.endswith(" Mix"):
+        primary = primary[:-len(" Mix")].rstrip()
+    return sys.intern(primary)
+
+
+def _text(value):
+    return sys.intern(value) if isinstance(value, str) and value else None
+
+
+def _next_month(month):
+    year, number = int(month[:4]), int(month[5:7])
+    return "%04d-%02d" % (year + number // 12, number % 12 + 1)
+
+
+def _matches(value, allowed):
+    if allowed is None:
+        return True
+    if isinstance(allowed, (list, tuple, set, frozenset)):
+        return value in allowed
+    return value == allowed
+
+
+def _bucket_key(document):
+    month = month_of(document)
+    if month is None:
+        return None
+    return (month, _text(document.get("outcome_type")), _text(document.get("animal_type")),
+            breed_group(document.get("breed")))
+
+
+def _month_text(field):
+    # Dates and date strings both start with YYYY-MM once converted to text; month_of validates the prefix
+    text = {"$convert": {"input": "$" + field, "to": "string", "onError": "", "onNull": ""}}
+    return {"$substrCP": [text, 0, 7]}
+
+
+def rollup_pipeline():
+    """
+    Return an aggregation pipeline that counts documents per outcome month text, outcome type, animal type and breed.
+    - Breeds are grouped by their full name, since `breed_group` is not expressible in the pipeline; `bucket_counts`
+      folds the results into rollup buckets.
+    """
+    return [
+        {"$group": {
+            "_id": {"datetime": _month_text("datetime"), "monthyear": _month_text("monthyear"),
+                    "outcome_type": "$outcome_type", "animal_type": "$animal_type", "breed": "$breed"},
+            "count": {"$sum": 1},
+        }},
+    ]
+
+
+def bucket_counts(groups):
+    """
+    Fold the results of `rollup_pipeline` into counts per rollup bucket.
+
+    Returns:
+        dict: Bucket key (month, outcome_type, animal_type, breed group) -> number of documents.
+    """
+    counts = {}
+    for group in groups:
+        key = _bucket_key(group["_id"])
+        if key is not None:
+            counts[key] = counts.get(key, 0) + group["count"]
+    return counts
+
+
+def series_from_counts(counts, by="outcome_type", start=None, end=None, outcome_type=None, animal_type=None,
+                       breed_group=None):
+    """
+    Return monthly outcome counts for a trend chart from counts per rollup bucket.
+
+    Input:
+        counts (dict): Bucket key (month, outcome_type, animal_type, breed group) -> number of documents.
+        by (str): Dimension to split the series by ("outcome_type", "animal_type" or "breed_group"), or None for
+            a single "All" series.
+        start, end (str): First and last month to include, as "YYYY-MM". Default to the months with outcomes.
+        outcome_type, animal_type, breed_group: A value or list of values to count, or None for any.
+
+    Returns:
+        dict: {"months": [every month from start to end], "series": {group: [count per month]}}.
+    """
+    if by is not None and by not in DIMENSIONS:
+        raise ValueError("Unsupported rollup dimension: %s" % by)
+    for month in (start, end):
+        if month is not None and not (_MONTH_PATTERN.match(month) and len(month) == 7):
+            raise ValueError("Months must be given as YYYY-MM: %s" % month)
+
+    if counts:
+        start = start or min(key[0] for key in counts)
+        end = end or max(key[0] for key in counts)
+    if start is None or end is None or start > end:
+        return {"months": [], "series": {}}
+
+    months = [start]
+    while months[-1] < end:
+        months.append(_next_month(months[-1]))
+    position = {month: index for index, month in enumerate(months)}
+
+    filters = (outcome_type, animal_type, breed_group)
+    group_index = DIMENSIONS.index(by) + 1 if by is not None else None
+    series = {}
+    for key, count in counts.items():
+        index = position.get(key[0])
+        if index is None or not all(_matches(value, allowed) for value, allowed in zip(key[1:], filters)):
+            continue
+        group = key[group_index] if group_index is not None else "All"
+        group_counts = series.get(group)
+        if group_counts is None:
+            group_counts = series[group] = [0] * len(months)
+        group_counts[index] += count
+    return {"months": months, "series": series}
+
+
+class OutcomeRollups(object):
+    """
+    Monthly outcome counts per outcome type, animal type and breed group.
+
+    Features:
+    - `set(doc_id, document)` and `remove(doc_id)` keep the counts current as documents are written.
+    - `monthly_counts(by, ...)` returns the series a trend chart needs.
+    - `months()` returns the first and last month with outcomes.
+    """
+
+    def __init__(self):
+        # Bucket key (month, outcome_type, animal_type, breed group) -> number of documents
+        self._counts = {}
+        # Document `_id` -> bucket key it is counted in
+        self._bucket_of = {}
+        # Bucket key -> itself, so documents in the same bucket share one key tuple
+        self._keys = {}
+
+    def set(self, doc_id, document):
+        """
+        Count a document in the bucket of its current fields.
+        - A document without an outcome month is not counted.
+        - Setting a document that is already counted in the same bucket is a no-op.
+        """
+        key = _bucket_key(document)
+        current = self._bucket_of.get(doc_id)
+        if current == key:
+            return
+        if current is not None:
+            self._decrement(current)
+        if key is None:
+            del self._bucket_of[doc_id]
+            return
+        key = self._keys.setdefault(key, key)
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self._bucket_of[doc_id] = key
+
+    def remove(self, doc_id):
+        """Stop counting a document. Returns True if it was counted."""
+        key = self._bucket_of.pop(doc_id, None)
+        if key is None:
+            return False
+        self._decrement(key)
+        return True
+
+    def months(self):
+        """Return (first month, last month) with at least one outcome, or (None, None)."""
+        if not self._counts:
+            return None, None
+        months = [key[0] for key in self._counts]
+        return min(months), max(months)
+
+    def monthly_counts(self, by="outcome_type", start=None, end=None, outcome_type=None, animal_type=None,
+                       breed_group=None):
+        """Return monthly outcome counts for a trend chart; see `series_from_counts` for the arguments."""
+        return series_from_counts(self._counts, by, start, end, outcome_type, animal_type, breed_group)
+
+    def clear(self):
+        """Remove every count."""
+        self._counts.clear()
+        self._bucket_of.clear()
+        self._keys.clear()
+
+    def __len__(self):
+        """Number of counted documents."""
+        return len(self._bucket_of)
+
+    def _decrement(self, key):
+        remaining = self._counts[key] - 1
+        if remaining:
+            self._counts[key] = remaining
+        else:
+            del self._counts[key]
+            del self._keys[key]
+
+
+def rollups_from_csv(path):
+    """
+    Count the rows of an outcomes CSV file into rollups, for the command line report.
+    - Rows are keyed by rec_num (or row number), not by MongoDB `_id`, so the result is a standalone report and is
+      not meant to be merged with the rollups AnimalShelter maintains.
+    - Only the rollup columns are kept, so memory is bounded by the number of rows, not the file size.
+    """
+    rollups = OutcomeRollups()
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        for row_number, row in enumerate(csv.DictReader(csv_file)):
+            rollups.set(row.get("rec_num") or row_number, {field: row.get(field) for field in ROLLUP_FIELDS})
+    return rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print monthly outcome counts from an AAC outcomes CSV.")
+    parser.add_argument("path", nargs="?", default="aac_shelter_outcomes.csv")
+    parser.add_argument("--by", default="outcome_type", choices=DIMENSIONS)
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    args = parser.parse_args()
+
+    trends = rollups_from_csv(args.path).monthly_counts(args.by, args.start, args.end)
+    groups = sorted(trends["series"], key=lambda group: (group is None, str(group)))
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["month"] + [group if group is not None else "(none)" for group in groups])
+    for index, month in enumerate(trends["months"]):
+        writer.writerow([month] + [trends["series"][group][index] for group in groups])
+
+
+__all__ = ["ROLLUP_FIELDS", "DIMENSIONS", "OutcomeRollups", "month_of", "breed_group", "rollup_pipeline",
+           "bucket_counts", "series_from_counts", "rollups_from_csv"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# Bounded Password Hashing Pool for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# bcrypt is deliberately slow: every `checkpw` and `hashpw` burns tens to hundreds of milliseconds of CPU. Run inline
+# on a Dash request thread, a burst of logins stalls every other callback. `PasswordHasher` runs these calls on a
+# dedicated, size-limited process pool instead, so password work is isolated from dashboard rendering and scales
+# across cores.
+#
+# Key Features:
+# 1. A process pool with a fixed number of workers (one per core by default), created on first use. A pool broken by a
+#    crashed worker (e.g. an OOM kill) is replaced, so logins keep working without restarting the dashboard.
+# 2. A queue-depth cap: when too many checks are already running or waiting, new ones fail fast with
+#    `PasswordHasherBusy` instead of piling up behind the pool.
+# 3. Per-call timeouts, so a stuck worker cannot hang a login forever. A call that times out keeps its queue slot until
+#    its bcrypt job actually finishes, so abandoned jobs still count against the cap.
+# 4. Latency histograms and a queue-depth gauge in the shared metrics registry.
+# 5. `hash_passwords` hashes a batch in chunks across every worker, keeping at most one chunk per worker in flight
+#    so interactive logins are never queued behind the whole batch.
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+from metrics import REGISTRY
+
+# Log with the other user management events in user_management.log. The logger is looked up by name, since
+# user_management.py imports this module and configures its handler.
+user_management_logger = logging.getLogger("user_management")
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when the password hashing queue is full."""
+
+
+def _hash_password(password, rounds):
+    # Runs in a worker process
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _hash_chunk(passwords, rounds):
+    # Runs in a worker process
+    return [bcrypt.hashpw(password, bcrypt.gensalt(rounds)) for password in passwords]
+
+
+def _check_password(password, hashed_password):
+    # Runs in a worker process
+    return bcrypt.checkpw(password, hashed_password)
+
+
+class _Slot(object):
+    """
+    One queue slot, shared by a call and the jobs it submitted.
+    - The slot is freed only once the call has returned and every tracked job is done, whichever comes last.
+    """
+
+    def __init__(self, free):
+        self._free = free
+        self._holders = 1
+        self._lock = threading.Lock()
+
+    def track(self, future):
+        """Hold the slot until future is done. Returns future."""
+        with self._lock:
+            self._holders += 1
+        future.add_done_callback(self.release)
+        return future
+
+    def release(self, _future=None):
+        with self._lock:
+            self._holders -= 1
+            if self._holders:
+                return
+        self._free()
+
+
+class PasswordHasher(object):
+    """
+    Hashes and verifies bcrypt passwords on a bounded process pool.
+
+    Features:
+    - `hash_password(password)` returns the bcrypt hash as a string.
+    - `check_password(password, hashed_password)` returns True if the password matches.
+    - Both raise PasswordHasherBusy when max_queue_depth calls are already pending.
+    """
+
+    def __init__(self, max_workers=None, max_queue_depth=None, rounds=12, timeout=10.0):
+        """
+        Input:
+            max_workers (int): Worker processes. Defaults to the number of CPUs.
+            max_queue_depth (int): Calls allowed to run or wait at once. Defaults to four per worker.
+            rounds (int): bcrypt cost factor for new hashes.
+            timeout (float): Seconds to wait for a single call.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue_depth = max_queue_depth or self.max_workers * 4
+        self.rounds = rounds
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_queue_depth)
+        self._depth = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+        REGISTRY.register_gauge("password_hasher_queue_depth", lambda: self._depth)
+        REGISTRY.register_gauge("password_hasher_rejected_total", lambda: self._rejected)
+
+    def hash_password(self, password):
+        """Hash a plaintext password with a new salt. Returns the hash as a string."""
+        with self._slot("password_hasher.hash") as slot:
+            hashed_password = self._run(slot, _hash_password, password.encode('utf-8'), self.rounds)
+        return hashed_password.decode('utf-8')
+
+    def check_password(self, password, hashed_password):
+        """Check a plaintext password against a stored bcrypt hash."""
+        with self._slot("password_hasher.check") as slot:
+            return self._run(slot, _check_password, password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+    def hash_passwords(self, passwords, chunk_size=8):
+        """
+        Hash many plaintext passwords in parallel.
+        - The batch takes a single queue slot and keeps at most one chunk per worker in flight.
+
+        Returns:
+            list: Hashes as strings, in the same order as passwords.
+        """
+        encoded = [password.encode('utf-8') for password in passwords]
+        chunks = [encoded[start:start + chunk_size] for start in range(0, len(encoded), chunk_size)]
+        with self._slot("password_hasher.hash_batch") as slot:
+            return self._hash_chunks(slot, chunks)
+
+    def _hash_chunks(self, slot, chunks):
+        pool = self._pool()
+        try:
+            return self._hash_chunks_on(pool, slot, chunks)
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise
+
+    def _hash_chunks_on(self, pool, slot, chunks):
+        results = [None] * len(chunks)
+        pending = {}
+        next_chunk = 0
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < self.max_workers:
+                pending[slot.track(pool.submit(_hash_chunk, chunks[next_chunk], self.rounds))] = next_chunk
+                next_chunk += 1
+            done, _ = wait(pending, timeout=self.timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Chunks still running keep the slot until they finish; cancelled ones release it right away
+                for future in pending:
+                    future.cancel()
+                raise TimeoutError("Password hashing chunk did not finish in %s seconds" % self.timeout)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+        return [hashed_password.decode('utf-8') for chunk in results for hashed_password in chunk]
+
+    def queue_depth(self):
+        """Return the number of calls running or waiting in the pool."""
+        return self._depth
+
+    def shutdown(self):
+        """Stop the worker processes. A later call starts a new pool."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                user_management_logger.info("Started password hashing pool with %s workers", self.max_workers)
+            return self._executor
+
+    def _discard_pool(self, executor):
+        """Drop a pool whose worker died, so the next call starts a new one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        user_management_logger.error("Password hashing pool broke (a worker process died); starting a new pool")
+        executor.shutdown(wait=False)
+
+    def _run(self, slot, function, *args):
+        # A worker crash breaks the whole pool, including calls that were only queued; retry once on a new pool
+        for attempt in range(2):
+            executor = self._pool()
+            try:
+                return slot.track(executor.submit(function, *args)).result(timeout=self.timeout)
+            except BrokenProcessPool:
+                self._discard_pool(executor)
+                if attempt:
+                    raise
+
+    def _free_slot(self):
+        with self._lock:
+            self._depth -= 1
+        self._slots.release()
+
+    @contextmanager
+    def _slot(self, operation):
+        """
+        Take one queue slot for a call, timing the call under operation.
+        - Yields the slot, so jobs submitted to the pool can hold it past a timeout until they finish.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            user_management_logger.warning("Password hashing queue is full (%s pending)", self.max_queue_depth)
+            raise PasswordHasherBusy("Too many password checks in progress, please try again.")
+
+        with self._lock:
+            self._depth += 1
+        slot = _Slot(self._free_slot)
+        start_time = time.perf_counter()
+        error = False
+        try:
+            yield slot
+        except Exception:
+            error = True
+            raise
+        finally:
+            REGISTRY.observe(operation, time.perf_counter() - start_time, error=error)
+            slot.release()
+
+
+_default_hasher = None
+_default_lock = threading.Lock()
+
+
+def get_default_hasher():
+    """Return the process-wide PasswordHasher shared by every UserManagement instance."""
+    global _default_hasher
+    with _default_lock:
+        if _default_hasher is None:
+            _default_hasher = PasswordHasher()
+        return _default_hasher
+
+
+__all__ = ["PasswordHasher", "PasswordHasherBusy", "get_default_hasher"]
@@ -0,0 +1,337 @@
+# Dependency-Aware Query Cache for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# This module provides `QueryCache`, the result cache used by `AnimalShelter.read`. It replaces the
+# functools.lru_cache that was cleared in full after every create, update and delete.
+#
+# Key Features:
+# 1. Dependency tracking:
+#    - Each cached query records the field values it depends on, e.g. {"breed": {"Newfoundland"}}.
+#    - A write only evicts the entries whose dependencies match the documents it touched.
+#    - Queries whose filters cannot be reduced to equality or `$in` constraints are treated as depending on everything.
+# 2. Time-to-live (TTL) expiry so that long-lived entries are refreshed from the database.
+# 3. A memory budget in bytes (estimated from the BSON size of the results) with LRU eviction.
+# 4. Per-entry and overall hit/miss statistics.
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import bson
+from bson.regex import Regex
+
+
+def make_hashable(value):
+    """
+    Convert a query (dicts, lists and scalars) into a hashable, order-independent key.
+    """
+    if isinstance(value, dict):
+        return tuple((key, make_hashable(item)) for key, item in sorted(value.items()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(make_hashable(item) for item in value)
+    else:
+        return value
+
+
+def extract_dependencies(query):
+    """
+    Reduce a MongoDB filter to the field values it depends on.
+
+    Returns:
+        dict or None: Mapping of field name to the set of values the query can match, or None when the
+        query cannot be reduced (it then depends on every document in the collection).
+    """
+    if not isinstance(query, dict):
+        return None
+
+    dependencies = {}
+    for field, condition in query.items():
+        if field == "$and":
+            # Every branch must hold, so each branch can only narrow the dependencies.
+            for branch in condition:
+                branch_dependencies = extract_dependencies(branch)
+                if branch_dependencies:
+                    for key, values in branch_dependencies.items():
+                        dependencies[key] = dependencies[key] & values if key in dependencies else values
+            continue
+        if field.startswith("$") or "." in field:
+            # $or, $expr, $text and nested paths are not reduced.
+            continue
+
+        values = _condition_values(condition)
+        if values is None:
+            continue
+        dependencies[field] = dependencies[field] & values if field in dependencies else values
+
+    return dependencies or None
+
+
+def _condition_values(condition):
+    """Return the set of values an equality or `$in` condition can match, or None."""
+    if isinstance(condition, dict):
+        if "$eq" in condition and len(condition) == 1:
+            return _condition_values(condition["$eq"])
+        if "$in" in condition and len(condition) == 1:
+            if not all(_is_literal(item) for item in condition["$in"]):
+                return None
+            try:
+                return frozenset(condition["$in"])
+            except TypeError:
+                return None
+        return None
+    if not _is_literal(condition):
+        return None
+    try:
+        return frozenset([condition])
+    except TypeError:
+        return None
+
+
+def _is_literal(value):
+    """Regular expressions and nested structures match more than their own value."""
+    return not isinstance(value, (dict, list, tuple, re.Pattern, Regex))
+
+
+def _document_matches(document, dependencies):
+    """Check whether a document could satisfy the recorded dependencies of a cached query."""
+    for field, values in dependencies.items():
+        value = document.get(field)
+        if isinstance(value, list):
+            if not any(_safe_in(item, values) for item in value):
+                return False
+        elif not _safe_in(value, values):
+            return False
+    return True
+
+
+def _safe_in(value, values):
+    try:
+        return value in values
+    except TypeError:
+        return False
+
+
+def estimate_size(results):
+    """Estimate the memory cost of a cached result list from the BSON size of its documents."""
+    size = 0
+    for document in results:
+        try:
+            size += len(bson.encode(document))
+        except Exception:
+            size += len(repr(document))
+    return size
+
+
+class _CacheEntry(object):
+    """A single cached query result and its bookkeeping."""
+
+    __slots__ = ("results", "dependencies", "size", "expires_at", "hits")
+
+    def __init__(self, results, dependencies, size, expires_at):
+        self.results = results
+        self.dependencies = dependencies
+        self.size = size
+        self.expires_at = expires_at
+        self.hits = 0
+
+
+class QueryCache(object):
+    """
+    Result cache for MongoDB queries with dependency-based invalidation.
+
+    Features:
+    - Entries expire after `ttl` seconds (None disables expiry).
+    - The total estimated size of all entries is kept under `max_bytes` by evicting the least recently used.
+    - `invalidate(documents)` evicts only entries that could match one of the written documents.
+    - `stats()` reports overall and per-entry hits and misses.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300, max_tracked_queries=1024):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_tracked_queries = max_tracked_queries
+
+        self._entries = OrderedDict()
+        # (field, value) -> keys of cached queries that depend on that value
+        self._dependents = {}
+        # Keys of cached queries that depend on every document
+        self._unconstrained = set()
+        self._current_bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        # Incremented by every invalidation so reads that raced a write are not cached
+        self._generation = 0
+        # Per-query hit/miss counters, retained after eviction so re-misses are visible
+        self._query_stats = OrderedDict()
+
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        """
+        Return the cached results for a key, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self._misses += 1
+                self._record(key, "misses")
+                return None
+
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self._hits += 1
+            self._record(key, "hits")
+            return entry.results
+
+    @property
+    def generation(self):
+        """Invalidation counter; capture it before querying the database and pass it to `put`."""
+        return self._generation
+
+    def put(self, key, query, results, generation=None):
+        """
+        Cache the results of a query under its hashable key.
+        - Results read before a concurrent write (an older `generation`) are not stored.
+        """
+        size = estimate_size(results)
+        if size > self.max_bytes:
+            return
+
+        dependencies = extract_dependencies(query)
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = _CacheEntry(results, dependencies, size, expires_at)
+            self._current_bytes += size
+            if dependencies is None:
+                self._unconstrained.add(key)
+            else:
+                for field, values in dependencies.items():
+                    for value in values:
+                        self._dependents.setdefault((field, value), set()).add(key)
+
+            while self._current_bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._evictions += 1
+
+    def invalidate(self, documents):
+        """
+        Evict the entries that could be affected by writes to the given documents.
+
+        Input:
+            documents (iterable): Pre-images and post-images of every document touched by a write.
+
+        Returns:
+            int: Number of evicted entries.
+        """
+        with self._lock:
+            self._generation += 1
+            if not self._entries:
+                return 0
+
+            affected = set(self._unconstrained)
+            fields = {field for field, _ in self._dependents}
+            for document in documents:
+                for field in fields:
+                    value = document.get(field)
+                    candidates = value if isinstance(value, list) else [value]
+                    for candidate in candidates:
+                        try:
+                            keys = self._dependents.get((field, candidate))
+                        except TypeError:
+                            keys = None
+                        if keys:
+                            affected.update(
+                                key for key in keys
+                                if _document_matches(document, self._entries[key].dependencies)
+                            )
+
+            for key in affected:
+                self._remove(key)
+            self._invalidations += len(affected)
+            return len(affected)
+
+    def clear(self):
+        """Remove every cached entry. Statistics are kept."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._dependents.clear()
+            self._unconstrained.clear()
+            self._current_bytes = 0
+
+    def dependency_fields(self):
+        """Return the fields that cached queries currently depend on."""
+        with self._lock:
+            return {field for field, _ in self._dependents}
+
+    def stats(self):
+        """
+        Report cache statistics.
+
+        Returns:
+            dict: Overall hits, misses, hit ratio, size and per-query counters.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "entries": len(self._entries),
+                "current_bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+                "queries": [
+                    {"query": key, "hits": counters["hits"], "misses": counters["misses"], "cached": key in self._entries}
+                    for key, counters in self._query_stats.items()
+                ],
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._current_bytes -= entry.size
+        if entry.dependencies is None:
+            self._unconstrained.discard(key)
+        else:
+            for field, values in entry.dependencies.items():
+                for value in values:
+                    keys = self._dependents.get((field, value))
+                    if keys is not None:
+                        keys.discard(key)
+                        if not keys:
+                            del self._dependents[(field, value)]
+
+    def _record(self, key, outcome):
+        counters = self._query_stats.get(key)
+        if counters is None:
+            counters = self._query_stats[key] = {"hits": 0, "misses": 0}
+            while len(self._query_stats) > self.max_tracked_queries:
+                self._query_stats.popitem(last=False)
+        else:
+            self._query_stats.move_to_end(key)
+        counters[outcome] += 1
+
+
+__all__ = ["QueryCache", "make_hashable", "extract_dependencies", "estimate_size"]
@@ -0,0 +1,189 @@
+# Sorted Range Index for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# This module provides `SortedRangeIndex`, the structure behind `AnimalShelter.age_index`. It keeps the documents
+# sorted by a numeric field, so range filters such as "between 26 and 156 weeks old" are answered with binary search
+# instead of scanning the collection.
+#
+# Key Features:
+# 1. Values are kept in a sorted `array` of doubles, searched with `bisect` in O(log n).
+# 2. A range returns its k matching `_id`s in O(log n + k), and counts a range in O(log n).
+# 3. Each document gets a sequence number that orders documents with equal values, so an update or delete finds its
+#    entry by binary search too, even when thousands of animals share the same age.
+# 4. `bulk_load` fills the index with one sort for full builds, since inserting n documents one at a time shifts the
+#    arrays n times (O(n^2)). `set` is for incremental writes.
+# 5. Only real numbers are indexed, matching MongoDB, whose numeric range filters never match text or missing values.
+
+import math
+import numbers
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+from bson.objectid import ObjectId
+
+
+def _is_indexable(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool) and not math.isnan(value)
+
+
+class SortedRangeIndex(object):
+    """
+    Keeps the documents sorted by one numeric field.
+
+    Features:
+    - `set(doc_id, value)` and `remove(doc_id)` keep the index current as documents are written.
+    - `ids(low, high)` returns the `_id`s with a value in a range, in ascending value order.
+    - `count(low, high)` counts a range with two binary searches.
+    - `bulk_load(pairs)` replaces the contents in O(n log n).
+    """
+
+    def __init__(self, field):
+        self.field = field
+        # Parallel arrays sorted by (value, sequence number)
+        self._values = array("d")
+        self._sequences = array("Q")
+        self._doc_ids = []
+        # Document `_id` -> (value, sequence number) of its entry
+        self._key_of = {}
+        self._next_sequence = 0
+
+    def set(self, doc_id, value):
+        """
+        Record the current value of a document.
+        - A value that is not a real number removes the document from the index.
+        - Setting the value a document already has is a no-op.
+        """
+        if not _is_indexable(value):
+            self.remove(doc_id)
+            return
+
+        value = float(value)
+        key = self._key_of.get(doc_id)
+        if key is not None:
+            if key[0] == value:
+                return
+            self._delete_entry(key)
+
+        sequence = self._next_sequence
+        self._next_sequence += 1
+        # New sequence numbers are the largest, so the entry goes after every equal value
+        position = bisect_right(self._values, value)
+        self._values.insert(position, value)
+        self._sequences.insert(position, sequence)
+        self._doc_ids.insert(position, doc_id)
+        self._key_of[doc_id] = (value, sequence)
+
+    def bulk_load(self, pairs):
+        """
+        Replace the contents of the index with (doc_id, value) pairs, sorting them once.
+        - A later pair for the same `_id` replaces an earlier one, and values that are not real numbers are skipped.
+        - Sequence numbers follow the order of the pairs, so equal values keep that order.
+        """
+        values_of = {}
+        for doc_id, value in pairs:
+            if _is_indexable(value):
+                values_of[doc_id] = float(value)
+            else:
+                values_of.pop(doc_id, None)
+
+        doc_ids = list(values_of)
+        values = list(values_of.values())
+        # The sort is stable, so documents with equal values stay in sequence order
+        order = sorted(range(len(values)), key=values.__getitem__)
+        self._values = array("d", (values[position] for position in order))
+        self._sequences = array("Q", order)
+        self._doc_ids = [doc_ids[position] for position in order]
+        self._key_of = {doc_id: (value, sequence) for sequence, (doc_id, value) in enumerate(zip(doc_ids, values))}
+        self._next_sequence = len(doc_ids)
+
+    def remove(self, doc_id):
+        """
+        Remove a document from the index.
+
+        Returns:
+            The value the document was indexed under, or None if it was not indexed.
+        """
+        key = self._key_of.pop(doc_id, None)
+        if key is None:
+            return None
+        self._delete_entry(key)
+        return key[0]
+
+    def value_of(self, doc_id):
+        """Return the indexed value of a document, or None."""
+        key = self._key_of.get(doc_id)
+        return key[0] if key is not None else None
+
+    def ids(self, low=None, high=None, include_low=True, include_high=True):
+        """
+        Return the `_id`s whose value lies in a range, in ascending value order.
+
+        Input:
+            low, high (float): Bounds of the range, or None for no bound.
+            include_low, include_high (bool): Whether each bound is inclusive.
+
+        Returns:
+            list: The matching `_id`s (O(log n + k)).
+        """
+        start, end = self._bounds(low, high, include_low, include_high)
+        return self._doc_ids[start:end]
+
+    def count(self, low=None, high=None, include_low=True, include_high=True):
+        """Return the number of documents whose value lies in a range in O(log n)."""
+        start, end = self._bounds(low, high, include_low, include_high)
+        return end - start
+
+    def clear(self):
+        """Remove every document from the index."""
+        self._values = array("d")
+        self._sequences = array("Q")
+        self._doc_ids.clear()
+        self._key_of.clear()
+        self._next_sequence = 0
+
+    def memory_footprint(self):
+        """
+        Report the deep memory footprint of the index in bytes.
+        - Includes the arrays, the `_id` list and key dictionary, and each document `_id`.
+        """
+        size = sys.getsizeof(self)
+        size += sys.getsizeof(self._values) + sys.getsizeof(self._sequences)
+        size += sys.getsizeof(self._doc_ids) + sys.getsizeof(self._key_of)
+        for doc_id, key in self._key_of.items():
+            size += sys.getsizeof(key) + sys.getsizeof(key[0]) + sys.getsizeof(key[1])
+            size += sys.getsizeof(doc_id)
+            if isinstance(doc_id, ObjectId):
+                size += sys.getsizeof(doc_id.binary)
+        return size
+
+    def __contains__(self, doc_id):
+        return doc_id in self._key_of
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    def _bounds(self, low, high, include_low, include_high):
+        if low is None:
+            start = 0
+        else:
+            start = (bisect_left if include_low else bisect_right)(self._values, low)
+        if high is None:
+            end = len(self._values)
+        else:
+            end = (bisect_right if include_high else bisect_left)(self._values, high)
+        return start, max(start, end)
+
+    def _delete_entry(self, key):
+        value, sequence = key
+        # Entries with equal values are ordered by sequence number, so the entry is found by a second bisect
+        start = bisect_left(self._values, value)
+        end = bisect_right(self._values, value, start)
+        position = bisect_left(self._sequences, sequence, start, end)
+        del self._values[position]
+        del self._sequences[position]
+        del self._doc_ids[position]
+
+
+__all__ = ["SortedRangeIndex"]
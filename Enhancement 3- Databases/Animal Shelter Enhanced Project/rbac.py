@@ -9,6 +9,7 @@
 # Key Features Tested:
 # 1. Validation of user roles to determine access permissions.
 # 2. Integration of the `check_permissions` method with the user management system.
+# 3. Hierarchical roles (Guest < Regular User < Admin), so a higher role is granted access to lower-role features.
 
 from user_management import UserManagement
 
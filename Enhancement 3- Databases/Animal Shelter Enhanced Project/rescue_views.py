@@ -0,0 +1,174 @@
+# Materialized Rescue Views for EJG Animal Shelter
+# Author: Edward Garcia
+
+# Overview:
+# The dashboard's Water, Mountain/Wilderness and Disaster rescue presets used to be hard-coded breed lists that were
+# turned into a `$in` query on every click. This module defines the presets as named views and keeps the `_id`s of
+# each view's members in memory, so switching presets is a set lookup rather than a new query.
+#
+# Key Features:
+# 1. `RescueView` describes a preset by breeds, and optionally by sexes and an age range in weeks.
+# 2. `RescueViews` holds one member set per view and is updated per document on create, update and delete, like the
+#    other in-memory indexes of AnimalShelter.
+# 3. Each view also produces the equivalent MongoDB filter, used to populate a new view and while the in-memory
+#    indexes are still being built.
+
+import numbers
+
+# Fields the views are evaluated on
+VIEW_FIELDS = ("breed", "sex_upon_outcome", "age_upon_outcome_in_weeks")
+
+
+def _is_one_of(value, allowed):
+    # Unhashable values such as arrays never match; views compare single values
+    try:
+        return value in allowed
+    except TypeError:
+        return False
+
+
+class RescueView(object):
+    """
+    A named rescue preset.
+
+    Features:
+    - `matches(document)` tells whether a document belongs to the view.
+    - `query()` returns the MongoDB filter selecting the same documents.
+    """
+
+    __slots__ = ("name", "breeds", "sexes", "min_age", "max_age")
+
+    def __init__(self, name, breeds, sexes=None, min_age=None, max_age=None):
+        """
+        Input:
+            name (str): Name shown in the dashboard, e.g. "Water Rescue".
+            breeds (iterable): Breeds that qualify.
+            sexes (iterable): Values of sex_upon_outcome that qualify, or None for any.
+            min_age, max_age (float): Inclusive bounds on age_upon_outcome_in_weeks, or None for no bound.
+        """
+        if not breeds:
+            raise ValueError("A rescue view needs at least one breed")
+        if min_age is not None and max_age is not None and min_age > max_age:
+            raise ValueError("min_age cannot be greater than max_age")
+        self.name = name
+        self.breeds = frozenset(breeds)
+        self.sexes = frozenset(sexes) if sexes else None
+        self.min_age = min_age
+        self.max_age = max_age
+
+    def matches(self, document):
+        if not _is_one_of(document.get("breed"), self.breeds):
+            return False
+        if self.sexes is not None and not _is_one_of(document.get("sex_upon_outcome"), self.sexes):
+            return False
+        if self.min_age is None and self.max_age is None:
+            return True
+        age = document.get("age_upon_outcome_in_weeks")
+        if not isinstance(age, numbers.Real) or isinstance(age, bool):
+            return False
+        return (self.min_age is None or age >= self.min_age) and (self.max_age is None or age <= self.max_age)
+
+    def query(self):
+        query = {"breed": {"$in": sorted(self.breeds)}}
+        if self.sexes is not None:
+            query["sex_upon_outcome"] = {"$in": sorted(self.sexes)}
+        age = {}
+        if self.min_age is not None:
+            age["$gte"] = self.min_age
+        if self.max_age is not None:
+            age["$lte"] = self.max_age
+        if age:
+            query["age_upon_outcome_in_weeks"] = age
+        return query
+
+    def __eq__(self, other):
+        return isinstance(other, RescueView) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return "RescueView(%r, breeds=%r, sexes=%r, min_age=%r, max_age=%r)" % (
+            self.name, sorted(self.breeds), sorted(self.sexes) if self.sexes else None, self.min_age, self.max_age)
+
+    def _key(self):
+        return self.name, self.breeds, self.sexes, self.min_age, self.max_age
+
+
+# The dashboard's rescue presets
+DEFAULT_RESCUE_VIEWS = (
+    RescueView("Water Rescue", ["Labrador Retriever Mix", "Chesapeake Bay Retriever", "Newfoundland"]),
+    RescueView("Mountain or Wilderness Rescue",
+               ["German Shepherd", "Alaskan Malamute", "Border Collie", "Siberian Husky"]),
+    RescueView("Disaster or Individual Tracking", ["Doberman Pinscher", "Bloodhound", "Rottweiler"]),
+)
+
+
+class RescueViews(object):
+    """
+    Member `_id` sets of the rescue views, maintained per document.
+
+    Features:
+    - `set_document(doc_id, document)` and `remove(doc_id)` keep every view current.
+    - `ids(name)` and `count(name)` are O(1) lookups.
+    - `add_view` and `drop_view` change the configured views at runtime.
+    """
+
+    def __init__(self, views=DEFAULT_RESCUE_VIEWS):
+        # View name -> RescueView, in the configured order
+        self._views = {}
+        # View name -> set of member `_id`s
+        self._members = {}
+        for view in views:
+            self.add_view(view)
+
+    def views(self):
+        """Return the configured views in order."""
+        return list(self._views.values())
+
+    def names(self):
+        return list(self._views)
+
+    def add_view(self, view, member_ids=()):
+        """Add or replace a view with its current members."""
+        self._views[view.name] = view
+        self._members[view.name] = set(member_ids)
+
+    def drop_view(self, name):
+        """Remove a view. Returns True if it existed."""
+        self._members.pop(name, None)
+        return self._views.pop(name, None) is not None
+
+    def set_document(self, doc_id, document):
+        """Add a document to the views it now matches and remove it from the others."""
+        for name, view in self._views.items():
+            if view.matches(document):
+                self._members[name].add(doc_id)
+            else:
+                self._members[name].discard(doc_id)
+
+    def remove(self, doc_id):
+        for members in self._members.values():
+            members.discard(doc_id)
+
+    def ids(self, name):
+        """Return the member `_id`s of a view (do not modify), or None for an unknown view."""
+        return self._members.get(name)
+
+    def count(self, name):
+        members = self._members.get(name)
+        return len(members) if members is not None else 0
+
+    def clear(self):
+        """Remove every member, keeping the view definitions."""
+        for members in self._members.values():
+            members.clear()
+
+    def __contains__(self, name):
+        return name in self._views
+
+    def __len__(self):
+        return len(self._views)
+
+
+__all__ = ["VIEW_FIELDS", "RescueView", "RescueViews", "DEFAULT_RESCUE_VIEWS"]
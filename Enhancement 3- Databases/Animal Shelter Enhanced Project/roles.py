@@ -0,0 +1,92 @@
+# Role Hierarchy and Permission Cache for EJG Animal Shelter Dashboard
+# Author: Edward Garcia
+
+# Overview:
+# `UserManagement.check_permissions` used to look the user up in MongoDB on every call and compare role strings
+# exactly, so an Admin failed a "Regular User" check. This module defines the role hierarchy and a small cache of
+# resolved roles, so a permission check costs a dictionary lookup and a comparison of two integers.
+#
+# Key Features:
+# 1. An explicit hierarchy: Guest < Regular User < Admin. A role satisfies every role at or below its level.
+# 2. Role names are matched case-insensitively. Roles outside the hierarchy only satisfy themselves.
+# 3. `RoleCache` keeps each user's resolved role (including "no such user") until it is invalidated by a role
+#    change, or until a TTL expires so changes made by other processes are eventually picked up.
+
+import threading
+import time
+
+# Roles from least to most privileged
+ROLE_HIERARCHY = ("Guest", "Regular User", "Admin")
+
+_ROLE_LEVELS = {role.lower(): level for level, role in enumerate(ROLE_HIERARCHY)}
+
+
+def normalize_role(role):
+    """Return the canonical spelling of a role in the hierarchy, or the role unchanged if it is not in it."""
+    level = _ROLE_LEVELS.get((role or "").strip().lower())
+    return ROLE_HIERARCHY[level] if level is not None else role
+
+
+def role_level(role):
+    """Return the level of a role in the hierarchy (0 for Guest), or None for roles outside it."""
+    return _ROLE_LEVELS.get((role or "").strip().lower())
+
+
+def role_satisfies(user_role, required_role):
+    """
+    Check whether a user's role grants a required role.
+    - Admin satisfies Admin, Regular User and Guest; Regular User satisfies Regular User and Guest.
+    - Roles outside the hierarchy only satisfy the same role.
+    """
+    if not user_role or not required_role:
+        return False
+    user_level = role_level(user_role)
+    required_level = role_level(required_role)
+    if user_level is None or required_level is None:
+        return user_role.strip().lower() == required_role.strip().lower()
+    return user_level >= required_level
+
+
+# Cached marker for users that do not exist
+_NO_USER = object()
+
+
+class RoleCache(object):
+    """
+    Caches the role of each user.
+
+    Features:
+    - `get(username)` returns (True, role) on a hit, where role is None for unknown users, or (False, None) on a miss.
+    - `put`, `invalidate(username)` and `clear()` keep it consistent with role changes.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        # Username -> (role or _NO_USER, expiry time)
+        self._roles = {}
+        self._lock = threading.Lock()
+
+    def get(self, username):
+        entry = self._roles.get(username)
+        if entry is None or entry[1] <= time.monotonic():
+            return False, None
+        role = entry[0]
+        return True, (None if role is _NO_USER else role)
+
+    def put(self, username, role):
+        with self._lock:
+            self._roles[username] = (_NO_USER if role is None else role, time.monotonic() + self.ttl)
+
+    def invalidate(self, username):
+        with self._lock:
+            self._roles.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._roles.clear()
+
+    def __len__(self):
+        return len(self._roles)
+
+
+__all__ = ["ROLE_HIERARCHY", "normalize_role", "role_level", "role_satisfies", "RoleCache"]
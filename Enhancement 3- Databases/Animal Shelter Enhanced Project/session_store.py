@@ -0,0 +1,144 @@
+# Session Tokens for EJG Animal Shelter Dashboard
+# Author: Edward Garcia
+
+# Overview:
+# The dashboard used to remember the logged-in user in module-level globals, which only works for one user per
+# process and forces a full credential check (MongoDB lookup plus bcrypt) for any re-check. `SessionStore` issues a
+# signed token after a successful login and validates it on every request with a dictionary lookup.
+#
+# Key Features:
+# 1. Tokens are a random session id plus an HMAC-SHA256 signature, so forged or tampered tokens are rejected
+#    before the store is consulted.
+# 2. Sessions expire after an idle TTL, which is extended each time the token is used.
+# 3. The store is bounded: when it is full the least recently used session is evicted.
+# 4. Sessions can be revoked individually (logout) or for every session of a user.
+
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import REGISTRY
+
+# Session events go to user_management.log through the logger user_management.py configures
+user_management_logger = logging.getLogger("user_management")
+
+
+def _sign(secret, session_id):
+    digest = hmac.new(secret, session_id.encode('utf-8'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode('ascii')
+
+
+class SessionStore(object):
+    """
+    In-memory store of signed, expiring session tokens.
+
+    Features:
+    - `create(username, role)` returns a new token.
+    - `validate(token)` returns the session (username, role, created, expires) in O(1), or None.
+    - `revoke(token)` and `revoke_user(username)` end sessions early.
+    """
+
+    def __init__(self, secret=None, ttl=1800, max_sessions=10000):
+        """
+        Input:
+            secret (bytes or str): Signing key. Defaults to DASHBOARD_SESSION_SECRET, or a random key per process.
+            ttl (int): Seconds a session stays valid without being used.
+            max_sessions (int): Sessions kept before the least recently used one is evicted.
+        """
+        secret = secret or os.environ.get("DASHBOARD_SESSION_SECRET") or secrets.token_bytes(32)
+        self._secret = secret.encode('utf-8') if isinstance(secret, str) else secret
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # Session id -> session dictionary, least recently used first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+        REGISTRY.register_gauge("dashboard_sessions", lambda: len(self._sessions))
+
+    def create(self, username, role):
+        """Start a session for an authenticated user and return its token."""
+        session_id = secrets.token_urlsafe(24)
+        now = time.time()
+        session = {"username": username, "role": role, "created": now, "expires": now + self.ttl}
+        with self._lock:
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, evicted = self._sessions.popitem(last=False)
+                user_management_logger.info("Evicted session of user '%s' (store full)", evicted["username"])
+        return "%s.%s" % (session_id, _sign(self._secret, session_id))
+
+    def validate(self, token):
+        """
+        Check a token and extend its session.
+
+        Returns:
+            dict: A copy of the session, or None if the token is missing, forged, expired or revoked.
+        """
+        session_id = self._verified_id(token)
+        if session_id is None:
+            return None
+
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if session["expires"] <= now:
+                del self._sessions[session_id]
+                return None
+            session["expires"] = now + self.ttl
+            self._sessions.move_to_end(session_id)
+            return dict(session)
+
+    def revoke(self, token):
+        """End the session of a token. Returns True if a session was ended."""
+        session_id = self._verified_id(token)
+        if session_id is None:
+            return False
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def revoke_user(self, username):
+        """End every session of a user. Returns the number of sessions ended."""
+        with self._lock:
+            session_ids = [session_id for session_id, session in self._sessions.items() if session["username"] == username]
+            for session_id in session_ids:
+                del self._sessions[session_id]
+        return len(session_ids)
+
+    def update_role(self, username, role):
+        """Change the role recorded in every session of a user."""
+        with self._lock:
+            for session in self._sessions.values():
+                if session["username"] == username:
+                    session["role"] = role
+
+    def purge_expired(self):
+        """Drop every expired session. Returns the number dropped."""
+        now = time.time()
+        with self._lock:
+            expired = [session_id for session_id, session in self._sessions.items() if session["expires"] <= now]
+            for session_id in expired:
+                del self._sessions[session_id]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _verified_id(self, token):
+        if not token or not isinstance(token, str) or "." not in token:
+            return None
+        session_id, signature = token.rsplit(".", 1)
+        if not hmac.compare_digest(signature.encode('utf-8'), _sign(self._secret, session_id).encode('utf-8')):
+            user_management_logger.warning("Rejected session token with an invalid signature")
+            return None
+        return session_id
+
+
+__all__ = ["SessionStore"]
@@ -0,0 +1,322 @@
+# EJG Animal Shelter User Management Unit Tests
+# Author: Edward Garcia
+# This script contains unit tests for the `UserManagement` class in `user_management.py` and the helpers it uses
+# for Enhancement 3: Databases.
+#
+# Purpose:
+# These tests validate account creation and authentication against a separate test database, so production users
+# in the `AAC` database are never touched.
+#
+# Coverage Summary:
+# - Accounts: Adding users with canonical role names, rejecting duplicate usernames and authenticating with correct and
+#   incorrect passwords.
+# - Password Hashing Pool: bcrypt runs on the bounded process pool and a full queue fails fast with a busy message.
+#   A call that times out holds its slot until its job finishes, and a pool broken by a dead worker is replaced.
+# - Bulk Provisioning: Per-user outcomes for added, existing, duplicate and invalid users, in input order.
+# - Roles: Hierarchical permission checks served from the role cache, which role changes invalidate.
+# - Login Throttling: Throttled attempts skip the database, lockouts grow progressively and are shared through MongoDB.
+# - Sessions: Login issues a signed token, forged and expired tokens are rejected, logout and eviction end sessions.
+
+import time
+import unittest
+from user_management import UserManagement
+from password_hashing import PasswordHasher, PasswordHasherBusy
+from session_store import SessionStore
+from roles import RoleCache, role_satisfies
+from login_throttle import LoginThrottle
+
+
+class TestUserManagement(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Set up the test environment for all test cases"""
+        # Here I used a low bcrypt cost so the tests run quickly; production hashes keep the default cost.
+        cls.hasher = PasswordHasher(max_workers=2, max_queue_depth=4, rounds=4)
+        cls.users = UserManagement('edwardgarcia5_snhu', 'password', 'host.docker.internal', 27017, 'AAC_test',
+                                   hasher=cls.hasher)
+
+    def setUp(self):
+        """Start every test with a single known user"""
+        self.users.users_collection.delete_many({})
+        self.users.throttle.reset()
+        self.users.add_user("test_user", "correct horse", "Regular User")
+
+    def test_add_user(self):
+        """Test that passwords are stored hashed and duplicate usernames are rejected"""
+        # Here I am testing that the stored password is a bcrypt hash rather than the plaintext.
+        stored = self.users.users_collection.find_one({"username": "test_user"})
+        self.assertTrue(stored["password"].startswith("$2"))
+        self.assertNotEqual(stored["password"], "correct horse")
+        self.assertEqual(self.users.add_user("test_user", "other", "Admin"), "User already exists!")
+
+        # Roles are stored in their canonical spelling, so permission checks and role counts agree
+        self.users.add_user("cased_user", "password", "regular user")
+        self.assertEqual(self.users.users_collection.find_one({"username": "cased_user"})["role"], "Regular User")
+
+    def test_authenticate_user(self):
+        """Test authentication with correct and incorrect passwords"""
+        # Here I am testing that verification on the hashing pool gives the same answers as inline bcrypt.
+        self.assertEqual(self.users.authenticate_user("test_user", "correct horse"),
+                         {"status": "success", "role": "Regular User"})
+        self.assertEqual(self.users.authenticate_user("test_user", "wrong")["status"], "fail")
+        self.assertEqual(self.users.authenticate_user("missing_user", "correct horse")["status"], "fail")
+
+    def test_hashing_queue_cap(self):
+        """Test that a full hashing queue fails fast instead of queueing more work"""
+        # Here I am testing the queue-depth cap by holding every slot, as a burst of logins would.
+        for _ in range(self.hasher.max_queue_depth):
+            self.hasher._slots.acquire()
+        try:
+            with self.assertRaises(PasswordHasherBusy):
+                self.hasher.check_password("correct horse", "$2b$04$invalidinvalidinvalidinvalidinvalidinvalidinvalidinv")
+            response = self.users.authenticate_user("test_user", "correct horse")
+            self.assertEqual(response, {"status": "fail", "message": "Server busy, please try again."})
+        finally:
+            for _ in range(self.hasher.max_queue_depth):
+                self.hasher._slots.release()
+        self.assertEqual(self.hasher.queue_depth(), 0)
+
+    def test_timed_out_job_keeps_slot(self):
+        """Test that a call that times out keeps its queue slot until the bcrypt job finishes"""
+        # Here I am testing that an abandoned job still counts against the cap, so timeouts cannot overfill the pool.
+        hasher = PasswordHasher(max_workers=1, max_queue_depth=1, rounds=12, timeout=0.001)
+        try:
+            with self.assertRaises(TimeoutError):
+                hasher.hash_password("slow password")
+            self.assertEqual(hasher.queue_depth(), 1)
+            with self.assertRaises(PasswordHasherBusy):
+                hasher.hash_password("another password")
+
+            deadline = time.monotonic() + 30
+            while hasher.queue_depth() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(hasher.queue_depth(), 0, "The slot should be freed once the job finishes")
+        finally:
+            hasher.shutdown()
+
+    def test_broken_pool_is_replaced(self):
+        """Test that hashing recovers after a worker process dies"""
+        # Here I am testing a worker killed mid-service, as an OOM kill would, which breaks the whole process pool.
+        hasher = PasswordHasher(max_workers=1, rounds=4)
+        try:
+            hashed_password = hasher.hash_password("first password")
+            broken = hasher._executor
+            for process in list(broken._processes.values()):
+                process.kill()
+                process.join()
+            self.assertTrue(hasher.check_password("first password", hashed_password))
+            self.assertIsNot(hasher._executor, broken)
+            self.assertEqual(hasher.queue_depth(), 0)
+        finally:
+            hasher.shutdown()
+
+    def test_hash_passwords(self):
+        """Test that batch hashing keeps the input order"""
+        # Here I am testing a batch larger than one chunk per worker, so chunks are scheduled in several rounds.
+        passwords = ["password%s" % number for number in range(20)]
+        hashes = self.hasher.hash_passwords(passwords, chunk_size=3)
+        self.assertEqual(len(hashes), 20)
+        for password, hashed_password in zip(passwords, hashes):
+            self.assertTrue(self.hasher.check_password(password, hashed_password))
+
+    def test_login_session(self):
+        """Test that login issues a session token that validates until logout"""
+        # Here I am testing the full session lifecycle through UserManagement.
+        result = self.users.login("test_user", "correct horse")
+        self.assertEqual(result["status"], "success")
+        session = self.users.validate_session(result["token"])
+        self.assertEqual((session["username"], session["role"]), ("test_user", "Regular User"))
+
+        self.assertTrue(self.users.logout(result["token"]))
+        self.assertIsNone(self.users.validate_session(result["token"]))
+        self.assertNotIn("token", self.users.login("test_user", "wrong"))
+
+    def test_add_users(self):
+        """Test bulk provisioning with a mix of new, existing, duplicate and invalid users"""
+        # Here I am testing that every user gets an outcome in input order and that the batch is not stopped by failures.
+        users = [
+            {"username": "bulk_user1", "password": "first", "role": "Guest"},
+            {"username": "test_user", "password": "other", "role": "Admin"},
+            {"username": "bulk_user2", "password": "second", "role": " admin"},
+            {"username": "bulk_user1", "password": "again", "role": "Guest"},
+            {"username": "bulk_user3", "role": "Guest"},
+        ]
+        outcomes = self.users.add_users(users)
+        self.assertEqual([outcome["status"] for outcome in outcomes], ["added", "exists", "added", "exists", "invalid"])
+        self.assertEqual([outcome["username"] for outcome in outcomes], [user["username"] for user in users])
+        self.assertEqual(self.users.users_collection.count_documents({}), 3)
+        self.assertEqual(self.users.authenticate_user("bulk_user2", "second"), {"status": "success", "role": "Admin"})
+        self.assertEqual(self.users.authenticate_user("bulk_user1", "first")["status"], "success")
+
+    def test_throttled_before_database(self):
+        """Test that throttled attempts are rejected without a database lookup"""
+        # Here I am testing that once the username bucket is empty, attempts never reach MongoDB or bcrypt.
+        for _ in range(5):
+            self.assertEqual(self.users.authenticate_user("test_user", "wrong", source="10.0.0.1")["status"], "fail")
+        lookups = []
+        original_find_user = self.users._find_user
+        self.users._find_user = lambda username: lookups.append(username) or original_find_user(username)
+        try:
+            response = self.users.authenticate_user("test_user", "correct horse", source="10.0.0.2")
+        finally:
+            del self.users._find_user
+        self.assertEqual(response["status"], "fail")
+        self.assertGreater(response["retry_after"], 0)
+        self.assertEqual(lookups, [])
+        self.assertEqual(self.users.throttle.stats()["active_lockouts"], 1)
+
+    def test_persisted_lockouts(self):
+        """Test that a lockout recorded by one worker is enforced by another"""
+        # Here I am testing two throttles sharing the login_throttle collection, as two dashboard workers would.
+        collection = self.users.database['login_throttle_test']
+        collection.delete_many({})
+        first = LoginThrottle(user_capacity=1, collection=collection)
+        second = LoginThrottle(user_capacity=1, collection=collection, sync_interval=0)
+        self.assertTrue(first.check("test_user")[0])
+        first.record_failure("test_user")
+        self.assertFalse(second.check("test_user")[0], "Lockout was not shared")
+        # A restarted worker also loads the lockout
+        self.assertFalse(LoginThrottle(collection=collection).check("test_user")[0])
+        collection.drop()
+
+    def test_hierarchical_permissions(self):
+        """Test that higher roles pass checks for lower roles"""
+        # Here I am testing the Guest < Regular User < Admin hierarchy.
+        self.users.add_user("admin_user", "secret", "Admin")
+        self.assertTrue(self.users.check_permissions("admin_user", "Regular User"))
+        self.assertTrue(self.users.check_permissions("admin_user", "guest"))
+        self.assertTrue(self.users.check_permissions("test_user", "Guest"))
+        self.assertFalse(self.users.check_permissions("test_user", "Admin"))
+        self.assertFalse(self.users.check_permissions("missing_user", "Guest"))
+
+    def test_role_cache_invalidation(self):
+        """Test that permission checks are cached until the role changes"""
+        # Here I am testing that repeated checks skip the database and that set_role invalidates the cached role.
+        self.users.role_cache.clear()
+        lookups = []
+        original_find_user = self.users._find_user
+        self.users._find_user = lambda username: lookups.append(username) or original_find_user(username)
+        try:
+            for _ in range(5):
+                self.assertFalse(self.users.check_permissions("test_user", "Admin"))
+            self.assertEqual(len(lookups), 1)
+
+            token = self.users.sessions.create("test_user", "Regular User")
+            self.assertTrue(self.users.set_role("test_user", "admin"))
+            self.assertTrue(self.users.check_permissions("test_user", "Admin"))
+            self.assertEqual(len(lookups), 2)
+            self.assertEqual(self.users.validate_session(token)["role"], "Admin")
+        finally:
+            del self.users._find_user
+        self.assertFalse(self.users.set_role("missing_user", "Admin"))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up after all tests"""
+        # Here I dropped the test users collection and stopped the worker processes.
+        cls.users.users_collection.drop()
+        cls.hasher.shutdown()
+
+
+class TestLoginThrottle(unittest.TestCase):
+    """Unit tests for the LoginThrottle that do not require MongoDB"""
+
+    def test_progressive_lockout(self):
+        # Here I am testing that each lockout of the same username is twice as long as the previous one.
+        throttle = LoginThrottle(user_capacity=2, user_refill_seconds=1000, base_lockout=0.05)
+        for _ in range(2):
+            self.assertTrue(throttle.check("user1")[0])
+            throttle.record_failure("user1")
+        self.assertFalse(throttle.check("user1")[0])
+        self.assertEqual(throttle.stats()["lockouts"], 1)
+
+        time.sleep(0.06)
+        # The lockout is over but the bucket has not refilled, so the next attempt is still throttled
+        self.assertFalse(throttle.check("user1")[0])
+        bucket = throttle._buckets[("user", "user1")]
+        bucket.tokens = 1
+        self.assertTrue(throttle.check("user1")[0])
+        throttle.record_failure("user1")
+        self.assertAlmostEqual(bucket.locked_until - bucket.last_strike, 0.1, places=3)
+        self.assertEqual(bucket.strikes, 2)
+
+    def test_success_and_sources(self):
+        # Here I am testing that a success gives the attempt back and that sources are throttled separately.
+        throttle = LoginThrottle(user_capacity=1, source_capacity=2, source_refill_seconds=1000)
+        for _ in range(3):
+            self.assertTrue(throttle.check("user1", "10.0.0.1")[0])
+            throttle.record_success("user1", "10.0.0.1")
+        self.assertTrue(throttle.check("user2", "10.0.0.1")[0])
+        self.assertTrue(throttle.check("user3", "10.0.0.1")[0])
+        allowed, retry_after = throttle.check("user4", "10.0.0.1")
+        self.assertFalse(allowed, "Source bucket was not enforced")
+        self.assertGreater(retry_after, 0)
+        self.assertTrue(throttle.check("user4", "10.0.0.2")[0])
+        self.assertEqual(throttle.stats()["throttled"], 1)
+
+
+class TestRoles(unittest.TestCase):
+    """Unit tests for the role hierarchy and role cache that do not require MongoDB"""
+
+    def test_role_satisfies(self):
+        # Here I am testing every pair of roles in the hierarchy, plus roles outside it.
+        self.assertTrue(role_satisfies("Admin", "Guest"))
+        self.assertTrue(role_satisfies("regular user", "Regular User"))
+        self.assertFalse(role_satisfies("Guest", "Regular User"))
+        self.assertFalse(role_satisfies(None, "Guest"))
+        self.assertTrue(role_satisfies("Volunteer", "volunteer"))
+        self.assertFalse(role_satisfies("Admin", "Volunteer"))
+
+    def test_role_cache(self):
+        cache = RoleCache(ttl=0.05)
+        self.assertEqual(cache.get("user1"), (False, None))
+        cache.put("user1", "Admin")
+        cache.put("missing", None)
+        self.assertEqual(cache.get("user1"), (True, "Admin"))
+        self.assertEqual(cache.get("missing"), (True, None))
+        cache.invalidate("user1")
+        self.assertEqual(cache.get("user1"), (False, None))
+        time.sleep(0.06)
+        self.assertEqual(cache.get("missing"), (False, None))
+
+
+class TestSessionStore(unittest.TestCase):
+    """Unit tests for the SessionStore that do not require MongoDB"""
+
+    def test_signed_tokens(self):
+        # Here I am testing that a token from another secret or with a changed session id is rejected.
+        store = SessionStore(secret="test-secret")
+        token = store.create("user1", "Admin")
+        self.assertEqual(store.validate(token)["username"], "user1")
+        self.assertIsNone(SessionStore(secret="other-secret").validate(token))
+        session_id, signature = token.rsplit(".", 1)
+        self.assertIsNone(store.validate(session_id + "x." + signature))
+        self.assertIsNone(store.validate("not a token"))
+        self.assertIsNone(store.validate(None))
+
+    def test_expiry_and_eviction(self):
+        # Here I am testing the idle TTL and the least recently used eviction when the store is full.
+        store = SessionStore(secret="test-secret", ttl=0.05, max_sessions=2)
+        first = store.create("user1", "Admin")
+        second = store.create("user2", "Guest")
+        self.assertIsNotNone(store.validate(first))
+        store.create("user3", "Guest")
+        self.assertIsNone(store.validate(second), "Least recently used session was not evicted")
+        self.assertEqual(len(store), 2)
+
+        time.sleep(0.06)
+        self.assertIsNone(store.validate(first))
+        self.assertEqual(store.purge_expired(), 1)
+        self.assertEqual(len(store), 0)
+
+    def test_revoke_user(self):
+        store = SessionStore(secret="test-secret")
+        tokens = [store.create("user1", "Admin") for _ in range(3)]
+        store.create("user2", "Guest")
+        self.assertEqual(store.revoke_user("user1"), 3)
+        self.assertTrue(all(store.validate(token) is None for token in tokens))
+        self.assertEqual(len(store), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,19 @@
 # 1. **Security**: Implements bcrypt for secure password hashing and pyotp for MFA to enhance login security and mitigate unauthorized access.
 # 2. **Logging**: Uses logging to track and record user-related activities like login attempts, role validation, MFA verification.
 # 3. **Scalability**: Offers an extensible design for future enhancements to user management within the application.
+# 4. **Indexing**: Declares a unique index on `users.username`, ensured at startup, and records query shapes for the index advisor.
+# 5. **Metrics**: Records latency histograms for every user operation in the shared metrics registry (see metrics.py).
+# 6. **Connection Pooling**: Uses the shared MongoClient from mongo_client_registry.py instead of opening its own connection pool.
+# 7. **Password Hashing Pool**: bcrypt hashing and verification run on a bounded process pool (see password_hashing.py),
+#    so a burst of logins does not stall dashboard callbacks.
+# 8. **Sessions**: `login` issues a signed session token after authentication (see session_store.py), so later requests
+#    are validated with a dictionary lookup instead of another database lookup and bcrypt check.
+# 9. **Role Hierarchy**: `check_permissions` resolves roles through the Guest < Regular User < Admin hierarchy (see roles.py),
+#    using a per-user role cache that `set_role` and `add_user` invalidate.
+# 10. **Bulk Provisioning**: `add_users` hashes a batch of passwords in parallel and inserts it with one unordered
+#     `insert_many`, relying on the unique username index instead of per-user existence checks.
+# 11. **Login Throttling**: `authenticate_user` checks a token-bucket limiter keyed by username and source before any
+#     database or bcrypt work, with progressive lockout after repeated failures (see login_throttle.py).
 
 # Enhancment 3 Imports:
 # - **bcrypt**: Implements secure hashing of passwords with salt, ensuring protection against brute-force attacks.
@@ -16,10 +29,16 @@
 # - **pyotp**: Generates and verifies time-based one-time passwords (TOTP) for implementing MFA.
 
 
-from pymongo import MongoClient
-import bcrypt
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import logging
 import pyotp  # Import pyotp for MFA
+from index_advisor import QueryAdvisor, ensure_indexes
+from metrics import REGISTRY, count_results
+from mongo_client_registry import get_client
+from password_hashing import PasswordHasherBusy, get_default_hasher
+from session_store import SessionStore
+from roles import RoleCache, normalize_role, role_satisfies
+from login_throttle import LoginThrottle
 
 # Configure a specific logger for user management
 user_management_logger = logging.getLogger("user_management")
@@ -49,18 +68,57 @@ class UserManagement:
     - Log all significant events for auditing and debugging.
     """
 
-    def __init__(self, username='edwardgarcia5_snhu', password='password', host='host.docker.internal', port=27017, db='AAC'):
+    # Indexes for the users collection, as (keys, options) pairs. Every lookup is by username.
+    INDEXES = [
+        ([("username", 1)], {"unique": True, "name": "username_unique"}),
+    ]
+
+    def __init__(self, username='edwardgarcia5_snhu', password='password', host='host.docker.internal', port=27017, db='AAC',
+                 create_indexes=True, pool_options=None, hasher=None, sessions=None, role_cache_ttl=60,
+                 throttle=None, persist_throttle=False):
         """
         Initializes the UserManagement class by connecting to the MongoDB database.
-
+        - Shares one pooled MongoClient per set of connection parameters with AnimalShelter (see mongo_client_registry.py).
+        - hasher (PasswordHasher) runs bcrypt work; by default the process-wide pool is shared by every instance.
+        - sessions (SessionStore) holds the session tokens issued by `login`.
+        - role_cache_ttl bounds how long a role changed by another process can be served from the role cache.
+        - throttle (LoginThrottle) limits login attempts. With persist_throttle, the default throttle shares its lockouts
+          through the `login_throttle` collection.
         """
-        # Connect to the MongoDB database
-        self.client = MongoClient(f'mongodb://{username}:{password}@{host}:{port}/?authSource=admin')
+        # Connect to the MongoDB database through the shared client
+        self.client = get_client(username, password, host, port, **(pool_options or {}))
         self.database = self.client[db]
         # Define the collection for user data
         self.users_collection = self.database['users']
         user_management_logger.info("Connected to MongoDB 'users' collection.")
 
+        # bcrypt runs on a bounded process pool instead of the calling thread
+        self.hasher = hasher if hasher is not None else get_default_hasher()
+        # Session tokens issued after successful logins
+        self.sessions = sessions if sessions is not None else SessionStore()
+        # Resolved roles for check_permissions, invalidated when a role changes
+        self.role_cache = RoleCache(ttl=role_cache_ttl)
+        # Login attempt limiter, checked before any database or bcrypt work
+        if throttle is None:
+            throttle = LoginThrottle(collection=self.database['login_throttle'] if persist_throttle else None)
+        self.throttle = throttle
+
+        # Make sure the username index exists and start recording query shapes
+        self.advisor = QueryAdvisor(self.users_collection, logger=user_management_logger)
+        if create_indexes:
+            self.ensure_indexes()
+
+    def ensure_indexes(self):
+        """Create the indexes declared in INDEXES. Existing indexes are left unchanged."""
+        return ensure_indexes(self.users_collection, self.INDEXES, logger=user_management_logger)
+
+    def _find_user(self, username):
+        """Look up a user document by username, recording the query shape for the index advisor."""
+        query = {"username": username}
+        self.advisor.record(query)
+        return self.users_collection.find_one(query)
+
+    @REGISTRY.instrument("user_management.add_user")
     def add_user(self, username, password, role):
         """
         Adds a new user with hashed password and assigned role.
@@ -68,32 +126,106 @@ class UserManagement:
         Input:
             username (str): Username of the new user.
             password (str): Plaintext password of the new user.
-            role (str): Role assigned to the user.
+            role (str): Role assigned to the user, stored in its canonical spelling (e.g. "admin" as "Admin").
 
         Returns:
             str: Success or error message.
         """
         try:
+            role = normalize_role(role)
             # Check if the user already exists
-            if self.users_collection.find_one({"username": username}):
+            if self._find_user(username):
                 user_management_logger.warning("User with username '%s' already exists.", username)
                 return "User already exists!"
             
-            # Hash the password securely with bcrypt
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            # Hash the password securely with bcrypt on the hashing pool
+            hashed_password = self.hasher.hash_password(password)
             user_data = {
                 "username": username,
-                "password": hashed_password.decode('utf-8'),  # Store as a string
+                "password": hashed_password,  # Stored as a string
                 "role": role
             }
             # Insert the new user into the collection
             self.users_collection.insert_one(user_data)
+            # A lookup before the user existed may have cached "no such user"
+            self.role_cache.invalidate(username)
             user_management_logger.info("User '%s' added successfully.", username)
             return "User added successfully!"
+        except DuplicateKeyError:
+            # The unique username index rejects a user added concurrently after the existence check
+            user_management_logger.warning("User with username '%s' already exists.", username)
+            return "User already exists!"
+        except PasswordHasherBusy:
+            user_management_logger.warning("Password hashing queue full while adding user '%s'.", username)
+            return "Server busy, please try again."
         except Exception as e:
             user_management_logger.error("Error adding user: %s", str(e))
             raise
 
+    @REGISTRY.instrument("user_management.add_users", count_results)
+    def add_users(self, users):
+        """
+        Adds many users at once with hashed passwords and assigned roles.
+        - Passwords are hashed in parallel on the hashing pool.
+        - Users are written with one unordered insert_many; the unique username index rejects existing usernames
+          without stopping the rest of the batch.
+        - Roles are stored in their canonical spelling, as in `add_user`.
+
+        Input:
+            users (list): Dictionaries with "username", "password" and "role".
+
+        Returns:
+            list: One outcome per user, in input order: {"username", "status", "message"} where status is
+                  "added", "exists", "invalid" or "error".
+        """
+        outcomes = [None] * len(users)
+        valid = []
+        for position, user in enumerate(users):
+            if not all(isinstance(user.get(field), str) and user.get(field) for field in ("username", "password", "role")):
+                outcomes[position] = {"username": user.get("username"), "status": "invalid",
+                                      "message": "Username, password and role are required."}
+            else:
+                valid.append(position)
+
+        try:
+            hashed_passwords = self.hasher.hash_passwords([users[position]["password"] for position in valid])
+        except PasswordHasherBusy:
+            user_management_logger.warning("Password hashing queue full while adding %s users.", len(valid))
+            for position in valid:
+                outcomes[position] = {"username": users[position]["username"], "status": "error",
+                                      "message": "Server busy, please try again."}
+            return outcomes
+
+        documents = [{"username": users[position]["username"], "password": hashed_password,
+                      "role": normalize_role(users[position]["role"])}
+                     for position, hashed_password in zip(valid, hashed_passwords)]
+        failures = {}
+        if documents:
+            try:
+                self.users_collection.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details.get("writeErrors", []):
+                    failures[write_error["index"]] = write_error
+            except Exception as e:
+                user_management_logger.error("Error adding users: %s", str(e))
+                raise
+
+        for index, position in enumerate(valid):
+            username = users[position]["username"]
+            write_error = failures.get(index)
+            if write_error is None:
+                self.role_cache.invalidate(username)
+                outcomes[position] = {"username": username, "status": "added", "message": "User added successfully!"}
+            elif write_error.get("code") == 11000:
+                outcomes[position] = {"username": username, "status": "exists", "message": "User already exists!"}
+            else:
+                outcomes[position] = {"username": username, "status": "error", "message": write_error.get("errmsg", "")}
+
+        added = sum(1 for outcome in outcomes if outcome["status"] == "added")
+        user_management_logger.info("Bulk added %s of %s users.", added, len(users))
+        return outcomes
+
+    @REGISTRY.instrument("user_management.get_all_users", count_results)
     def get_all_users(self):
         """
         Retrieves all users with their roles for verification purposes.
@@ -108,23 +240,49 @@ class UserManagement:
             user_management_logger.error("Error retrieving users: %s", str(e))
             raise
 
-    def authenticate_user(self, username, password, otp=None):
+    @REGISTRY.instrument("user_management.authenticate_user")
+    def authenticate_user(self, username, password, otp=None, source=None):
         """
         Authenticates a user by verifying their credentials and optional MFA OTP.
+        - Throttled attempts are rejected before the database lookup and bcrypt check.
 
         Input:
             username (str): Username to authenticate.
             password (str): Plaintext password.
             otp (str, optional): One-time password for MFA.
+            source (str, optional): Client address, throttled separately from the username.
 
         Returns:
-            dict: Authentication status and user role, or an error message.
+            dict: Authentication status and user role, or an error message ("retry_after" seconds when throttled).
         """
+        allowed, retry_after = self.throttle.check(username, source)
+        if not allowed:
+            user_management_logger.warning("Throttled login attempt for user '%s' from %s.", username, source)
+            return {"status": "fail", "message": "Too many login attempts. Try again in %s seconds." % retry_after,
+                    "retry_after": retry_after}
+
+        try:
+            result = self._authenticate(username, password, otp)
+        except PasswordHasherBusy:
+            # Not the user's fault, so it does not count as a failed attempt
+            user_management_logger.warning("Password hashing queue full while authenticating '%s'.", username)
+            return {"status": "fail", "message": "Server busy, please try again."}
+
+        if result["status"] == "success":
+            self.throttle.record_success(username, source)
+        else:
+            self.throttle.record_failure(username, source)
+        return result
+
+    def _authenticate(self, username, password, otp):
+        """Verifies credentials and MFA for an attempt the throttle has allowed."""
         try:
             # Retrieve the user from the database
-            user = self.users_collection.find_one({"username": username})
-            if user and bcrypt.checkpw(password.encode('utf-8'), user["password"].encode('utf-8')):
+            user = self._find_user(username)
+            # Verify the password on the hashing pool so the calling thread only waits, without burning CPU
+            if user and self.hasher.check_password(password, user["password"]):
                 user_management_logger.info("Password authentication successful for user '%s'.", username)
+                self.role_cache.put(username, user["role"])
                 if "mfa_secret" in user:
                     if otp and self.verify_mfa(username, otp):
                         user_management_logger.info("MFA verification successful for user '%s'.", username)
@@ -135,24 +293,78 @@ class UserManagement:
                 return {"status": "success", "role": user["role"]}
             user_management_logger.warning("Authentication failed for username '%s'.", username)
             return {"status": "fail", "message": "Invalid username or password."}
+        except PasswordHasherBusy:
+            raise
         except Exception as e:
             user_management_logger.error("Error during authentication: %s", str(e))
             raise
 
+    @REGISTRY.instrument("user_management.login")
+    def login(self, username, password, otp=None, source=None):
+        """
+        Authenticates a user and starts a session.
+
+        Input:
+            username (str): Username to authenticate.
+            password (str): Plaintext password.
+            otp (str, optional): One-time password for MFA.
+            source (str, optional): Client address for login throttling.
+
+        Returns:
+            dict: The authenticate_user result, plus a session "token" when authentication succeeded.
+        """
+        result = self.authenticate_user(username, password, otp, source)
+        if result["status"] == "success":
+            result["token"] = self.sessions.create(username, result["role"])
+            user_management_logger.info("Session started for user '%s'.", username)
+        return result
+
+    def validate_session(self, token):
+        """
+        Validates a session token without touching the database.
+
+        Returns:
+            dict: The session's username and role, or None if the token is invalid or expired.
+        """
+        return self.sessions.validate(token)
+
+    def logout(self, token):
+        """Ends the session of a token. Returns True if a session was ended."""
+        ended = self.sessions.revoke(token)
+        if ended:
+            user_management_logger.info("Session ended.")
+        return ended
+
+    def get_role(self, username):
+        """
+        Resolves a user's role, from the role cache when possible.
+
+        Returns:
+            str: The user's role, or None if the user does not exist.
+        """
+        hit, role = self.role_cache.get(username)
+        if not hit:
+            user = self._find_user(username)
+            role = user["role"] if user else None
+            self.role_cache.put(username, role)
+        return role
+
+    @REGISTRY.instrument("user_management.check_permissions")
     def check_permissions(self, username, required_role):
         """
         Checks if a user has the required role for access control.
+        - Roles are hierarchical, so an Admin also passes Regular User and Guest checks.
+        - The user's role comes from the role cache, so repeated checks do not query the database.
 
         Input:
             username (str): Username to check.
             required_role (str): Role required to access a resource.
 
         Returns:
-            bool: True if the user has the required role, False otherwise.
+            bool: True if the user has the required role or a higher one, False otherwise.
         """
         try:
-            user = self.users_collection.find_one({"username": username})
-            if user and user["role"].lower() == required_role.lower():
+            if role_satisfies(self.get_role(username), required_role):
                 user_management_logger.info("User '%s' has the required role '%s'.", username, required_role)
                 return True
             user_management_logger.warning("User '%s' does not have the required role '%s'.", username, required_role)
@@ -161,6 +373,33 @@ class UserManagement:
             user_management_logger.error("Error checking permissions for user '%s': %s", username, str(e))
             raise
 
+    @REGISTRY.instrument("user_management.set_role")
+    def set_role(self, username, role):
+        """
+        Changes a user's role and invalidates the cached permissions for that user.
+
+        Input:
+            username (str): Username to change.
+            role (str): New role, e.g. "Guest", "Regular User" or "Admin".
+
+        Returns:
+            bool: True if the user exists, False otherwise.
+        """
+        try:
+            role = normalize_role(role)
+            result = self.users_collection.update_one({"username": username}, {"$set": {"role": role}})
+            self.role_cache.invalidate(username)
+            if result.matched_count == 1:
+                self.sessions.update_role(username, role)
+                user_management_logger.info("Role of user '%s' changed to '%s'.", username, role)
+                return True
+            user_management_logger.warning("Cannot change role of unknown user '%s'.", username)
+            return False
+        except Exception as e:
+            user_management_logger.error("Error changing role of user '%s': %s", username, str(e))
+            raise
+
+    @REGISTRY.instrument("user_management.enable_mfa")
     def enable_mfa(self, username):
         """
         Enables multi-factor authentication (MFA) for a user.
@@ -183,6 +422,7 @@ class UserManagement:
             user_management_logger.error("Error enabling MFA: %s", str(e))
             raise
 
+    @REGISTRY.instrument("user_management.verify_mfa")
     def verify_mfa(self, username, otp):
         """
         Verifies a one-time password (OTP) for MFA.
@@ -195,7 +435,7 @@ class UserManagement:
             bool: True if the OTP is valid, False otherwise.
         """
         try:
-            user = self.users_collection.find_one({"username": username})
+            user = self._find_user(username)
             if user and "mfa_secret" in user:
                 totp = pyotp.TOTP(user["mfa_secret"])
                 if totp.verify(otp):